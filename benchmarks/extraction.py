@@ -0,0 +1,254 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Extraction time, extraction memory and LaTeX table rendering time on
+synthetic Gaussian logs of growing size, compared to stored baselines, e.g.
+
+    python -m benchmarks.extraction
+    python -m benchmarks.extraction large --repeat 10
+    python -m benchmarks.extraction --save-baseline
+
+The logs are written by benchmarks.synthetic_log into a temporary
+directory. Every extraction starts without a log index, so each run pays
+for indexing the log. Peak memory is the growth of the peak resident size
+of a fresh interpreter that has only imported cclib and the extractors,
+tracemalloc slows cclib down too much on large logs. Exits with 1 when a
+metric exceeds its baseline by more than --tolerance.
+
+Baselines are absolute timings, they only compare runs on the same
+machine: save one before changing the code, then run again afterwards.
+They are kept out of the repository (see .gitignore).
+"""
+
+import argparse
+import concurrent.futures
+import gc
+import json
+import multiprocessing
+import os
+import os.path
+import platform
+import re
+import sys
+import tempfile
+import time
+
+from typing import Dict, Text
+
+from benchmarks.synthetic_log import write_log
+from drivers.log_index import LogIndex
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'baselines', 'extraction.json')
+
+# Arguments of write_log for every case, each one larger in every dimension
+CASES = {
+    'small': dict(num_atoms=10, num_basis=100, num_states=10, num_steps=1,
+                  num_contributions=5, num_deexcitations=1),
+    'medium': dict(num_atoms=50, num_basis=500, num_states=30, num_steps=5,
+                   num_contributions=8, num_deexcitations=2),
+    'large': dict(num_atoms=150, num_basis=1500, num_states=60,
+                  num_steps=20, num_contributions=10, num_deexcitations=3),
+}
+
+# Differences below these, by metric unit, are noise and never regressions
+MIN_DIFFERENCES = {
+    'ms': 5.0,
+    'kb': 512.0,
+}
+
+# Data set key of the extraction results given to the LaTeX tables
+DATA_SET_KEY = 'molecule'
+
+
+def _extractors() -> Dict:
+    from drivers.cclib_driver import CompactGenericExtractor, GenericExtractor
+    return {
+        'generic': GenericExtractor,
+        'compact': CompactGenericExtractor,
+    }
+
+
+def _extract(extractor_class: type, log_file: Text) -> Dict:
+    index_file = LogIndex.index_file_name(log_file)
+    if os.path.exists(index_file):
+        os.remove(index_file)
+    return extractor_class().extract(log_file)
+
+
+def _check(result: Dict, case: Dict) -> None:
+    """ The extraction result holds what the log was written with """
+    states = [state for states in result['excited_states'].values()
+              for state in states]
+    num_orbitals = set(len(state['orbitals']) for state in states)
+    expected_orbitals = set([case['num_contributions'] +
+                             case['num_deexcitations']])
+    if (result['num_atoms'] != case['num_atoms'] or
+            result['num_basis_sets'] != case['num_basis'] or
+            len(states) != case['num_states'] or
+            num_orbitals != expected_orbitals or
+            result['optimization_steps'] != (
+                case['num_steps'] if case['num_steps'] > 1 else 0)):
+        raise RuntimeError('Unexpected extraction result for {}'.format(
+            case))
+
+
+def _render_tables(result: Dict) -> None:
+    from report.backend.latex import excited_state_table, xyz_coordinate
+    data_set = {DATA_SET_KEY: result}
+    xyz_coordinate('Coordinates', data_set, DATA_SET_KEY)
+    excited_state_table(data_set, 'Excited states', DATA_SET_KEY)
+
+
+def _best_time(function, repeat: int) -> float:
+    """ Shortest wall time of function over repeat runs, in ms """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def _memory_status(field: Text) -> int:
+    """ A field of /proc/self/status in KiB, e.g. VmRSS """
+    with open('/proc/self/status', 'r') as stream:
+        return int(re.search(r'^{}:\s+(\d+)'.format(field), stream.read(),
+                             re.MULTILINE).group(1))
+
+
+def _peak_rss(extractor_name: Text, log_file: Text) -> float:
+    """ Growth of the peak resident size of this process while extracting
+    log_file, in KiB (Linux), after importing cclib and the extractors
+    """
+    import cclib  # noqa: F401
+    extractor_class = _extractors()[extractor_name]
+
+    gc.collect()
+    before = _memory_status('VmRSS')
+    # Reset the peak left by the imports to the current resident size
+    with open('/proc/self/clear_refs', 'w') as stream:
+        stream.write('5')
+    _extract(extractor_class, log_file)
+    return _memory_status('VmHWM') - before
+
+
+def _peak_memory(extractor_name: Text, log_file: Text,
+                 repeat: int) -> float:
+    """ Smallest _peak_rss over repeat fresh processes, spawned rather than
+    forked so that nothing the benchmark itself allocated is counted
+    """
+    peaks = []
+    for _ in range(repeat):
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context('spawn')) as pool:
+            peaks.append(
+                pool.submit(_peak_rss, extractor_name, log_file).result())
+    return min(peaks)
+
+
+def run_case(case: Dict, directory: Text, repeat: int) -> Dict[Text, float]:
+    log_file = os.path.join(directory, 'molecule.log')
+    with open(log_file, 'w') as stream:
+        write_log(stream, **case)
+
+    metrics = {}
+    results = {}
+    for name, extractor_class in _extractors().items():
+        results[name] = _extract(extractor_class, log_file)
+        _check(results[name], case)
+        metrics['extract_{}_ms'.format(name)] = _best_time(
+            lambda: _extract(extractor_class, log_file), repeat)
+        metrics['extract_{}_peak_kb'.format(name)] = _peak_memory(
+            name, log_file, repeat)
+    for name, result in results.items():
+        metrics['latex_{}_ms'.format(name)] = _best_time(
+            lambda: _render_tables(result), repeat)
+    return metrics
+
+
+def load_baseline(baseline_file: Text) -> Dict[Text, Dict[Text, float]]:
+    if not os.path.exists(baseline_file):
+        return {}
+    with open(baseline_file, 'r') as stream:
+        return json.load(stream)['cases']
+
+
+def save_baseline(baseline_file: Text,
+                  cases: Dict[Text, Dict[Text, float]]) -> None:
+    import cclib
+    baseline = {}
+    if os.path.exists(baseline_file):
+        with open(baseline_file, 'r') as stream:
+            baseline = json.load(stream)
+    baseline.setdefault('cases', {}).update(cases)
+    baseline['environment'] = {
+        'python': platform.python_version(),
+        'cclib': cclib.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+    }
+    os.makedirs(os.path.dirname(baseline_file), exist_ok=True)
+    with open(baseline_file, 'w') as stream:
+        json.dump(baseline, stream, indent=1, sort_keys=True)
+        stream.write('\n')
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('cases', nargs='*',
+                        help='Cases to run among {}, all by default'.format(
+                            ', '.join(CASES)))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--baseline', default=BASELINE_FILE,
+                        help='Baseline file, default: %(default)s')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Store the results as the new baseline of the '
+                             'cases run')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='Fail when a metric exceeds its baseline by '
+                             'more than this fraction')
+    args = parser.parse_args()
+    unknown_cases = set(args.cases) - set(CASES)
+    if unknown_cases:
+        parser.error('unknown cases: {}'.format(
+            ', '.join(sorted(unknown_cases))))
+
+    # cclib and the templates are loaded once, outside of any measurement
+    _extractors()
+    _render_tables({'num_atoms': 0, 'atoms': {'symbols': [],
+                                              'coordinates': []},
+                    'excited_states': {'singlet': [], 'triplet': [],
+                                       'unknown': []}})
+
+    baseline = load_baseline(args.baseline)
+    results = {}
+    regressions = []
+    print('{:<8}{:<26}{:>12}{:>12}{:>8}'.format(
+        'case', 'metric', 'value', 'baseline', 'ratio'))
+    for name in args.cases or CASES:
+        with tempfile.TemporaryDirectory() as directory:
+            results[name] = run_case(CASES[name], directory, args.repeat)
+        for metric, value in results[name].items():
+            reference = baseline.get(name, {}).get(metric)
+            ratio = value / reference if reference else None
+            print('{:<8}{:<26}{:>12.1f}{:>12}{:>8}'.format(
+                name, metric, value,
+                '-' if reference is None else '{:.1f}'.format(reference),
+                '-' if ratio is None else '{:.2f}'.format(ratio)))
+            min_difference = MIN_DIFFERENCES[metric.rsplit('_', 1)[-1]]
+            if ratio is not None and ratio > 1 + args.tolerance and \
+                    value - reference > min_difference:
+                regressions.append('{} {}'.format(name, metric))
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        print('Baseline saved to {}'.format(args.baseline))
+    elif regressions:
+        print('Worse than the baseline: {}'.format(', '.join(regressions)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Measure the startup cost of the entry points in fresh interpreters:
+their cumulative import time from -X importtime with the heaviest packages
+they pull in, and the time to import the LaTeX backend and render a first
+section, e.g.
+
+    python -m benchmarks.import_time --budget 300 --forbid cclib luigi
+
+Exits with a non zero status when the median import time of an entry point
+is over budget, or when it imports a forbidden package.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+from typing import Dict, List, Text
+
+# The report and the extraction entry points
+MODULES = ['generate_report', 'drivers.cclib_driver', 'report.backend.latex']
+
+FIRST_RENDER = '''
+import time
+start = time.perf_counter()
+import report.backend.latex as latex
+latex.section('x')
+latex.figure('x', 'x.png')
+print(time.perf_counter() - start)
+'''
+
+
+def _run(args: List[Text], env: dict) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable] + args, env=env, check=True,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True,
+                          cwd=os.path.dirname(os.path.dirname(
+                              os.path.abspath(__file__))))
+
+
+def import_times(module: Text, env: dict) -> Dict[Text, float]:
+    """ Cumulative import time in ms of module and of every module it
+    imports
+    """
+    output = _run(['-X', 'importtime', '-c', 'import ' + module], env).stderr
+    times = {}
+    for line in output.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = line.split('|')
+        if len(fields) == 3 and fields[1].strip().isdigit():
+            times[fields[2].strip()] = int(fields[1]) / 1000
+    if module not in times:
+        raise RuntimeError('No import time reported for {}'.format(module))
+    return times
+
+
+def first_render_time(env: dict) -> float:
+    """ Time to import the LaTeX backend and render a first section, in ms """
+    return float(_run(['-c', FIRST_RENDER], env).stdout) * 1000
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Measure the import time of a module in fresh '
+                    'interpreters')
+    parser.add_argument('modules', nargs='*', default=MODULES)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--top', type=int, default=5,
+                        help='Number of heaviest packages to show')
+    parser.add_argument('--budget', type=float,
+                        help='Maximal median import time in ms')
+    parser.add_argument('--forbid', nargs='*', default=[],
+                        help='Packages the modules must not import')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+
+    failed = False
+    for module in args.modules:
+        runs = [import_times(module, env) for _ in range(args.repeat)]
+        median = statistics.median(times[module] for times in runs)
+        print('import {:30s} {:8.2f} ms (median of {})'.format(
+            module, median, args.repeat))
+        packages = {
+            name: time for name, time in runs[-1].items()
+            if '.' not in name and name != module
+        }
+        for name in sorted(packages, key=packages.get,
+                           reverse=True)[:args.top]:
+            print('    {:32s} {:8.2f} ms'.format(name, packages[name]))
+        if args.budget is not None and median > args.budget:
+            print('    over the budget of {} ms'.format(args.budget))
+            failed = True
+        for name in set(args.forbid) & set(runs[-1]):
+            print('    imports {}'.format(name))
+            failed = True
+
+    times = [first_render_time(env) for _ in range(args.repeat)]
+    print('{:37s} {:8.2f} ms (median of {})'.format(
+        'first render', statistics.median(times), args.repeat))
+
+    if failed:
+        sys.exit(1)
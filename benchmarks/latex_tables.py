@@ -0,0 +1,102 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Compare the per-row and bulk table rendering of report.backend.latex on
+a synthetic large molecule, e.g.
+
+    python -m benchmarks.latex_tables --atoms 400 --states 50
+"""
+
+import argparse
+import random
+import timeit
+
+from typing import Dict
+
+from report.backend.latex import (
+    excited_state_table,
+    nto_analysis_table,
+    xyz_coordinate
+)
+
+SYMBOLS = ['H', 'C', 'N', 'O', 'S', 'Cl']
+
+
+def synthetic_data_set(num_atoms: int,
+                       num_states: int,
+                       num_orbitals: int,
+                       num_ntos: int,
+                       seed: int = 0) -> Dict:
+    rng = random.Random(seed)
+
+    def state():
+        return {
+            'excitation_energy': rng.uniform(0.05, 0.3),
+            'symmetric_group': 'Singlet-A',
+            'oscillator_strength': rng.uniform(0, 1),
+            'orbitals': [{
+                'from': rng.randint(1, 999),
+                'to': rng.randint(1, 999),
+                'coefficient': rng.uniform(-0.7, 0.7),
+            } for _ in range(num_orbitals)],
+        }
+
+    return {
+        'molecule': {
+            'num_atoms': num_atoms,
+            'atoms': {
+                'symbols': [rng.choice(SYMBOLS) for _ in range(num_atoms)],
+                'coordinates': [[rng.uniform(-20, 20) for _ in range(3)]
+                                for _ in range(num_atoms)],
+            },
+            'excited_states': {
+                multiplicity: [state() for _ in range(num_states)]
+                for multiplicity in ['singlet', 'triplet', 'unknown']
+            },
+            'nto_contributions': [{
+                'from': rng.randint(1, 999),
+                'to': rng.randint(1, 999),
+                'contribution': rng.uniform(0, 1),
+            } for _ in range(num_ntos)],
+        }
+    }
+
+
+TABLES = {
+    'xyz_coordinate': lambda data_set, bulk: xyz_coordinate(
+        'Coordinates', data_set, 'molecule', bulk=bulk),
+    'excited_state_table': lambda data_set, bulk: excited_state_table(
+        data_set, 'Excited states', 'molecule', bulk=bulk),
+    'nto_analysis_table': lambda data_set, bulk: nto_analysis_table(
+        data_set, 'NTO', 'molecule', bulk=bulk),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--atoms', type=int, default=400)
+    parser.add_argument('--states', type=int, default=50)
+    parser.add_argument('--orbitals', type=int, default=10,
+                        help='Orbital contributions per excited state')
+    parser.add_argument('--ntos', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    data_set = synthetic_data_set(args.atoms, args.states, args.orbitals,
+                                  args.ntos)
+
+    print('{:<22}{:>12}{:>12}{:>10}'.format('table', 'per-row ms', 'bulk ms',
+                                           'speedup'))
+    for name, table in TABLES.items():
+        if table(data_set, False) != table(data_set, True):
+            raise RuntimeError('Bulk output of {} differs'.format(name))
+        times = {}
+        for bulk in [False, True]:
+            times[bulk] = min(timeit.repeat(
+                lambda: table(data_set, bulk), number=1, repeat=args.repeat
+            )) * 1000
+        print('{:<22}{:>12.2f}{:>12.2f}{:>9.1f}x'.format(
+            name, times[False], times[True], times[False] / times[True]))
+
+
+if __name__ == '__main__':
+    main()
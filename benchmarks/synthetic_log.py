@@ -0,0 +1,280 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Write synthetic Gaussian TD-DFT logs of any size, e.g.
+
+    python -m benchmarks.synthetic_log big.log --atoms 200 --basis 2000 \\
+        --states 50 --steps 10 --deexcitations 3
+
+The logs only hold the sections cclib and drivers.gaussian_parser read, in
+the layout of Gaussian 16: one geometry, SCF energy, orbital energies and
+excitation block per optimization step, and the "Optimization completed"
+and "Normal termination" lines at the end. Every state has its ->
+excitations followed by its <- de-excitations, as Gaussian prints them.
+The same arguments and seed always give the same log.
+"""
+
+import io
+import random
+
+from typing import List, Text, TextIO, Tuple
+
+# Element symbol and atomic number of the atoms drawn for a molecule
+ELEMENTS = [('H', 1), ('C', 6), ('N', 7), ('O', 8), ('S', 16)]
+
+# Distance between neighbouring atoms of the generated geometry
+ATOM_SPACING = 1.4
+
+# Number of orbital energies per line, as Gaussian prints them
+EIGENVALUES_PER_LINE = 5
+
+HEADER = """\
+ Copyright (c) 1988-2017, Gaussian, Inc.  All Rights Reserved.
+ Entering Gaussian System, Link 0=g16
+ Initial command:
+ /opt/g16/l1.exe "/scratch/Gau-1.inp" -scrdir="/scratch/"
+ ******************************************
+ Gaussian 16:  ES64L-G16RevA.03 25-Dec-2016
+ ******************************************
+ ------------------------------------------
+ #p {route} b3lyp/6-31g(d)
+ ------------------------------------------
+ Charge = {charge:2d} Multiplicity = 1
+"""
+
+ORIENTATION_HEADER = """\
+                         Standard orientation:
+ ---------------------------------------------------------------------
+ Center     Atomic      Atomic             Coordinates (Angstroms)
+ Number     Number       Type             X           Y           Z
+ ---------------------------------------------------------------------
+"""
+
+RULE = ' ' + '-' * 69 + '\n'
+
+BASIS = """\
+ {basis:5d} basis functions, {primitives:6d} primitive gaussians, \
+{basis:5d} cartesian basis functions
+ {electrons:5d} alpha electrons     {electrons:5d} beta electrons
+ NBasis= {basis:5d} RedAO= T EigKep=  1.00D-06  NBF= {basis:5d}
+ NBsUse= {basis:5d} 1.00D-06 EigRej= -1.00D+00 NBFU= {basis:5d}
+"""
+
+POPULATION_HEADER = """\
+ **********************************************************************
+
+            Population analysis using the SCF Density.
+
+ **********************************************************************
+
+ Orbital symmetries:
+       Occupied  {occupied}
+       Virtual   {virtual}
+ The electronic state is 1-A.
+"""
+
+CONVERGENCE = """\
+ Step number {step:3d} out of a maximum of  100
+         Item               Value     Threshold  Converged?
+ Maximum Force            {force:.6f}     0.000450     {converged}
+ RMS     Force            {rms_force:.6f}     0.000300     {converged}
+ Maximum Displacement     {displacement:.6f}     0.001800     {converged}
+ RMS     Displacement     {rms_displacement:.6f}     0.001200     {converged}
+"""
+
+FOOTER = """\
+ SavETr:  write IOETrn=   770 NScale= 10 NData=  16 NLR=1 NState= {states:4d} \
+LETran=      64.
+ Normal termination of Gaussian 16 at Mon Jan  1 00:00:00 2024.
+"""
+
+
+class SyntheticMolecule(object):
+    """ Atoms, electrons and orbitals of a synthetic closed shell molecule
+    """
+
+    def __init__(self, num_atoms: int, num_basis: int, seed: int = 0):
+        if num_atoms < 1:
+            raise ValueError('A molecule needs at least one atom')
+        self.rng = random.Random(seed)
+        self.elements = [self.rng.choice(ELEMENTS) for _ in range(num_atoms)]
+        # Closed shell: an odd number of electrons makes a cation
+        num_electrons = sum(number for _, number in self.elements)
+        self.charge = num_electrons % 2
+        self.num_occupied = (num_electrons - self.charge) // 2
+        if num_basis <= self.num_occupied:
+            raise ValueError(
+                '{} basis functions cannot hold {} occupied orbitals'.format(
+                    num_basis, self.num_occupied))
+        self.num_basis = num_basis
+
+        # Atoms on a cubic grid, shifted a little by every optimization step
+        side = max(1, round(num_atoms ** (1 / 3) + 0.5))
+        self.coordinates = [
+            [ATOM_SPACING * (index % side),
+             ATOM_SPACING * (index // side % side),
+             ATOM_SPACING * (index // (side * side))]
+            for index in range(num_atoms)
+        ]
+
+    def step_coordinates(self, scale: float) -> List[List[float]]:
+        return [[x + self.rng.uniform(-scale, scale) for x in atom]
+                for atom in self.coordinates]
+
+    def orbital_energies(self) -> Tuple[List[float], List[float]]:
+        """ Occupied and virtual orbital energies in Hartree, ascending """
+        occupied = sorted(self.rng.uniform(-20, -0.2)
+                          for _ in range(self.num_occupied))
+        virtual = sorted(self.rng.uniform(-0.1, 5)
+                         for _ in range(self.num_basis - self.num_occupied))
+        return occupied, virtual
+
+
+def _write_orientation(stream: TextIO, molecule: SyntheticMolecule,
+                       coordinates: List[List[float]]) -> None:
+    stream.write(ORIENTATION_HEADER)
+    for index, ((_, number), (x, y, z)) in enumerate(
+            zip(molecule.elements, coordinates)):
+        stream.write('{:7d}{:11d}{:12d}    {:12.6f}{:12.6f}{:12.6f}\n'.format(
+            index + 1, number, 0, x, y, z))
+    stream.write(RULE)
+
+
+def _write_eigenvalues(stream: TextIO, label: Text,
+                       energies: List[float]) -> None:
+    for start in range(0, len(energies), EIGENVALUES_PER_LINE):
+        stream.write(' Alpha {} eigenvalues -- {}\n'.format(
+            label, ''.join('{:10.5f}'.format(energy) for energy in
+                           energies[start:start + EIGENVALUES_PER_LINE])))
+
+
+def _symmetry_labels(labels: int) -> Text:
+    # Gaussian wraps the symmetry labels, 10 per line
+    return '\n                 '.join(
+        ' '.join(['(A)'] * min(10, labels - start))
+        for start in range(0, labels, 10))
+
+
+def _write_excited_states(stream: TextIO, molecule: SyntheticMolecule,
+                          num_states: int, num_contributions: int,
+                          num_deexcitations: int, triplets: bool,
+                          scf_energy: float) -> None:
+    rng = molecule.rng
+    homo = molecule.num_occupied
+    num_virtual = molecule.num_basis - homo
+    stream.write(' Excitation energies and oscillator strengths:\n')
+    energies = sorted(rng.uniform(1.5, 8) for _ in range(num_states))
+    for index, energy in enumerate(energies):
+        triplet = triplets and index % 2 == 1
+        stream.write(
+            '\n Excited State {:3d}:      {}-A        {:7.4f} eV  {:7.2f} nm  '
+            'f={:.4f}  <S**2>={:.3f}\n'.format(
+                index + 1, 'Triplet' if triplet else 'Singlet', energy,
+                1239.84193 / energy, 0 if triplet else rng.uniform(0, 1),
+                2 if triplet else 0))
+        for arrow, count in [('->', num_contributions),
+                             ('<-', num_deexcitations)]:
+            for _ in range(count):
+                occupied = homo - rng.randrange(min(homo, 10))
+                virtual = homo + 1 + rng.randrange(min(num_virtual, 10))
+                coefficient = rng.uniform(0.1, 0.7) * rng.choice([-1, 1])
+                if arrow == '<-':
+                    coefficient /= 5
+                stream.write('    {:5d} {} {:<5d}    {:9.5f}\n'.format(
+                    occupied, arrow, virtual, coefficient))
+        if index == 0:
+            stream.write(' This state for optimization and/or second-order '
+                         'correction.\n')
+            stream.write(' Total Energy, E(TD-HF/TD-DFT) = {:.9f}\n'.format(
+                scf_energy + energy / 27.211386))
+    stream.write('\n')
+
+
+def write_log(stream: TextIO,
+              num_atoms: int = 10,
+              num_basis: int = 100,
+              num_states: int = 10,
+              num_steps: int = 1,
+              num_deexcitations: int = 1,
+              num_contributions: int = 5,
+              triplets: bool = False,
+              seed: int = 0) -> None:
+    """ Write a TD-DFT log to stream. num_steps > 1 writes a geometry
+    optimization, num_contributions and num_deexcitations are the -> and <-
+    entries of every excited state. With triplets every other state is a
+    triplet, as with td(50-50).
+    """
+    if num_steps < 1:
+        raise ValueError('A log needs at least one step')
+    molecule = SyntheticMolecule(num_atoms, num_basis, seed)
+    rng = molecule.rng
+    optimization = num_steps > 1
+    stream.write(HEADER.format(route='opt td' if optimization else 'td',
+                               charge=molecule.charge))
+    scf_energy = -100.0 * num_atoms
+    for step in range(1, num_steps + 1):
+        remaining = (num_steps - step) / num_steps
+        _write_orientation(stream, molecule,
+                           molecule.step_coordinates(0.05 * remaining))
+        stream.write(BASIS.format(basis=molecule.num_basis,
+                                  primitives=2 * molecule.num_basis,
+                                  electrons=molecule.num_occupied))
+        scf_energy -= 0.01 * remaining
+        stream.write(' SCF Done:  E(RB3LYP) = {:16.9f}     A.U. after   '
+                     '{:d} cycles\n'.format(scf_energy, rng.randint(8, 20)))
+        occupied, virtual = molecule.orbital_energies()
+        stream.write(POPULATION_HEADER.format(
+            occupied=_symmetry_labels(len(occupied)),
+            virtual=_symmetry_labels(len(virtual))))
+        _write_eigenvalues(stream, ' occ.', occupied)
+        _write_eigenvalues(stream, 'virt.', virtual)
+        _write_excited_states(stream, molecule, num_states,
+                              num_contributions, num_deexcitations, triplets,
+                              scf_energy)
+        if optimization:
+            converged = 'YES' if step == num_steps else ' NO'
+            force = 0.0001 if step == num_steps else 0.01 * remaining
+            stream.write(CONVERGENCE.format(
+                step=step, force=force, rms_force=force / 2,
+                displacement=force * 3, rms_displacement=force * 2,
+                converged=converged))
+    if optimization:
+        stream.write(' Optimization completed.\n'
+                     '    -- Stationary point found.\n')
+    stream.write(FOOTER.format(states=num_states))
+
+
+def synthetic_log(**kwargs) -> Text:
+    """ The log written by write_log, as a string """
+    stream = io.StringIO()
+    write_log(stream, **kwargs)
+    return stream.getvalue()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Write a synthetic Gaussian TD-DFT log')
+    parser.add_argument('log_file')
+    parser.add_argument('--atoms', type=int, default=10)
+    parser.add_argument('--basis', type=int, default=100,
+                        help='Number of basis functions')
+    parser.add_argument('--states', type=int, default=10,
+                        help='Number of excited states per step')
+    parser.add_argument('--steps', type=int, default=1,
+                        help='Number of optimization steps, 1 for a single '
+                             'point')
+    parser.add_argument('--contributions', type=int, default=5,
+                        help='-> entries of every excited state')
+    parser.add_argument('--deexcitations', type=int, default=1,
+                        help='<- entries of every excited state')
+    parser.add_argument('--triplets', action='store_true',
+                        help='Every other state is a triplet')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with open(args.log_file, 'w') as stream:
+        write_log(stream, num_atoms=args.atoms, num_basis=args.basis,
+                  num_states=args.states, num_steps=args.steps,
+                  num_deexcitations=args.deexcitations,
+                  num_contributions=args.contributions,
+                  triplets=args.triplets, seed=args.seed)
@@ -0,0 +1,231 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import functools
+import hashlib
+import json
+import logging
+import os
+import os.path
+import shutil
+import tempfile
+import threading
+
+from typing import Any, Dict, Text
+
+from drivers.extract_cache import EVICTION_TARGET, file_digest
+
+logger = logging.getLogger(__name__)
+
+# Bump this whenever the way artifacts are generated changes in a way the
+# keys cannot detect
+SCHEMA_VERSION = 1
+
+# 10 GiB
+DEFAULT_MAX_SIZE = 10 << 30
+
+TEMP_SUFFIX = '.tmp'
+
+# Mode of the stored artifacts
+READ_ONLY = 0o444
+
+
+@functools.lru_cache(maxsize=None)
+def default_mode() -> int:
+    """ Mode of the fetched artifacts, that of a file created with open()
+    under the umask of the process. Read from a new file rather than by
+    setting the umask, which is process-wide.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        fd = os.open(os.path.join(directory, 'mode'),
+                     os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        try:
+            return os.fstat(fd).st_mode & 0o777
+        finally:
+            os.close(fd)
+
+
+class ArtifactStore(object):
+    """ Content-addressed on-disk store of MO cubes and rendered images,
+    shared by every job directory and report.
+
+    A cube is keyed by the content of its fchk, the MO, the grid and the
+    engine that computed it; an image by the key of its cube and the
+    renderer settings. Artifacts are copied in and out of the store, never
+    hard-linked: the cube and image writers rewrite the files of a job
+    directory in place, which would go through a link into the shared
+    entry. Stored artifacts are also made read-only. Entries are evicted
+    least-recently-used first once the store grows over max_size bytes.
+
+    As in ExtractCache, the size of the store is scanned once, then counted
+    as new artifacts are put.
+    """
+
+    def __init__(self, store_dir: Text, max_size: int = DEFAULT_MAX_SIZE):
+        self.store_dir = store_dir
+        self.max_size = max_size
+        os.makedirs(store_dir, exist_ok=True)
+        self._fchk_digests: Dict[tuple, Text] = {}
+        self._lock = threading.Lock()
+        self._size = None
+
+    @staticmethod
+    def _key(description: Dict[Text, Any]) -> Text:
+        description['schema'] = SCHEMA_VERSION
+        return hashlib.sha256(
+            json.dumps(description, sort_keys=True).encode()
+        ).hexdigest()
+
+    def _fchk_digest(self, formchk_file: Text) -> Text:
+        """ Content hash of an fchk, only computed again once it changed
+        """
+        stat = os.stat(formchk_file)
+        signature = (os.path.abspath(formchk_file), stat.st_size,
+                     stat.st_mtime_ns)
+        with self._lock:
+            digest = self._fchk_digests.get(signature)
+        if digest is None:
+            digest = file_digest(formchk_file)
+            with self._lock:
+                self._fchk_digests[signature] = digest
+        return digest
+
+    def cube_key(self,
+                 formchk_file: Text,
+                 mo: int,
+                 npts: int,
+                 engine: Text,
+                 suffix: Text) -> Text:
+        return self._key({
+            'kind': 'cube',
+            'fchk': self._fchk_digest(formchk_file),
+            'mo': mo,
+            'npts': npts,
+            'engine': engine,
+            'suffix': suffix,
+        })
+
+    def image_key(self, cube_key: Text, renderer: Dict[Text, Any]) -> Text:
+        return self._key({
+            'kind': 'image',
+            'cube': cube_key,
+            'renderer': renderer,
+        })
+
+    def _path(self, key: Text) -> Text:
+        return os.path.join(self.store_dir, key[:2], key)
+
+    @staticmethod
+    def _copy(source: Text, destination: Text, mode: int = None) -> None:
+        """ Atomically make destination a copy of source """
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(destination),
+                                         suffix=TEMP_SUFFIX)
+        try:
+            # Copied through the descriptor of mkstemp, so the temporary
+            # name is never free for another put, fetch or eviction
+            with os.fdopen(fd, 'wb') as out, open(source, 'rb') as src:
+                shutil.copyfileobj(src, out)
+            # mkstemp creates the file private to the user
+            os.chmod(temp_path, default_mode() if mode is None else mode)
+            os.replace(temp_path, destination)
+        except BaseException:
+            ArtifactStore._remove(temp_path)
+            raise
+
+    def fetch(self, key: Text, destination: Text) -> bool:
+        """ Put the artifact of key at destination, False if it is not in
+        the store
+        """
+        path = self._path(key)
+        try:
+            self._copy(path, destination)
+        except FileNotFoundError:
+            return False
+        # Touch the entry so that eviction is least-recently-used
+        try:
+            os.utime(path)
+        except (FileNotFoundError, PermissionError):
+            # Evicted since it was copied, or put by another user of a
+            # shared store
+            pass
+        return True
+
+    def put(self, file_name: Text, key: Text) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            # The same artifact put again replaces its entry
+            old_size = os.stat(path).st_size
+        except FileNotFoundError:
+            old_size = 0
+        self._copy(file_name, path, mode=READ_ONLY)
+        size = os.stat(path).st_size
+
+        with self._lock:
+            if self._size is None:
+                self._size = self.size()
+            else:
+                self._size += size - old_size
+            if self._size <= self.max_size:
+                return
+        self.evict()
+
+    def _entries(self):
+        for shard in os.scandir(self.store_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(TEMP_SUFFIX):
+                    continue
+                try:
+                    yield entry.path, entry.stat()
+                except FileNotFoundError:
+                    # Evicted concurrently by another process
+                    continue
+
+    def size(self) -> int:
+        return sum(stat.st_size for _, stat in self._entries())
+
+    def evict(self) -> None:
+        """ Remove the least recently used entries until the store is back
+        under EVICTION_TARGET of max_size, if it is over max_size
+        """
+        entries = sorted(self._entries(), key=lambda item: item[1].st_mtime)
+        total_size = sum(stat.st_size for _, stat in entries)
+        if total_size > self.max_size:
+            for path, stat in entries:
+                if total_size <= self.max_size * EVICTION_TARGET:
+                    break
+                logger.info('Evicting artifact {}'.format(path))
+                self._remove(path)
+                total_size -= stat.st_size
+        with self._lock:
+            self._size = total_size
+
+    def clear(self) -> None:
+        for path, _ in list(self._entries()):
+            self._remove(path)
+        with self._lock:
+            self._size = 0
+
+    @staticmethod
+    def _remove(path: Text) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Inspect or empty an artifact store')
+    parser.add_argument('store_dir')
+    parser.add_argument('action', choices=['size', 'clear'])
+    args = parser.parse_args()
+
+    store = ArtifactStore(args.store_dir)
+    if args.action == 'clear':
+        store.clear()
+    else:
+        print(store.size())
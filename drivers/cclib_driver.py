@@ -1,17 +1,28 @@
 #! /usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import collections.abc
+import concurrent.futures
 import functools
+import itertools
 import logging
-import re
-import unittest.mock
+import multiprocessing
+import threading
 
-from typing import Any, Callable, Dict, List, Text
+from typing import Any, Callable, Dict, List, Optional, Set, Text, Tuple, Type
 
-import cclib
-import periodictable
+import numpy
 
-CCDATA = cclib.parser.data.ccData
+import drivers.compact_result as compact_result
+import drivers.gaussian_parser as gaussian_parser
+import drivers.instrumentation as instrumentation
+from drivers.extract_cache import ExtractCache
+from drivers.fchk_reader import FchkFile
+
+# cclib (and the scipy it pulls in) and periodictable take most of the
+# startup time, they are only imported once a log is actually parsed, so
+# that rendering from extracted data never pays for them
+CCDATA = 'cclib.parser.data.ccData'
 ExtractResult = Dict[Text, Any]
 ExtractorFunction = Any    # Callable[[CCDATA, ExtractResult], NoReturn]
 
@@ -28,40 +39,17 @@ RECCM_TO_HARTREE = 1 / HARTREE_TO_RECCM
 
 SQRT_2 = 1.414213562373095
 
-# cclib has some weird behavior, e.g. not extracting de-excitation states in
-# Gaussian parser. This dirty patch solves it.
-class _PatchedStr(str):
-    REGEX = re.compile('(\d+) *(<-|->) *(\d+) +(-?\d+\.\d+)')
-
-    def find(self, seq, start=None, end=None):
-        if seq == ' ->':
-            rarrow = super().find(' ->', start, end)
-            if rarrow != -1:
-                return rarrow
-            return super().find(' <-', start, end)
-        return super().find(seq, start, end)
-
-    def split(self, seq=None, max_split=-1):
-        if seq == '->' and '<-' in self:
-            m = self.REGEX.search(self)
-            g = m.groups()
-            _1, _2, _3, _4 = g
-            return [_3, '{} {}'.format(_1, _4)]
-        return super().split(seq, max_split)
-
-_OriginalWrapper = cclib.parser.logfileparser.FileWrapper
-
-class _PatchedFileWrapper(_OriginalWrapper):
-
-    def next(self):
-        return _PatchedStr(super().next())
-
-cclib.parser.logfileparser.FileWrapper = _PatchedFileWrapper
+# The attributes read from the excited state blocks by gaussian_parser
+EXCITED_STATE_ATTRIBUTES = ['etenergies', 'etoscs', 'etsyms', 'etsecs']
 
 
 def extractor(dependencies: List[Text] = None,
-              provides: List[Text] = None):
+              provides: List[Text] = None,
+              attributes: List[Text] = None):
     """ Decorator for an extractor in an Extractor class
+
+    attributes lists the ccdata attributes the extractor reads, None means the
+    extractor may read anything.
     """
     def _func_wrapper(func: ExtractorFunction) -> ExtractorFunction:
         """ Wraps an extractor function, provide additional tags
@@ -69,6 +57,7 @@ def extractor(dependencies: List[Text] = None,
         func.is_extractor = True    # The value is not important through
         func.dependencies = dependencies or []
         func.provides = provides or  []
+        func.attributes = attributes
 
         @functools.wraps(func)
         def _wrapper(self, parsed: CCDATA, target: Dict) -> None:
@@ -90,6 +79,7 @@ def property_extractor(ccdata_property: Text, output_property: Text):
         func.is_extractor = True
         func.dependencies = []
         func.provides = [output_property]
+        func.attributes = [ccdata_property]
 
         @functools.wraps(func)
         def _wrapper(self, parsed: CCDATA, target: Dict) -> None:
@@ -103,77 +93,182 @@ def property_extractor(ccdata_property: Text, output_property: Text):
     return _func_wrapper
 
 
-class ExtractorBase(object):
-    """ Base class for all quantum chemistry log extractor
+class ExtractorPlan(object):
+    """ Execution plan of an extractor class, compiled once per class.
+
+    order is a topological order of the extractor functions, levels groups
+    them so that the extractors of one level only depend on earlier levels,
+    i.e. extractors in the same level are independent of each other.
     """
 
-    def __init__(self):
-        self._method_list: List[ExtractorFunction] = None
+    def __init__(self,
+                 levels: List[List[ExtractorFunction]],
+                 providers: Dict[Text, List[ExtractorFunction]]):
+        self.levels = levels
+        self.order: List[ExtractorFunction] = [
+            func for level in levels for func in level
+        ]
+        self.providers = providers
 
-    def _get_all_extractor_methods(self) -> List[ExtractorFunction]:
-        unprocessed_methods: List[ExtractorFunction] = []
-        for method_name in dir(self):
-            method = getattr(self, method_name)
-            if hasattr(method, 'is_extractor'):
-                unprocessed_methods.append(method)
+    @classmethod
+    def compile(cls, extractor_class: type) -> 'ExtractorPlan':
+        """ Solve the extractor dependencies of a class with Kahn's algorithm
+        """
+        functions: List[ExtractorFunction] = []
+        for name in dir(extractor_class):
+            func = getattr(extractor_class, name)
+            if hasattr(func, 'is_extractor'):
+                functions.append(func)
         logger.info('Class {} has {} extractors: {}'.format(
-            self.__class__.__name__, len(unprocessed_methods),
-            ', '.join(method.__name__ for method in unprocessed_methods)
+            extractor_class.__name__, len(functions),
+            ', '.join(func.__name__ for func in functions)
         ))
-        return unprocessed_methods
 
-    def _construct_method_list(self) -> None:
-        """ Find all functions that are marked as extractor, solve the extractor
-        dependencies using similar approach to Python MRO
-        """
-        self._method_list = []
-        unprocessed_methods = self._get_all_extractor_methods()
-
-        provides_set = set()
-        method_added = [None]
-        while method_added:
-            method_added.clear()
-            for method in unprocessed_methods:
-                for dependency in method.dependencies:
-                    if dependency not in provides_set:
-                        break
-                else:
-                    method_added.append(method)
-                    provides_set.update(method.provides)
+        providers: Dict[Text, List[ExtractorFunction]] = {}
+        for func in functions:
+            for name in func.provides:
+                providers.setdefault(name, []).append(func)
 
-            self._method_list.extend(method_added)
-            for method in method_added:
-                unprocessed_methods.remove(method)
+        missing_dependencies = set(
+            dependency
+            for func in functions
+            for dependency in func.dependencies
+            if dependency not in providers
+        )
+        if missing_dependencies:
+            raise RuntimeError('Unfulfilled or circular dependencies: {}'.
+                               format(', '.join(missing_dependencies)))
 
-        if unprocessed_methods:
-            all_dependencies = set(
+        # An extractor depending on a name waits for all of its providers
+        num_pending = {func: 0 for func in functions}
+        dependents: Dict[ExtractorFunction, List[ExtractorFunction]] = {
+            func: [] for func in functions
+        }
+        for func in functions:
+            for provider in set(
+                provider
+                for dependency in func.dependencies
+                for provider in providers[dependency]
+            ):
+                num_pending[func] += 1
+                dependents[provider].append(func)
+
+        levels: List[List[ExtractorFunction]] = []
+        level = [func for func in functions if num_pending[func] == 0]
+        while level:
+            levels.append(level)
+            next_level = []
+            for func in level:
+                for dependent in dependents[func]:
+                    num_pending[dependent] -= 1
+                    if num_pending[dependent] == 0:
+                        next_level.append(dependent)
+            level = next_level
+
+        if sum(len(level) for level in levels) != len(functions):
+            circular = sorted(set(
                 dependency
-                for method in self._get_all_extractor_methods()
-                for dependency in method.dependencies
-            )
-            missing_dependencies = all_dependencies - provides_set
+                for func in functions if num_pending[func]
+                for dependency in func.dependencies
+            ))
             raise RuntimeError('Unfulfilled or circular dependencies: {}'.
-                               format(', '.join(missing_dependencies)))
+                               format(', '.join(circular)))
 
+        plan = cls(levels, providers)
         logger.info('Generated extractor submethods: {}'.format(
-            ', '.join(method.__name__
-                      for method in (self._method_list or []))
+            ', '.join(func.__name__ for func in plan.order)
         ))
+        return plan
+
+    def __str__(self) -> Text:
+        return '\n'.join(
+            'Level {}: {}'.format(index, ', '.join(
+                func.__name__ for func in level
+            ))
+            for index, level in enumerate(self.levels)
+        )
+
+
+# Guards the compilation of extractor plans shared between threads
+_PLAN_LOCK = threading.Lock()
+
+
+class ExtractorBase(object):
+    """ Base class for all quantum chemistry log extractor
+    """
+
+    # Gaussian output the extractor reads, 'log' or 'fchk'
+    FILE_TYPE = 'log'
+
+    def __init__(self):
+        self._method_list: List[ExtractorFunction] = None
 
-    def _all_methods(self):
-        if not self._method_list:
-            self._construct_method_list()
+    @classmethod
+    def plan(cls) -> ExtractorPlan:
+        """ The execution plan of this extractor class, compiled on first use
+        and shared by all its instances
+        """
+        # Looking at __dict__ so that subclasses never reuse a parent plan
+        plan = cls.__dict__.get('_plan')
+        if plan is None:
+            with _PLAN_LOCK:
+                plan = cls.__dict__.get('_plan')
+                if plan is None:
+                    plan = ExtractorPlan.compile(cls)
+                    cls._plan = plan
+        return plan
+
+    def _all_methods(self) -> List[ExtractorFunction]:
+        if self._method_list is None:
+            self._method_list = [
+                func.__get__(self) for func in self.plan().order
+            ]
         return self._method_list
 
-    def _is_success(self, parsed: cclib.parser.data.ccData) -> bool:
+    def _is_success(self, parsed: CCDATA) -> bool:
         if not hasattr(parsed, 'metadata'):
             return False
         return parsed.metadata.get('success', False)
 
-    def extract(self, log_file_name: str) -> dict:
+    def extract(self, log_file_name: str, cache: ExtractCache = None) -> dict:
         """ Extract all possible features from a quantum chemistry calculation
-        log file.
+        log file. If a cache is given, a previous result of the same extractor
+        on the same log is reused.
         """
+        if cache is None:
+            return self._extract(log_file_name)
+
+        key = cache.key(self.__class__, log_file_name)
+        result = cache.load(key)
+        if result is not None:
+            logger.info('Loaded {} from cache'.format(log_file_name))
+            return result
+
+        result = self._extract(log_file_name)
+        cache.store(key, result)
+        return result
+
+    @staticmethod
+    def _needed_attributes(
+        methods: List[ExtractorFunction]
+    ) -> Optional[Set[Text]]:
+        """ The ccdata attributes read by methods, None if any of them may
+        read anything
+        """
+        attributes = set(['metadata'])
+        for method in methods:
+            if method.attributes is None:
+                return None
+            attributes.update(method.attributes)
+        return attributes
+
+    def _parse(self,
+               log_file_name: str,
+               attributes: Set[Text] = None) -> CCDATA:
+        """ Parse the log file. If attributes is given, all other ccdata
+        attributes are dropped right after parsing.
+        """
+        import cclib
         parsed = cclib.ccopen(log_file_name).parse()
 
         if not self._is_success(parsed):
@@ -181,12 +276,271 @@ class ExtractorBase(object):
                 log_file_name
             ))
 
+        if attributes is None:
+            attributes = self._needed_attributes(self._all_methods())
+
+        if (hasattr(parsed, 'etenergies') and
+                parsed.metadata.get('package') == 'Gaussian' and
+                (attributes is None or 'etsecs' in attributes)):
+            self._parse_excited_states(parsed, log_file_name)
+
+        if attributes is not None:
+            ccdata_attributes = cclib.parser.data.ccData._attributes
+            for name in list(vars(parsed)):
+                if name in ccdata_attributes and name not in attributes:
+                    delattr(parsed, name)
+
+        return parsed
+
+    def _parse_excited_states(self, parsed: CCDATA, log_file_name: str):
+        """ Replace the excited states parsed by cclib, which misses the
+        de-excitation contributions, by the final excited state block
+        """
+        excited_states = gaussian_parser.read_final_excited_states(
+            log_file_name
+        )
+        if len(parsed.homos) == 1:
+            # Same correction cclib applies to restricted calculations
+            sqrt_2 = numpy.sqrt(2)
+            excited_states['etsecs'] = [
+                [(from_, to, coefficient * sqrt_2)
+                 for from_, to, coefficient in contributions]
+                for contributions in excited_states['etsecs']
+            ]
+        for name in EXCITED_STATE_ATTRIBUTES:
+            setattr(parsed, name, excited_states[name])
+        parsed.final_excited_states_only = True
+
+    def _extract(self, log_file_name: str) -> dict:
+        with instrumentation.span('parse', 'extract', file=log_file_name):
+            parsed = self._parse(log_file_name)
+
         result = {}
         for method in self._all_methods():
-            method(parsed, result)
+            with instrumentation.span(method.__name__, 'extract',
+                                      file=log_file_name):
+                method(parsed, result)
 
         return result
 
+    def _providers(self) -> Dict[Text, List[ExtractorFunction]]:
+        """ Maps every provided name to the extractors that provide it, in
+        execution order
+        """
+        return {
+            name: [func.__get__(self) for func in funcs]
+            for name, funcs in self.plan().providers.items()
+        }
+
+    def extract_lazy(self,
+                     log_file_name: str,
+                     keys: List[Text] = None,
+                     cache: ExtractCache = None) -> ExtractResult:
+        """ Like extract, but only runs the extractors needed by the keys that
+        are actually read. If keys is given, only those keys can be read and
+        the ccdata attributes no extractor of theirs needs are dropped right
+        after parsing.
+        """
+        if cache is not None:
+            result = cache.load(cache.key(self.__class__, log_file_name))
+            if result is not None:
+                logger.info('Loaded {} from cache'.format(log_file_name))
+                return result
+
+        return LazyExtractResult(self, log_file_name, keys)
+
+
+class LazyExtractResult(collections.abc.Mapping):
+    """ Extraction result that parses the log on first access, and only runs
+    the extractors (and their dependencies) providing the keys being read.
+
+    Iterating over the result, or taking its length, runs every extractor.
+    """
+
+    def __init__(self,
+                 extractor: ExtractorBase,
+                 log_file_name: Text,
+                 keys: List[Text] = None):
+        self._extractor = extractor
+        self._log_file_name = log_file_name
+        self._providers = extractor._providers()
+        self._keys = None if keys is None else set(keys)
+        self._parsed: CCDATA = None
+        self._result: ExtractResult = {}
+        self._executed = set()
+
+        if self._keys is not None:
+            unknown_keys = self._keys - set(self._providers)
+            if unknown_keys:
+                raise KeyError('No extractor provides {}'.format(
+                    ', '.join(sorted(unknown_keys))
+                ))
+
+    def _required_methods(self, names) -> List[ExtractorFunction]:
+        """ All the extractors needed for names, dependencies first
+        """
+        required: List[ExtractorFunction] = []
+        visiting = set()
+
+        def _visit(name):
+            for method in self._providers.get(name, []):
+                if method.__name__ in visiting or method in required:
+                    continue
+                visiting.add(method.__name__)
+                for dependency in method.dependencies:
+                    _visit(dependency)
+                required.append(method)
+
+        for name in names:
+            _visit(name)
+        return required
+
+    def _get_parsed(self) -> CCDATA:
+        if self._parsed is None:
+            attributes = None
+            if self._keys is not None:
+                attributes = self._extractor._needed_attributes(
+                    self._required_methods(self._keys)
+                )
+            with instrumentation.span('parse', 'extract',
+                                      file=self._log_file_name):
+                self._parsed = self._extractor._parse(self._log_file_name,
+                                                      attributes)
+        return self._parsed
+
+    def _run(self, names) -> None:
+        for method in self._required_methods(names):
+            if method.__name__ in self._executed:
+                continue
+            parsed = self._get_parsed()
+            with instrumentation.span(method.__name__, 'extract',
+                                      file=self._log_file_name):
+                method(parsed, self._result)
+            self._executed.add(method.__name__)
+
+        if len(self._executed) == len(self._extractor._all_methods()):
+            # Nothing left to extract, the parsed data is no longer needed
+            self.release()
+
+    def release(self) -> None:
+        """ Free the parsed log, it is parsed again if more keys are read
+        """
+        self._parsed = None
+
+    def __getitem__(self, key: Text) -> Any:
+        if self._keys is not None and key not in self._keys:
+            raise KeyError('{} was not requested from {}'.format(
+                key, self._log_file_name
+            ))
+        if key not in self._result:
+            if key not in self._providers:
+                raise KeyError(key)
+            self._run([key])
+            if key not in self._result:
+                # Names such as optimization or atom_symbols only order the
+                # extractors, none of them writes a value
+                raise KeyError('{} is provided for the dependencies of the '
+                               'extractors of {}, but has no value'.format(
+                                   key, self._log_file_name))
+        return self._result[key]
+
+    def _materialize(self) -> ExtractResult:
+        self._run(self._keys if self._keys is not None else self._providers)
+        if self._keys is None:
+            return self._result
+        return {key: self._result[key]
+                for key in self._result if key in self._keys}
+
+    def __iter__(self):
+        return iter(self._materialize())
+
+    def __len__(self) -> int:
+        return len(self._materialize())
+
+
+def _final_excited_states(parsed: CCDATA, target: Dict) -> Tuple[int, int]:
+    """ Start and end index of the excited states of the final structure
+    """
+    # In an optimization calculation, all excited state energies are stored
+    # in the same list. We need to exract the excited state energy for the
+    # final state -- which is expected to be the last part. This is already
+    # done if _parse could seek to the final excited state block.
+    num_optimization_steps = target['optimization_steps']
+    if (num_optimization_steps and
+            not getattr(parsed, 'final_excited_states_only', False)):
+        num_excited_states = int(len(parsed.etenergies) /
+                                 num_optimization_steps)
+
+        excited_state_start_index = ((num_optimization_steps - 1) *
+                                     num_excited_states)
+    else:
+        num_excited_states = len(parsed.etenergies)
+        excited_state_start_index = 0
+
+    return (excited_state_start_index,
+            excited_state_start_index + num_excited_states)
+
+
+def _excited_state_symmetries(
+    symmetries: List[Text]
+) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """ Lower case multiplicities and symmetry groups of cclib excited state
+    symmetries, e.g. 'Singlet-A', as string arrays
+    """
+    symmetries = numpy.asarray(symmetries, dtype=str).reshape(-1)
+    if not len(symmetries):
+        return symmetries, symmetries
+    parts = numpy.char.partition(symmetries, '-')
+    return numpy.char.lower(parts[:, 0]), parts[:, 2]
+
+
+def _multiplicity_groups(
+    multiplicities: numpy.ndarray
+) -> Dict[Text, numpy.ndarray]:
+    """ Indices of the states of each multiplicity of the result, states of
+    any other multiplicity go to 'unknown'
+    """
+    known = numpy.isin(multiplicities, ['singlet', 'triplet'])
+    return {
+        'singlet': numpy.flatnonzero(multiplicities == 'singlet'),
+        'triplet': numpy.flatnonzero(multiplicities == 'triplet'),
+        'unknown': numpy.flatnonzero(~known),
+    }
+
+
+def _contribution_columns(
+    etsecs: List[List]
+) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """ indptr and the columns (from, from spin, to, to spin, coefficient) of
+    the cclib contributions of some states, orbitals numbered from 1.
+    Contributions indptr[i]:indptr[i + 1] belong to state i.
+    """
+    indptr = numpy.zeros(len(etsecs) + 1, numpy.int64)
+    numpy.cumsum([len(contributions) for contributions in etsecs],
+                 out=indptr[1:])
+    columns = numpy.fromiter(
+        itertools.chain.from_iterable(
+            (from_[0], from_[1], to[0], to[1], coefficient)
+            for contributions in etsecs
+            for from_, to, coefficient in contributions),
+        numpy.float64, count=5 * indptr[-1]).reshape(-1, 5)
+    columns[:, 0] += 1
+    columns[:, 2] += 1
+    return indptr, columns
+
+
+def _orbital_labels(orbitals: numpy.ndarray,
+                    spins: numpy.ndarray) -> List[Text]:
+    """ Unrestricted orbital labels, e.g. '12B', each distinct one is only
+    formatted once
+    """
+    codes, inverse = numpy.unique(
+        orbitals.astype(numpy.int64) * 2 + spins.astype(numpy.int64),
+        return_inverse=True)
+    labels = ['{}{}'.format(code // 2, compact_result.SPIN_LABELS[code % 2])
+              for code in codes.tolist()]
+    return [labels[index] for index in inverse.tolist()]
+
 
 class GenericExtractor(ExtractorBase):
     """ Extractor that works on most of the quantum chemistry properties
@@ -207,7 +561,7 @@ class GenericExtractor(ExtractorBase):
     def _extractor_num_basis_sets(self, parsed: CCDATA, target: Dict) -> None:
         pass
 
-    @extractor(provides=['restricted'])
+    @extractor(provides=['restricted'], attributes=['moenergies'])
     def _extractor_restricted(self, parsed: CCDATA, target: Dict) -> None:
         if not hasattr(parsed, 'moenergies'):
             target['restricted'] = None
@@ -218,7 +572,8 @@ class GenericExtractor(ExtractorBase):
             else:
                 target['restricted'] = False
 
-    @extractor(dependencies=['restricted'], provides=['mos'])
+    @extractor(dependencies=['restricted'], provides=['mos'],
+               attributes=['nmo', 'moenergies', 'mosyms'])
     def _extractor_mos(self, parsed: CCDATA, target: Dict) -> None:
         """ Extracts MOs
         """
@@ -228,11 +583,12 @@ class GenericExtractor(ExtractorBase):
                           if hasattr(parsed, 'nmo') else None)
 
         mo_operations = [
-            # MO energies are in eV, we translate it to Hartree
-            ('energies', 'moenergies', lambda v: v * EV_TO_HARTREE),
-            ('symmetric_group', 'mosyms', lambda v: v)
+            # MO energies are in eV, we translate them to Hartree at once
+            ('energies', 'moenergies',
+             lambda v: list(numpy.asarray(v) * EV_TO_HARTREE)),
+            ('symmetric_group', 'mosyms', list)
         ]
-        
+
         for base_key, prop, transform in mo_operations:
             task = []
             if hasattr(parsed, prop):
@@ -245,18 +601,19 @@ class GenericExtractor(ExtractorBase):
                              getattr(parsed, prop)[1])]
 
             for key, data in task:
-                mos[key] = [
-                    transform(item)    
-                    for item in data
-                ]
+                mos[key] = transform(data)
 
-    @extractor(provides=['num_electrons'])
+    @extractor(provides=['num_electrons'],
+               # nelectrons is computed from these in recent cclib versions
+               attributes=['nelectrons', 'atomnos', 'charge',
+                           'coreelectrons', 'homos'])
     def _extractor_num_electrons(self, parsed: CCDATA, target: Dict) -> None:
         target['num_electrons'] = None
         if hasattr(parsed, 'nelectrons'):
             target['num_electrons'] = parsed.nelectrons
     
-    @extractor(provides=['atom_symbols', 'atom_numbers'])
+    @extractor(provides=['atoms', 'atom_symbols', 'atom_numbers'],
+               attributes=['atomnos'])
     def _extract_atom_data(self, parsed: CCDATA, target: Dict) -> None:
         target['atoms'] = {}
         atoms =target['atoms']
@@ -265,6 +622,7 @@ class GenericExtractor(ExtractorBase):
         if not hasattr(parsed, 'atomnos'):
             return
 
+        import periodictable
         atoms['numbers'] = parsed.atomnos.tolist()
         atoms['symbols'] = [
             periodictable.elements[i].symbol
@@ -272,7 +630,9 @@ class GenericExtractor(ExtractorBase):
         ]
 
     @extractor(dependencies=['atom_symbols'],
-               provides=['optimization', 'atom_coordinates'])
+               provides=['atoms', 'optimization', 'optimization_steps',
+                         'atom_coordinates'],
+               attributes=['optstatus', 'atomcoords'])
     def _extractor_optimizations(self, parsed: CCDATA, target: Dict) -> None:
         if not hasattr(parsed, 'optstatus'):
             target['optimization_steps'] = 0
@@ -288,7 +648,7 @@ class GenericExtractor(ExtractorBase):
                 for atom_coord in parsed.converged_geometries[-1]
             ]
 
-    @extractor(provides=['scf_energy'])
+    @extractor(provides=['scf_energy'], attributes=['scfenergies'])
     def _extractor_scf_energy(self, parsed: CCDATA, target: Dict) -> None:
         """ Extracts SCF energy
         """
@@ -311,7 +671,9 @@ class GenericExtractor(ExtractorBase):
         """
         # FIXME complete CC part
 
-    @extractor(dependencies=['scf_energy', 'restricted', 'optimization'])
+    @extractor(dependencies=['scf_energy', 'restricted', 'optimization'],
+               provides=['excited_states'],
+               attributes=EXCITED_STATE_ATTRIBUTES)
     def _extractor_excited_states(self, parsed: CCDATA, target: Dict) -> None:
         """ Extract excited states
         """
@@ -329,65 +691,48 @@ class GenericExtractor(ExtractorBase):
             # No excited state calculation
             return
 
-        # In an optimization calculation, all excited state energies are stored
-        # in the same list. We need to exract the excited state energy for the
-        # final state -- which is expected to be the last part
-        num_optimization_steps = target['optimization_steps']
-        if num_optimization_steps:
-            num_excited_states = int(len(parsed.etenergies) /
-                                    num_optimization_steps)
-
-            excited_state_start_index = ((num_optimization_steps - 1) * 
-                                         num_excited_states)
+        # Every column of the final states is sliced and converted at once,
+        # only the dicts of the result are built one by one
+        start, end = _final_excited_states(parsed, target)
+        multiplicities, sym_groups = _excited_state_symmetries(
+            parsed.etsyms[start:end])
+        oscillator_strengths = numpy.asarray(
+            parsed.etoscs[start:end]).tolist()
+        excitation_energies = (numpy.asarray(parsed.etenergies[start:end]) *
+                               RECCM_TO_HARTREE).tolist()
+        indptr, columns = _contribution_columns(parsed.etsecs[start:end])
+
+        froms = columns[:, 0].astype(numpy.int64).tolist()
+        tos = columns[:, 2].astype(numpy.int64).tolist()
+        coefficients = columns[:, 4]
+        if target['restricted']:
+            # cclib authors normalize the values by default, we need to
+            # normalize it back...
+            coefficients = coefficients / SQRT_2
         else:
-            num_excited_states = len(parsed.etenergies)
-            excited_state_start_index = 0
-
-        excited_state_end_index = (excited_state_start_index +
-                                   num_excited_states)
-
-        for index in range(excited_state_start_index, excited_state_end_index):
-            sym = parsed.etsyms[index]
-            multiplicity, sym_group = sym.split('-')
-            multiplicity = multiplicity.lower()
-
-            oscillator_strength = parsed.etoscs[index]
-            excitation_energy = parsed.etenergies[index] * RECCM_TO_HARTREE
-
-            orbitals_raw = parsed.etsecs[index]
-            orbitals = []
-            if target['restricted']:
-                for item in orbitals_raw:
-                    orbitals.append({
-                        'from': item[0][0] + 1,
-                        'to': item[1][0] + 1,
-                        # cclib authors normalize the values by default, we
-                        # need to normalize it back...
-                        'coefficient': item[2] / SQRT_2
-                    })
-            else:
-                for item in orbitals_raw:
-                    orbitals.append({
-                        'from': '{}{}'.format(item[0][0] + 1,
-                                              ['A', 'B'][item[0][1]]),
-                        'to': '{}{}'.format(item[1][0] + 1,
-                                            ['A', 'B'][item[1][1]]),
-                        'coefficient': item[2]
-                    })
-
-            state_list = (excited_states[multiplicity]
-                          if multiplicity in excited_states
-                          else excited_states['unknown'])
-            state_list.append({
-                'multiplicity': multiplicity,
-                'symmetric_group': sym_group,
-                'oscillator_strength': oscillator_strength,
-                'excitation_energy': excitation_energy,
-                'orbitals': orbitals,
-            })
+            froms = _orbital_labels(columns[:, 0], columns[:, 1])
+            tos = _orbital_labels(columns[:, 2], columns[:, 3])
+        orbitals = [
+            {'from': from_, 'to': to, 'coefficient': coefficient}
+            for from_, to, coefficient in zip(froms, tos,
+                                              coefficients.tolist())
+        ]
+        indptr = indptr.tolist()
+        multiplicity_names = multiplicities.tolist()
+        sym_groups = sym_groups.tolist()
+
+        for key, indices in _multiplicity_groups(multiplicities).items():
+            excited_states[key] = [{
+                'multiplicity': multiplicity_names[index],
+                'symmetric_group': sym_groups[index],
+                'oscillator_strength': oscillator_strengths[index],
+                'excitation_energy': excitation_energies[index],
+                'orbitals': orbitals[indptr[index]:indptr[index + 1]],
+            } for index in indices.tolist()]
 
     @extractor(dependencies=['multiplicity', 'num_electrons'],
-               provides=['homo_index', 'lumo_index', 'unpaired_electrons'])
+               provides=['homo_index', 'lumo_index', 'unpaired_electrons'],
+               attributes=[])
     def extract_homo_index(self, parsed: CCDATA, target: Dict) -> None:
         target['unpaired_electrons'] = (target['multiplicity'] - 1) / 2
         target['homo_index'] = (
@@ -397,12 +742,122 @@ class GenericExtractor(ExtractorBase):
         target['lumo_index'] = target['homo_index'] + 1
 
 
+class CompactGenericExtractor(GenericExtractor):
+    """ GenericExtractor with a compact result: MO energies and coordinates
+    stay NumPy arrays and the excited states of each multiplicity are a
+    drivers.compact_result.ExcitedStateTable. The result reads like the
+    plain one, drivers.compact_result.to_plain converts it back.
+    """
+
+    @extractor(dependencies=['restricted'], provides=['mos'],
+               attributes=['nmo', 'moenergies', 'mosyms'])
+    def _extractor_mos(self, parsed: CCDATA, target: Dict) -> None:
+        target['mos'] = {}
+        mos = target['mos']
+        mos['num_mos'] = getattr(parsed, 'nmo', None)
+
+        prefixes = ([''] if target['restricted']
+                    else ['alpha_', 'beta_'])
+        for spin, prefix in enumerate(prefixes):
+            if hasattr(parsed, 'moenergies'):
+                # MO energies are in eV, we translate it to Hartree
+                mos[prefix + 'energies'] = \
+                    parsed.moenergies[spin] * EV_TO_HARTREE
+            if hasattr(parsed, 'mosyms'):
+                mos[prefix + 'symmetric_group'] = \
+                    numpy.array(parsed.mosyms[spin])
+
+    @extractor(provides=['atoms', 'atom_symbols', 'atom_numbers'],
+               attributes=['atomnos'])
+    def _extract_atom_data(self, parsed: CCDATA, target: Dict) -> None:
+        target['atoms'] = {}
+        atoms = target['atoms']
+        atoms['numbers'] = None
+        atoms['symbols'] = None
+        if not hasattr(parsed, 'atomnos'):
+            return
+
+        import periodictable
+        atoms['numbers'] = numpy.array(parsed.atomnos)
+        atoms['symbols'] = [
+            periodictable.elements[i].symbol
+            for i in atoms['numbers'].tolist()
+        ]
+
+    @extractor(dependencies=['atom_symbols'],
+               provides=['atoms', 'optimization', 'optimization_steps',
+                         'atom_coordinates'],
+               attributes=['optstatus', 'atomcoords'])
+    def _extractor_optimizations(self, parsed: CCDATA, target: Dict) -> None:
+        # Copies, so that the coordinates of every step can be freed
+        if not hasattr(parsed, 'optstatus'):
+            target['optimization_steps'] = 0
+            target['atoms']['coordinates'] = numpy.array(
+                parsed.atomcoords[-1])
+        else:
+            target['optimization_steps'] = len(parsed.optstatus)
+            # We pick up the last converged structure
+            target['atoms']['coordinates'] = numpy.array(
+                parsed.converged_geometries[-1])
+
+    @extractor(dependencies=['scf_energy', 'restricted', 'optimization'],
+               provides=['excited_states'],
+               attributes=EXCITED_STATE_ATTRIBUTES)
+    def _extractor_excited_states(self, parsed: CCDATA, target: Dict) -> None:
+        restricted = bool(target['restricted'])
+        target['excited_states'] = {
+            key: compact_result.ExcitedStateTable.empty(restricted)
+            for key in ['singlet', 'triplet', 'unknown']
+        }
+        if not hasattr(parsed, 'etenergies'):
+            return
+
+        start, end = _final_excited_states(parsed, target)
+        multiplicities, symmetric_groups = _excited_state_symmetries(
+            parsed.etsyms[start:end])
+        oscillator_strengths = numpy.asarray(parsed.etoscs[start:end])
+        excitation_energies = (numpy.asarray(parsed.etenergies[start:end]) *
+                               RECCM_TO_HARTREE)
+        indptr, columns = _contribution_columns(parsed.etsecs[start:end])
+        if restricted:
+            # cclib authors normalize the values by default, we need to
+            # normalize it back...
+            columns[:, 4] /= SQRT_2
+
+        for key, indices in _multiplicity_groups(multiplicities).items():
+            if not len(indices):
+                continue
+            states = numpy.empty(len(indices),
+                                 compact_result.EXCITED_STATE_DTYPE)
+            states['multiplicity'] = multiplicities[indices]
+            states['symmetric_group'] = symmetric_groups[indices]
+            states['oscillator_strength'] = oscillator_strengths[indices]
+            states['excitation_energy'] = excitation_energies[indices]
+
+            # The contribution rows of the states of this multiplicity
+            lengths = indptr[indices + 1] - indptr[indices]
+            state_indptr = numpy.zeros(len(indices) + 1, numpy.int64)
+            numpy.cumsum(lengths, out=state_indptr[1:])
+            rows = (numpy.repeat(indptr[indices] - state_indptr[:-1],
+                                 lengths) +
+                    numpy.arange(state_indptr[-1]))
+            contributions = numpy.empty(len(rows),
+                                        compact_result.CONTRIBUTION_DTYPE)
+            for column, name in enumerate(
+                    compact_result.CONTRIBUTION_DTYPE.names):
+                contributions[name] = columns[rows, column]
+
+            target['excited_states'][key] = compact_result.ExcitedStateTable(
+                states, state_indptr, contributions, restricted)
+
+
 class NTOExtractor(ExtractorBase):
 
     # We collect NTO orbtitals that contributes more than 1% of the excited state
     NTO_CRITERIA = 0.01
 
-    @extractor(provides=['nto_contributions'])
+    @extractor(provides=['nto_contributions'],
+               attributes=['moenergies', 'homos'])
     def _extract_nto_coefficients(self, parsed: CCDATA, target: Dict) -> None:
         target['nto_contributions'] = None
 
@@ -430,6 +885,125 @@ class NTOExtractor(ExtractorBase):
         target['nto_contributions'] = result
 
 
+class FchkNTOExtractor(ExtractorBase):
+    """ NTOExtractor reading the NTO eigenvalues from the fchk written with
+    the NTOs: only two fields are read, instead of parsing the whole log
+    """
+
+    FILE_TYPE = 'fchk'
+
+    NTO_CRITERIA = NTOExtractor.NTO_CRITERIA
+
+    # The only fields of the fchk the NTO contributions are read from
+    NTO_FIELDS = ['Number of alpha electrons', 'Alpha Orbital Energies']
+
+    def _parse(self, fchk_file_name: str,
+               attributes: Set[Text] = None) -> Dict[Text, Any]:
+        """ Read the NTO fields, the fchk is closed before extracting """
+        with FchkFile(fchk_file_name) as fchk:
+            missing = [name for name in self.NTO_FIELDS if name not in fchk]
+            if missing:
+                raise RuntimeError(
+                    '{} has no {}, it was not written with the NTOs'.format(
+                        fchk_file_name, ', '.join(missing)))
+            return {name: fchk[name] for name in self.NTO_FIELDS}
+
+    @extractor(provides=['nto_contributions'], attributes=[])
+    def _extract_nto_coefficients(self, parsed: Dict[Text, Any],
+                                  target: Dict) -> None:
+        # The eigenvalues are in Hartree in the fchk, no unit conversion
+        homo = parsed['Number of alpha electrons'] - 1
+        contributions = parsed['Alpha Orbital Energies'][homo::-1]
+        selected = contributions > self.NTO_CRITERIA
+        num_contributions = (len(selected) if selected.all()
+                             else int(selected.argmin()))
+
+        target['nto_contributions'] = [{
+            # Orbit number starts with 0
+            'from': homo - index + 1,
+            'to': homo + index + 2,
+            'contribution': contribution
+        } for index, contribution in enumerate(
+            contributions[:num_contributions].tolist())]
+
+
+def _extract_log(extractor_class: Type[ExtractorBase],
+                 log_file_name: Text,
+                 cache: ExtractCache = None) -> ExtractResult:
+    """ Worker entry for extract_logs, must stay at module level so the
+    process pool can pickle it
+    """
+    return extractor_class().extract(log_file_name, cache=cache)
+
+
+def submit_logs(tasks: Dict[Text, Tuple[Type[ExtractorBase], Text]],
+                pool: concurrent.futures.Executor,
+                cache: ExtractCache = None
+                ) -> Dict[Text, concurrent.futures.Future]:
+    """ Start the extraction of a set of log files in a pool shared with
+    other work, collect the results with gather_logs
+    """
+    return {
+        key: pool.submit(_extract_log, extractor_class, log_file_name, cache)
+        for key, (extractor_class, log_file_name) in tasks.items()
+    }
+
+
+def gather_logs(tasks: Dict[Text, Tuple[Type[ExtractorBase], Text]],
+                futures: Dict[Text, concurrent.futures.Future]
+                ) -> Dict[Text, ExtractResult]:
+    results: Dict[Text, ExtractResult] = {}
+    for key, future in futures.items():
+        try:
+            results[key] = future.result()
+        except Exception as e:
+            raise RuntimeError('Failed to extract {}: {}'.format(
+                tasks[key][1], e
+            )) from e
+    return results
+
+
+def pool_context() -> multiprocessing.context.BaseContext:
+    """ Start method of the extraction workers. They are started once
+    threads are running, e.g. the cubegen scheduler, and forking then could
+    clone a lock held by one of them.
+    """
+    return multiprocessing.get_context(
+        'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods()
+        else 'spawn')
+
+
+def extract_logs(tasks: Dict[Text, Tuple[Type[ExtractorBase], Text]],
+                 jobs: int = 1,
+                 cache: ExtractCache = None,
+                 pool: concurrent.futures.Executor = None
+                 ) -> Dict[Text, ExtractResult]:
+    """ Extract a set of log files, keyed the same way as tasks.
+
+    Each task is a pair of (extractor class, log file name). With jobs > 1 the
+    logs are parsed in a process pool, since cclib parsing is CPU bound; an
+    existing pool can be given instead.
+    """
+    if pool is not None:
+        return gather_logs(tasks, submit_logs(tasks, pool, cache))
+
+    if jobs <= 1:
+        results: Dict[Text, ExtractResult] = {}
+        for key, (extractor_class, log_file_name) in tasks.items():
+            try:
+                results[key] = _extract_log(extractor_class, log_file_name,
+                                            cache)
+            except Exception as e:
+                raise RuntimeError('Failed to extract {}: {}'.format(
+                    log_file_name, e
+                )) from e
+        return results
+
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=jobs, mp_context=pool_context()) as pool:
+        return gather_logs(tasks, submit_logs(tasks, pool, cache))
+
+
 if __name__ == '__main__':
     import sys
     import pprint
@@ -0,0 +1,267 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Compact columnar storage of the bulky parts of an extraction result.
+
+MO energies and atom coordinates stay NumPy arrays, the excited states of
+a multiplicity are one structured array plus their orbital contributions in
+CSR form: contribution rows indptr[i]:indptr[i + 1] belong to state i. The
+records handed out are read-only views with __slots__ that compare equal to,
+and are read like, the nested dicts and lists of the plain result, so the
+LaTeX backend works on either.
+"""
+
+import collections.abc
+
+from typing import Any, Dict, List, Text
+
+import numpy
+
+SPIN_ALPHA = 0
+SPIN_BETA = 1
+SPIN_LABELS = ['A', 'B']
+
+EXCITED_STATE_DTYPE = numpy.dtype([
+    ('multiplicity', 'U16'),
+    ('symmetric_group', 'U16'),
+    ('oscillator_strength', '<f8'),
+    ('excitation_energy', '<f8'),
+])
+
+CONTRIBUTION_DTYPE = numpy.dtype([
+    ('from', '<i4'),
+    ('from_spin', 'i1'),
+    ('to', '<i4'),
+    ('to_spin', 'i1'),
+    ('coefficient', '<f8'),
+])
+
+
+class Contribution(collections.abc.Mapping):
+    """ One orbital contribution, read as {'from', 'to', 'coefficient'}.
+    Orbitals start at 1, unrestricted ones are labelled with their spin,
+    e.g. '12A', as in the plain result.
+    """
+
+    __slots__ = ('_table', '_index')
+
+    KEYS = ('from', 'to', 'coefficient')
+
+    def __init__(self, table: 'ExcitedStateTable', index: int):
+        self._table = table
+        self._index = index
+
+    def _orbital(self, name: Text):
+        row = self._table.contributions[self._index]
+        if self._table.restricted:
+            return int(row[name])
+        return '{}{}'.format(row[name], SPIN_LABELS[row[name + '_spin']])
+
+    @property
+    def from_spin(self) -> int:
+        return int(self._table.contributions['from_spin'][self._index])
+
+    @property
+    def to_spin(self) -> int:
+        return int(self._table.contributions['to_spin'][self._index])
+
+    def __getitem__(self, key: Text) -> Any:
+        if key == 'coefficient':
+            return self._table.contributions['coefficient'][self._index]
+        if key in ('from', 'to'):
+            return self._orbital(key)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self) -> int:
+        return len(self.KEYS)
+
+    def __repr__(self) -> Text:
+        return repr(dict(self))
+
+
+class _SequenceView(collections.abc.Sequence):
+
+    __slots__ = ()
+
+    def __eq__(self, other):
+        if not isinstance(other, collections.abc.Sequence):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def __repr__(self) -> Text:
+        return repr(list(self))
+
+
+class Contributions(_SequenceView):
+    """ The contributions of one excited state """
+
+    __slots__ = ('_table', '_start', '_stop')
+
+    def __init__(self, table: 'ExcitedStateTable', start: int, stop: int):
+        self._table = table
+        self._start = start
+        self._stop = stop
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return Contribution(self._table, self._start + index)
+
+    def __len__(self) -> int:
+        return self._stop - self._start
+
+
+class ExcitedState(collections.abc.Mapping):
+    """ One excited state, read as the dict of the plain result """
+
+    __slots__ = ('_table', '_index')
+
+    KEYS = ('multiplicity', 'symmetric_group', 'oscillator_strength',
+            'excitation_energy', 'orbitals')
+
+    def __init__(self, table: 'ExcitedStateTable', index: int):
+        self._table = table
+        self._index = index
+
+    def __getitem__(self, key: Text) -> Any:
+        if key == 'orbitals':
+            indptr = self._table.indptr
+            return Contributions(self._table, int(indptr[self._index]),
+                                 int(indptr[self._index + 1]))
+        if key in ('multiplicity', 'symmetric_group'):
+            return str(self._table.states[key][self._index])
+        if key in self.KEYS:
+            return self._table.states[key][self._index]
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self) -> int:
+        return len(self.KEYS)
+
+    def __repr__(self) -> Text:
+        return repr(dict(self))
+
+
+class ExcitedStateTable(_SequenceView):
+    """ The excited states of one multiplicity, read as a list of states
+    """
+
+    __slots__ = ('states', 'indptr', 'contributions', 'restricted')
+
+    def __init__(self,
+                 states: numpy.ndarray,
+                 indptr: numpy.ndarray,
+                 contributions: numpy.ndarray,
+                 restricted: bool):
+        self.states = states
+        self.indptr = indptr
+        self.contributions = contributions
+        self.restricted = restricted
+
+    @classmethod
+    def empty(cls, restricted: bool = True) -> 'ExcitedStateTable':
+        return cls(numpy.empty(0, EXCITED_STATE_DTYPE),
+                   numpy.zeros(1, numpy.int64),
+                   numpy.empty(0, CONTRIBUTION_DTYPE), restricted)
+
+    @classmethod
+    def from_states(cls,
+                    states: List[Dict],
+                    restricted: bool) -> 'ExcitedStateTable':
+        """ Table of excited states in the form of the plain result """
+        table = numpy.empty(len(states), EXCITED_STATE_DTYPE)
+        indptr = numpy.zeros(len(states) + 1, numpy.int64)
+        rows = []
+        for index, state in enumerate(states):
+            table[index] = tuple(state[name]
+                                 for name in EXCITED_STATE_DTYPE.names)
+            for orbital in state['orbitals']:
+                rows.append(_parse_orbital(orbital['from']) +
+                            _parse_orbital(orbital['to']) +
+                            (orbital['coefficient'],))
+            indptr[index + 1] = len(rows)
+        return cls(table, indptr,
+                   numpy.array(rows, CONTRIBUTION_DTYPE), restricted)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return ExcitedState(self, index)
+
+    def __len__(self) -> int:
+        return len(self.states)
+
+    @property
+    def nbytes(self) -> int:
+        return (self.states.nbytes + self.indptr.nbytes +
+                self.contributions.nbytes)
+
+
+def _parse_orbital(orbital) -> tuple:
+    """ (orbital, spin) of an orbital of the plain result, 12 or '12A' """
+    if isinstance(orbital, str):
+        return int(orbital[:-1]), SPIN_LABELS.index(orbital[-1])
+    return int(orbital), SPIN_ALPHA
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, numpy.ndarray):
+        return value.tolist()
+    if isinstance(value, collections.abc.Mapping):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, collections.abc.Sequence) and \
+            not isinstance(value, str):
+        return [_plain(item) for item in value]
+    if isinstance(value, numpy.generic):
+        return value.item()
+    return value
+
+
+def to_plain(result: Dict) -> Dict:
+    """ The nested dicts and lists of Python scalars of a compact (or plain)
+    result, e.g. to dump it as JSON
+    """
+    return _plain(result)
+
+
+def to_compact(result: Dict) -> Dict:
+    """ Compact copy of a plain extraction result of GenericExtractor """
+    result = dict(result)
+    restricted = bool(result.get('restricted', True))
+
+    mos = result.get('mos')
+    if mos:
+        result['mos'] = {
+            key: (numpy.asarray(value) if isinstance(value, list) else value)
+            for key, value in mos.items()
+        }
+
+    atoms = result.get('atoms')
+    if atoms:
+        atoms = result['atoms'] = dict(atoms)
+        for key in ('numbers', 'coordinates'):
+            if isinstance(atoms.get(key), list):
+                atoms[key] = numpy.asarray(atoms[key])
+
+    excited_states = result.get('excited_states')
+    if excited_states:
+        result['excited_states'] = {
+            multiplicity: (
+                states if isinstance(states, ExcitedStateTable)
+                else ExcitedStateTable.from_states(states, restricted)
+            )
+            for multiplicity, states in excited_states.items()
+        }
+    return result
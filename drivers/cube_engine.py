@@ -0,0 +1,443 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" In-process replacement of cubegen for molecular orbital cubes.
+
+The contracted Gaussian basis of a formatted checkpoint file is evaluated
+once per block of grid points, and all the requested MOs are obtained from
+it with a single matrix product.
+"""
+
+import logging
+import math
+import os.path
+
+from typing import Dict, List, Text, Tuple
+
+import numpy
+
+from drivers.cube_file import (
+    BINARY_CUBE_SUFFIX,
+    BinaryCubeWriter,
+    CubeHeader,
+    format_values,
+    read_cube,
+    read_header
+)
+from drivers.fchk_reader import FchkFile
+
+logger = logging.getLogger(__name__)
+
+# Points per Bohr of the cubegen default grids, keyed by negative npts
+DEFAULT_GRID_DENSITIES = {
+    -1: 3,
+    -2: 6,
+    -3: 12,
+}
+# Distance in Bohr between the molecule and the border of the default box
+DEFAULT_GRID_MARGIN = 5.0
+
+# A shell is skipped for points where exp(-alpha * r^2) < exp(-SCREENING)
+# for its most diffuse primitive
+SCREENING = 40.0
+
+# Memory budget for the basis function values of one block of grid points
+BLOCK_BYTES = 64 << 20
+
+# Order of the Cartesian functions of each angular momentum in Gaussian
+CARTESIAN_ORDERS = {
+    0: [(0, 0, 0)],
+    1: [(1, 0, 0), (0, 1, 0), (0, 0, 1)],
+    2: [(2, 0, 0), (0, 2, 0), (0, 0, 2), (1, 1, 0), (1, 0, 1), (0, 1, 1)],
+    3: [(3, 0, 0), (0, 3, 0), (0, 0, 3), (1, 2, 0), (2, 1, 0), (2, 0, 1),
+        (1, 0, 2), (0, 1, 2), (0, 2, 1), (1, 1, 1)],
+    4: [(0, 0, 4), (0, 1, 3), (0, 2, 2), (0, 3, 1), (0, 4, 0), (1, 0, 3),
+        (1, 1, 2), (1, 2, 1), (1, 3, 0), (2, 0, 2), (2, 1, 1), (2, 2, 0),
+        (3, 0, 1), (3, 1, 0), (4, 0, 0)],
+}
+
+
+def _double_factorial(n: int) -> int:
+    return 1 if n <= 0 else n * _double_factorial(n - 2)
+
+
+def _pure_orders(l: int) -> List[int]:
+    """ Order of the pure functions in Gaussian, i.e. 0, +1, -1, +2, -2...
+    """
+    orders = [0]
+    for m in range(1, l + 1):
+        orders.extend([m, -m])
+    return orders
+
+
+def _all_monomials(l: int) -> List[tuple]:
+    return [(a, b, l - a - b)
+            for a in range(l, -1, -1)
+            for b in range(l - a, -1, -1)]
+
+
+def _pure_transform(l: int):
+    """ Coefficients of the real solid harmonics in the monomials of degree l
+    (Helgaker, Jorgensen, Olsen, eq. 6.4.47), normalized like the Cartesian
+    x^l function. Returns the monomials and a (monomials x 2l+1) matrix.
+    """
+    monomials = _all_monomials(l)
+    columns = {monomial: i for i, monomial in enumerate(monomials)}
+    transform = numpy.zeros((len(monomials), 2 * l + 1))
+
+    for column, m in enumerate(_pure_orders(l)):
+        abs_m = abs(m)
+        norm = (math.sqrt(2 * math.factorial(l + abs_m) *
+                          math.factorial(l - abs_m) /
+                          (2.0 if m == 0 else 1.0)) /
+                (2 ** abs_m * math.factorial(l)))
+        # v runs over integers for m >= 0 and half integers for m < 0, we
+        # loop over 2v instead
+        for t in range((l - abs_m) // 2 + 1):
+            for u in range(t + 1):
+                for two_v in range(0 if m >= 0 else 1, abs_m + 1, 2):
+                    coefficient = (
+                        (-1) ** (t + (two_v - (0 if m >= 0 else 1)) // 2) *
+                        0.25 ** t *
+                        math.comb(l, t) * math.comb(l - t, abs_m + t) *
+                        math.comb(t, u) * math.comb(abs_m, two_v)
+                    )
+                    power_y = 2 * u + two_v
+                    power_x = 2 * t + abs_m - power_y
+                    power_z = l - 2 * t - abs_m
+                    transform[columns[(power_x, power_y, power_z)],
+                              column] += norm * coefficient
+
+    return monomials, transform
+
+
+def _cartesian_transform(l: int):
+    """ Each Cartesian function normalized on its own, relative to x^l
+    """
+    monomials = CARTESIAN_ORDERS[l]
+    norms = [math.sqrt(_double_factorial(2 * l - 1) /
+                       (_double_factorial(2 * a - 1) *
+                        _double_factorial(2 * b - 1) *
+                        _double_factorial(2 * c - 1)))
+             for a, b, c in monomials]
+    return monomials, numpy.diag(norms)
+
+
+def _radial_coefficients(l: int,
+                         exponents: numpy.ndarray,
+                         coefficients: numpy.ndarray) -> numpy.ndarray:
+    """ Contraction coefficients including the normalization of the x^l
+    primitives, and renormalized so the contracted function is normalized
+    """
+    primitive_norms = ((2 * exponents / math.pi) ** 0.75 *
+                       (4 * exponents) ** (l / 2) /
+                       math.sqrt(_double_factorial(2 * l - 1)))
+    overlaps = (2 * numpy.sqrt(numpy.outer(exponents, exponents)) /
+                numpy.add.outer(exponents, exponents)) ** (l + 1.5)
+    contraction_norm = math.sqrt(coefficients @ overlaps @ coefficients)
+    return coefficients * primitive_norms / contraction_norm
+
+
+class _Shell(object):
+
+    def __init__(self, l: int, pure: bool, center: numpy.ndarray,
+                 exponents: numpy.ndarray, coefficients: numpy.ndarray,
+                 first_function: int):
+        self.l = l
+        self.center = center
+        self.exponents = exponents
+        self.coefficients = _radial_coefficients(l, exponents, coefficients)
+        if pure and l > 1:
+            self.monomials, self.transform = _pure_transform(l)
+        else:
+            self.monomials, self.transform = _cartesian_transform(l)
+        self.powers = numpy.array(self.monomials).T
+        self.first_function = first_function
+        self.num_functions = self.transform.shape[1]
+        self.cutoff = SCREENING / exponents.min()
+
+    def evaluate(self, points: numpy.ndarray, output: numpy.ndarray) -> None:
+        """ Write the values of the shell functions at points into the
+        corresponding columns of output
+        """
+        delta = points - self.center
+        r2 = numpy.einsum('ij,ij->i', delta, delta)
+        mask = r2 < self.cutoff
+        if not mask.any():
+            return
+        delta = delta[mask]
+        radial = numpy.exp(-numpy.multiply.outer(r2[mask], self.exponents)
+                           ) @ self.coefficients
+
+        if self.l == 0:
+            angular = numpy.ones((len(delta), 1))
+        else:
+            angular = (delta[:, 0, None] ** self.powers[0] *
+                       delta[:, 1, None] ** self.powers[1] *
+                       delta[:, 2, None] ** self.powers[2]) @ self.transform
+
+        columns = slice(self.first_function,
+                        self.first_function + self.num_functions)
+        output[mask, columns] = radial[:, None] * angular
+
+
+class Basis(object):
+    """ Contracted Gaussian basis set read from a formatted checkpoint file
+    """
+
+    def __init__(self, fchk: FchkFile):
+        shell_types = fchk['Shell types']
+        num_primitives = fchk['Number of primitives per shell']
+        exponents = fchk['Primitive exponents']
+        coefficients = fchk['Contraction coefficients']
+        sp_coefficients = fchk.get('P(S=P) Contraction coefficients')
+        centers = fchk['Coordinates of each shell'].reshape(-1, 3)
+
+        self.shells: List[_Shell] = []
+        function = 0
+        primitive = 0
+        for shell_type, count, center in zip(shell_types, num_primitives,
+                                             centers):
+            primitives = slice(primitive, primitive + count)
+            primitive += count
+            if shell_type == -1:
+                # SP shell, an S shell and a P shell sharing exponents
+                parts = [(0, coefficients[primitives]),
+                         (1, sp_coefficients[primitives])]
+            else:
+                parts = [(abs(shell_type), coefficients[primitives])]
+            for l, shell_coefficients in parts:
+                if l not in CARTESIAN_ORDERS:
+                    raise NotImplementedError(
+                        'Shells with l={} are not supported'.format(l))
+                shell = _Shell(l, shell_type < -1, center,
+                               exponents[primitives], shell_coefficients,
+                               function)
+                self.shells.append(shell)
+                function += shell.num_functions
+
+        self.num_functions = function
+        if function != fchk['Number of basis functions']:
+            raise RuntimeError(
+                'Built {} basis functions while {} declares {}'.format(
+                    function, fchk.file_name,
+                    fchk['Number of basis functions']))
+
+    def evaluate(self, points: numpy.ndarray) -> numpy.ndarray:
+        """ Values of all basis functions, shape (points, functions)
+        """
+        values = numpy.zeros((len(points), self.num_functions))
+        for shell in self.shells:
+            shell.evaluate(points, values)
+        return values
+
+
+def default_grid(fchk: FchkFile, npts: int = -2) -> CubeHeader:
+    """ Grid enclosing the molecule with DEFAULT_GRID_MARGIN, npts has the
+    cubegen meaning: a negative value selects a density in points per Bohr,
+    a positive value the number of points per side.
+    """
+    coordinates = fchk['Current cartesian coordinates'].reshape(-1, 3)
+    low = coordinates.min(axis=0) - DEFAULT_GRID_MARGIN
+    high = coordinates.max(axis=0) + DEFAULT_GRID_MARGIN
+
+    if npts < 0:
+        step = 1.0 / DEFAULT_GRID_DENSITIES[npts]
+        shape = numpy.ceil((high - low) / step).astype(int) + 1
+        steps = numpy.full(3, step)
+    else:
+        shape = numpy.full(3, npts)
+        steps = (high - low) / (npts - 1)
+
+    return CubeHeader(
+        title=' Formatted checkpoint file {}'.format(
+            os.path.basename(fchk.file_name)),
+        comment=' MO coefficients',
+        origin=low,
+        shape=shape,
+        axes=numpy.diag(steps),
+        atom_numbers=fchk['Atomic numbers'],
+        atom_charges=fchk['Nuclear charges'],
+        atom_coordinates=coordinates,
+    )
+
+
+def grid_from_cube(cube_file: Text) -> CubeHeader:
+    """ Reuse the grid of an existing cube, e.g. one written by cubegen
+    """
+    with open(cube_file, 'r') as stream:
+        return read_header(stream)
+
+
+def _mo_spin_number(mo, num_mos: int) -> Tuple[int, int]:
+    """ Spin (0 alpha, 1 beta) and 1-based number of an MO, given as in the
+    unrestricted excited states, e.g. '12B', or as cubegen numbers them: 1
+    to num_mos for the alpha MOs, then the beta MOs
+    """
+    if isinstance(mo, str) and mo[-1:] in ('A', 'B'):
+        return (0 if mo[-1] == 'A' else 1), int(mo[:-1])
+    mo = int(mo)
+    if mo > num_mos:
+        return 1, mo - num_mos
+    return 0, mo
+
+
+def _num_mos(fchk: FchkFile) -> int:
+    """ Number of MOs per spin """
+    return (len(fchk['Alpha MO coefficients']) //
+            fchk['Number of basis functions'])
+
+
+def cube_mo_number(fchk: FchkFile, mo) -> int:
+    """ Number of an MO in the header of its cube, as cubegen writes it """
+    num_mos = _num_mos(fchk)
+    spin, number = _mo_spin_number(mo, num_mos)
+    return number + spin * num_mos
+
+
+def mo_coefficients(fchk: FchkFile, mos: List) -> numpy.ndarray:
+    """ Coefficients of the (1-based) MOs, shape (functions, mos). Beta MOs
+    are read from the Beta MO coefficients of an unrestricted fchk.
+    """
+    num_functions = fchk['Number of basis functions']
+    num_mos = _num_mos(fchk)
+    spin_coefficients = [fchk['Alpha MO coefficients'],
+                         fchk.get('Beta MO coefficients')]
+
+    columns = []
+    for mo in mos:
+        spin, number = _mo_spin_number(mo, num_mos)
+        coefficients = spin_coefficients[spin]
+        if coefficients is None:
+            raise ValueError('MO {} is a beta orbital, but {} has no beta '
+                             'MO coefficients'.format(mo, fchk.file_name))
+        if not 1 <= number <= num_mos:
+            raise ValueError('No MO {} in {}, it has {} MOs per spin'.format(
+                mo, fchk.file_name, num_mos))
+        columns.append(coefficients.reshape(-1, num_functions)[number - 1])
+    return numpy.array(columns).reshape(len(columns), num_functions).T
+
+
+def evaluate_mos(fchk: FchkFile,
+                 mos: List[int],
+                 grid: CubeHeader = None,
+                 npts: int = -2):
+    """ Evaluate MOs on a grid, yields (flat start index, values of shape
+    (points, mos)) for consecutive blocks of whole z columns. MOs are
+    numbered as in mo_coefficients.
+    """
+    basis = Basis(fchk)
+    coefficients = mo_coefficients(fchk, mos)
+    if grid is None:
+        grid = default_grid(fchk, npts)
+
+    column_length = grid.shape[2]
+    num_points = grid.shape[0] * grid.shape[1] * column_length
+    columns_per_block = max(
+        1, BLOCK_BYTES // (8 * basis.num_functions * column_length)
+    )
+    block_size = columns_per_block * column_length
+
+    for start in range(0, num_points, block_size):
+        points = grid.points(start, start + block_size)
+        yield start, basis.evaluate(points) @ coefficients
+
+
+def cube_mos(formchk_file: Text,
+             mos: List[int],
+             npts: int = -2,
+             output_dir: Text = None,
+             grid: CubeHeader = None,
+             binary: bool = False,
+             codec: Text = 'raw') -> List[Text]:
+    """ Write one {mo}.cube per MO, like cubegen_driver.cubegen_mo does for
+    a single MO, or one binary {mo}.bcube if binary is set. The cube files
+    are returned in the order of mos. Beta MOs of an unrestricted fchk are
+    given as '12B', or numbered after the alpha MOs as in cubegen.
+    """
+    mos = list(mos)
+    with FchkFile(formchk_file) as fchk:
+        if grid is None:
+            grid = default_grid(fchk, npts)
+        if output_dir is None:
+            output_dir = os.path.dirname(os.path.abspath(formchk_file))
+
+        suffix = BINARY_CUBE_SUFFIX if binary else '.cube'
+        cube_files = [os.path.join(output_dir, '{}{}'.format(mo, suffix))
+                      for mo in mos]
+        headers = [CubeHeader(grid.title, grid.comment, grid.origin,
+                              grid.shape, grid.axes, grid.atom_numbers,
+                              grid.atom_charges, grid.atom_coordinates,
+                              mos=[cube_mo_number(fchk, mo)])
+                   for mo in mos]
+
+        if binary:
+            writers = [BinaryCubeWriter(cube_file, header, codec)
+                       for cube_file, header in zip(cube_files, headers)]
+            write_values = [writer.write for writer in writers]
+        else:
+            writers = [open(cube_file, 'w') for cube_file in cube_files]
+            for writer, header in zip(writers, headers):
+                writer.write(header.format())
+            write_values = [
+                lambda values, writer=writer: writer.write(
+                    format_values(values, grid.shape[2]))
+                for writer in writers
+            ]
+
+        try:
+            for _, values in evaluate_mos(fchk, mos, grid=grid):
+                for write, column in zip(write_values, values.T):
+                    write(column)
+        finally:
+            for writer in writers:
+                writer.close()
+
+    return cube_files
+
+
+def compare_cubes(cube_file: Text, reference_cube_file: Text) -> Dict:
+    """ Differences between two cubes on the same grid, e.g. between a cube
+    from cube_mos and one from cubegen
+    """
+    header, values = read_cube(cube_file)
+    reference_header, reference_values = read_cube(reference_cube_file)
+    if header.shape != reference_header.shape:
+        raise ValueError('Cubes have different grids: {} and {}'.format(
+            header.shape, reference_header.shape))
+    # The sign of an MO is arbitrary
+    if numpy.vdot(values, reference_values) < 0:
+        values = -values
+    difference = numpy.abs(values - reference_values)
+    return {
+        'max_abs_error': float(difference.max()),
+        'rms_error': float(numpy.sqrt(numpy.mean(difference ** 2))),
+        'max_abs_value': float(numpy.abs(reference_values).max()),
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+    import pprint
+
+    parser = argparse.ArgumentParser(
+        description='Generate MO cubes from a formatted checkpoint file')
+    parser.add_argument('formchk_file')
+    parser.add_argument('mos', nargs='+',
+                        help='MO numbers, beta MOs as 12B or numbered after '
+                             'the alpha MOs')
+    parser.add_argument('--npts', type=int, default=-2)
+    parser.add_argument('--output-dir')
+    parser.add_argument('--binary', action='store_true',
+                        help='Write binary .bcube files')
+    parser.add_argument('--compare', metavar='CUBE',
+                        help='Use the grid of a cubegen cube of the first MO '
+                             'and report the differences to it')
+    args = parser.parse_args()
+
+    grid = grid_from_cube(args.compare) if args.compare else None
+    cube_files = cube_mos(args.formchk_file, args.mos, npts=args.npts,
+                          output_dir=args.output_dir, grid=grid,
+                          binary=args.binary)
+    print('\n'.join(cube_files))
+    if args.compare and not args.binary:
+        pprint.pprint(compare_cubes(cube_files[0], args.compare))
@@ -0,0 +1,309 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os.path
+import zlib
+
+from typing import Dict, List, Text
+
+import numpy
+
+# Cube files written by cubegen put 6 values per line, and start a new line
+# at the end of every z column
+VALUES_PER_LINE = 6
+VALUE_FORMAT = ' %12.5E'
+
+# Binary cubes: a JSON header line, padding up to a multiple of
+# BINARY_ALIGNMENT, then the values as little-endian float32 in cube order,
+# either raw (memory-mapped on read) or zlib-compressed
+BINARY_CUBE_SUFFIX = '.bcube'
+BINARY_CUBE_VERSION = 1
+BINARY_ALIGNMENT = 64
+BINARY_DTYPE = numpy.dtype('<f4')
+BINARY_CODECS = ['raw', 'zlib']
+
+
+class CubeHeader(object):
+    """ Everything in a cube file but the values. Coordinates are in Bohr.
+    """
+
+    def __init__(self,
+                 title: Text,
+                 comment: Text,
+                 origin: numpy.ndarray,
+                 shape: tuple,
+                 axes: numpy.ndarray,
+                 atom_numbers: numpy.ndarray,
+                 atom_charges: numpy.ndarray,
+                 atom_coordinates: numpy.ndarray,
+                 mos: List[int] = None):
+        self.title = title
+        self.comment = comment
+        self.origin = numpy.asarray(origin, dtype=float)
+        self.shape = tuple(int(n) for n in shape)
+        self.axes = numpy.asarray(axes, dtype=float)
+        self.atom_numbers = numpy.asarray(atom_numbers, dtype=int)
+        self.atom_charges = numpy.asarray(atom_charges, dtype=float)
+        self.atom_coordinates = numpy.asarray(atom_coordinates, dtype=float)
+        self.mos = list(mos) if mos else None
+
+    def to_dict(self) -> Dict:
+        return {
+            'title': self.title,
+            'comment': self.comment,
+            'origin': self.origin.tolist(),
+            'shape': list(self.shape),
+            'axes': self.axes.tolist(),
+            'atom_numbers': self.atom_numbers.tolist(),
+            'atom_charges': self.atom_charges.tolist(),
+            'atom_coordinates': self.atom_coordinates.tolist(),
+            'mos': self.mos,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'CubeHeader':
+        return cls(data['title'], data['comment'], data['origin'],
+                   data['shape'], data['axes'], data['atom_numbers'],
+                   data['atom_charges'],
+                   numpy.array(data['atom_coordinates']).reshape(-1, 3),
+                   data['mos'])
+
+    @property
+    def values_shape(self) -> tuple:
+        if self.num_values > 1:
+            return self.shape + (self.num_values,)
+        return self.shape
+
+    @property
+    def num_values(self) -> int:
+        return len(self.mos) if self.mos else 1
+
+    def points(self, start: int = 0, stop: int = None) -> numpy.ndarray:
+        """ Cartesian coordinates of the grid points with flat indices in
+        [start, stop), in the x, y, z order of the cube values
+        """
+        num_points = self.shape[0] * self.shape[1] * self.shape[2]
+        stop = num_points if stop is None else min(stop, num_points)
+        indices = numpy.unravel_index(numpy.arange(start, stop), self.shape)
+        return (self.origin +
+                numpy.stack(indices, axis=1).astype(float) @ self.axes)
+
+    def format(self) -> Text:
+        lines = [self.title, self.comment]
+        num_atoms = len(self.atom_numbers)
+        lines.append('%5d%12.6f%12.6f%12.6f%5d' % (
+            -num_atoms if self.mos else num_atoms,
+            self.origin[0], self.origin[1], self.origin[2],
+            self.num_values
+        ))
+        for count, axis in zip(self.shape, self.axes):
+            lines.append('%5d%12.6f%12.6f%12.6f' % (
+                count, axis[0], axis[1], axis[2]
+            ))
+        for number, charge, coordinate in zip(self.atom_numbers,
+                                              self.atom_charges,
+                                              self.atom_coordinates):
+            lines.append('%5d%12.6f%12.6f%12.6f%12.6f' % (
+                number, charge, coordinate[0], coordinate[1], coordinate[2]
+            ))
+        if self.mos:
+            lines.append(''.join(
+                '%5d' % value for value in [len(self.mos)] + self.mos
+            ))
+        return '\n'.join(lines) + '\n'
+
+
+def format_values(values: numpy.ndarray, column_length: int) -> Text:
+    """ Format the values of whole z columns, the size of values must be a
+    multiple of column_length
+    """
+    full_lines, remainder = divmod(column_length, VALUES_PER_LINE)
+    line_format = VALUE_FORMAT * VALUES_PER_LINE + '\n'
+    tail_format = VALUE_FORMAT * remainder + '\n'
+
+    chunks = []
+    for column in numpy.asarray(values).reshape(-1, column_length):
+        chunks.append(line_format * full_lines %
+                      tuple(column[:full_lines * VALUES_PER_LINE]))
+        if remainder:
+            chunks.append(tail_format %
+                          tuple(column[full_lines * VALUES_PER_LINE:]))
+    return ''.join(chunks)
+
+
+def read_header(stream) -> CubeHeader:
+    title = stream.readline().rstrip('\n')
+    comment = stream.readline().rstrip('\n')
+
+    fields = stream.readline().split()
+    num_atoms = int(fields[0])
+    origin = [float(v) for v in fields[1:4]]
+
+    shape = []
+    axes = []
+    for _ in range(3):
+        fields = stream.readline().split()
+        shape.append(int(fields[0]))
+        axes.append([float(v) for v in fields[1:4]])
+
+    atom_numbers = []
+    atom_charges = []
+    atom_coordinates = []
+    for _ in range(abs(num_atoms)):
+        fields = stream.readline().split()
+        atom_numbers.append(int(fields[0]))
+        atom_charges.append(float(fields[1]))
+        atom_coordinates.append([float(v) for v in fields[2:5]])
+
+    mos = None
+    if num_atoms < 0:
+        fields = stream.readline().split()
+        mos = [int(v) for v in fields[1:]]
+        while len(mos) < int(fields[0]):
+            mos.extend(int(v) for v in stream.readline().split())
+
+    return CubeHeader(title, comment, origin, shape, axes,
+                      atom_numbers, atom_charges,
+                      numpy.array(atom_coordinates).reshape(-1, 3), mos)
+
+
+def read_cube(file_name: Text):
+    """ Read a cube file, returns the header and the values with shape
+    (nx, ny, nz) or (nx, ny, nz, number of MOs)
+    """
+    with open(file_name, 'r') as stream:
+        header = read_header(stream)
+        values = numpy.array(stream.read().split(), dtype=float)
+
+    return header, values.reshape(header.values_shape)
+
+
+def write_cube(file_name: Text,
+               header: CubeHeader,
+               values: numpy.ndarray) -> None:
+    with open(file_name, 'w') as stream:
+        stream.write(header.format())
+        stream.write(format_values(
+            values.ravel(), header.shape[2] * header.num_values
+        ))
+
+
+class BinaryCubeWriter(object):
+    """ Writes the values of a binary cube block by block, in cube order
+    """
+
+    def __init__(self, file_name: Text, header: CubeHeader,
+                 codec: Text = 'raw'):
+        if codec not in BINARY_CODECS:
+            raise ValueError('Unknown codec {}'.format(codec))
+        self._stream = open(file_name, 'wb')
+        self._compressor = zlib.compressobj(1) if codec == 'zlib' else None
+
+        metadata = json.dumps({
+            'version': BINARY_CUBE_VERSION,
+            'codec': codec,
+            'dtype': BINARY_DTYPE.str,
+            'header': header.to_dict(),
+        }).encode() + b'\n'
+        padding = -len(metadata) % BINARY_ALIGNMENT
+        self._stream.write(metadata + b' ' * padding)
+
+    def write(self, values: numpy.ndarray) -> None:
+        data = numpy.ascontiguousarray(values, dtype=BINARY_DTYPE).tobytes()
+        if self._compressor is not None:
+            data = self._compressor.compress(data)
+        self._stream.write(data)
+
+    def close(self) -> None:
+        if self._compressor is not None:
+            self._stream.write(self._compressor.flush())
+        self._stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class BinaryCube(object):
+    """ A binary cube whose values are only read on first access: raw cubes
+    are memory-mapped, compressed ones decompressed
+    """
+
+    def __init__(self, file_name: Text):
+        self.file_name = file_name
+        with open(file_name, 'rb') as stream:
+            metadata_line = stream.readline()
+        metadata = json.loads(metadata_line)
+        if metadata.get('version') != BINARY_CUBE_VERSION:
+            raise ValueError('Unsupported binary cube version in {}'.format(
+                file_name))
+        self.codec = metadata['codec']
+        self.dtype = numpy.dtype(metadata['dtype'])
+        self.header = CubeHeader.from_dict(metadata['header'])
+        self._offset = (len(metadata_line) +
+                        -len(metadata_line) % BINARY_ALIGNMENT)
+        self._values = None
+
+    @property
+    def values(self) -> numpy.ndarray:
+        if self._values is None:
+            shape = self.header.values_shape
+            if self.codec == 'raw':
+                self._values = numpy.memmap(self.file_name, dtype=self.dtype,
+                                            mode='r', offset=self._offset,
+                                            shape=shape)
+            else:
+                with open(self.file_name, 'rb') as stream:
+                    stream.seek(self._offset)
+                    data = zlib.decompress(stream.read())
+                self._values = numpy.frombuffer(
+                    data, dtype=self.dtype).reshape(shape)
+        return self._values
+
+
+def write_binary_cube(file_name: Text,
+                      header: CubeHeader,
+                      values: numpy.ndarray,
+                      codec: Text = 'raw') -> None:
+    with BinaryCubeWriter(file_name, header, codec) as writer:
+        writer.write(values)
+
+
+def cube_to_binary(cube_file: Text,
+                   binary_cube_file: Text = None,
+                   codec: Text = 'raw') -> Text:
+    if binary_cube_file is None:
+        binary_cube_file = os.path.splitext(cube_file)[0] + BINARY_CUBE_SUFFIX
+    header, values = read_cube(cube_file)
+    write_binary_cube(binary_cube_file, header, values, codec)
+    return binary_cube_file
+
+
+def binary_to_cube(binary_cube_file: Text, cube_file: Text = None) -> Text:
+    """ Write a text cube for external tools, values are formatted like
+    cubegen does
+    """
+    if cube_file is None:
+        cube_file = os.path.splitext(binary_cube_file)[0] + '.cube'
+    cube = BinaryCube(binary_cube_file)
+    write_cube(cube_file, cube.header, cube.values)
+    return cube_file
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Convert between text and binary cube files')
+    parser.add_argument('direction', choices=['to-binary', 'to-cube'])
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--codec', choices=BINARY_CODECS, default='raw')
+    args = parser.parse_args()
+
+    for file_name in args.files:
+        if args.direction == 'to-binary':
+            print(cube_to_binary(file_name, codec=args.codec))
+        else:
+            print(binary_to_cube(file_name))
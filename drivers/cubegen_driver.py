@@ -1,29 +1,214 @@
 #! /usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import concurrent.futures
+import logging
+import os
+import os.path
 import subprocess
+import threading
+import time
 
-from typing import Text
+from typing import Dict, List, Text, Tuple
+
+import drivers.instrumentation as instrumentation
 
 NPROCS = 2
 
-def cubegen_mo(formchk_file: Text,
-               mo: int,
-               npts: int = -2
-               ) -> Text:
-    cube_file = '{}.cube'.format(mo)
+logger = logging.getLogger(__name__)
 
+
+def _cubegen(formchk_file: Text,
+             mo: int,
+             cube_file: Text,
+             npts: int = -2,
+             nprocs: int = NPROCS,
+             timeout: float = None) -> int:
     command = ['cubegen']
 
-    command.append(str(NPROCS))
+    command.append(str(nprocs))
     command.append('MO={}'.format(mo))
     command.append(formchk_file)
     command.append(cube_file)
     command.append(str(npts))
     command.append('h')
 
-    subprocess.call(
-        command
-    )
+    with instrumentation.span('cubegen', 'cubegen', mo=mo, nprocs=nprocs,
+                              file=formchk_file):
+        return subprocess.run(command, timeout=timeout).returncode
+
+
+def cubegen_mo(formchk_file: Text,
+               mo: int,
+               npts: int = -2,
+               nprocs: int = NPROCS,
+               output_dir: Text = None
+               ) -> Text:
+    """ Generate {mo}.cube in output_dir (default: next to the fchk),
+    returns its absolute path
+    """
+    formchk_file = os.path.abspath(formchk_file)
+    if output_dir is None:
+        output_dir = os.path.dirname(formchk_file)
+    cube_file = os.path.join(os.path.abspath(output_dir),
+                             '{}.cube'.format(mo))
+
+    _cubegen(formchk_file, mo, cube_file, npts=npts, nprocs=nprocs)
+
+    return cube_file
+
+
+class CubegenScheduler(object):
+    """ Runs several cubegen jobs at once within a budget of cores.
+
+    The budget is split between concurrent jobs and threads per job. Unless
+    threads_per_job is given, jobs are preferred over threads since cubegen
+    scales sublinearly with its thread count; autotune instead measures the
+    throughput of a few splits on the first MOs and keeps the best one.
+
+    run() may be called from several threads at once, the jobs of all of
+    them share the same core budget.
+    """
+
+    def __init__(self,
+                 core_budget: int = None,
+                 threads_per_job: int = None,
+                 timeout: float = None,
+                 retries: int = 1,
+                 autotune: bool = False):
+        if retries < 0:
+            raise ValueError('retries must be >= 0, got {}'.format(retries))
+        self.core_budget = max(1, core_budget or os.cpu_count() or 1)
+        self.threads_per_job = threads_per_job
+        self.timeout = timeout
+        self.retries = retries
+        self.autotune = autotune
+        self._cores_in_use = 0
+        # Guards _cores_in_use and threads_per_job, which autotune sets
+        self._cores = threading.Condition()
+        # Held by the run tuning, concurrent runs wait for its split
+        self._tuning = threading.Lock()
+
+    def split(self, num_mos: int) -> Tuple[int, int]:
+        """ Number of concurrent jobs and threads per job for num_mos MOs
+        """
+        with self._cores:
+            threads_per_job = self.threads_per_job
+        if threads_per_job:
+            threads = min(threads_per_job, self.core_budget)
+        elif num_mos >= self.core_budget:
+            threads = 1
+        else:
+            threads = self.core_budget // max(1, num_mos)
+        jobs = max(1, min(num_mos, self.core_budget // threads))
+        return jobs, threads
+
+    def _run_one(self,
+                 formchk_file: Text,
+                 mo: int,
+                 cube_file: Text,
+                 npts: int,
+                 threads: int) -> Text:
+        threads = min(threads, self.core_budget)
+        for attempt in range(self.retries + 1):
+            with self._cores:
+                self._cores.wait_for(
+                    lambda: self._cores_in_use + threads <= self.core_budget)
+                self._cores_in_use += threads
+            try:
+                return_code = _cubegen(formchk_file, mo, cube_file,
+                                       npts=npts, nprocs=threads,
+                                       timeout=self.timeout)
+                if return_code == 0 and os.path.exists(cube_file):
+                    return cube_file
+                error = 'exit code {}'.format(return_code)
+            except subprocess.TimeoutExpired:
+                error = 'timeout after {}s'.format(self.timeout)
+            finally:
+                with self._cores:
+                    self._cores_in_use -= threads
+                    self._cores.notify_all()
+
+            # Never leave a partially written cube behind
+            if os.path.exists(cube_file):
+                os.remove(cube_file)
+            logger.warning('cubegen MO {} of {} failed ({}), attempt {}/{}'.
+                           format(mo, formchk_file, error, attempt + 1,
+                                  self.retries + 1))
+
+        raise RuntimeError('cubegen failed for MO {} of {}: {}'.format(
+            mo, formchk_file, error))
+
+    def _run_batch(self,
+                   formchk_file: Text,
+                   tasks: List[Tuple[int, Text]],
+                   npts: int,
+                   jobs: int,
+                   threads: int) -> None:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+            futures = [
+                pool.submit(self._run_one, formchk_file, mo, cube_file,
+                            npts, threads)
+                for mo, cube_file in tasks
+            ]
+            for future in futures:
+                future.result()
+
+    def _tune(self,
+              formchk_file: Text,
+              tasks: List[Tuple[int, Text]],
+              npts: int) -> Tuple[int, List[Tuple[int, Text]]]:
+        """ Try thread counts on a round of MOs each. Returns the threads per
+        job with the best throughput and the tasks left to run.
+        """
+        throughputs: Dict[int, float] = {}
+        threads = 1
+        while threads <= self.core_budget and tasks:
+            jobs = max(1, self.core_budget // threads)
+            probe, tasks = tasks[:jobs], tasks[jobs:]
+            start = time.perf_counter()
+            self._run_batch(formchk_file, probe, npts, jobs, threads)
+            throughputs[threads] = (
+                len(probe) / max(time.perf_counter() - start, 1e-9)
+            )
+            threads *= 2
+
+        best = max(throughputs, key=throughputs.get)
+        logger.info('cubegen autotune: {} threads per job ({})'.format(
+            best,
+            ', '.join('{} threads: {:.3f} MO/s'.format(t, v)
+                      for t, v in sorted(throughputs.items()))
+        ))
+        return best, tasks
+
+    def run(self,
+            formchk_file: Text,
+            mos: List[int],
+            npts: int = -2,
+            output_dir: Text = None) -> List[Text]:
+        """ Generate {mo}.cube in output_dir (default: next to the fchk) for
+        every MO, returns the absolute cube paths in the order of mos
+        """
+        formchk_file = os.path.abspath(formchk_file)
+        if output_dir is None:
+            output_dir = os.path.dirname(formchk_file)
+        cube_files = [
+            os.path.join(os.path.abspath(output_dir), '{}.cube'.format(mo))
+            for mo in mos
+        ]
+        tasks = list(zip(mos, cube_files))
+
+        if self.autotune and tasks:
+            with self._tuning:
+                with self._cores:
+                    tuned = bool(self.threads_per_job)
+                if not tuned:
+                    threads_per_job, tasks = self._tune(formchk_file, tasks,
+                                                        npts)
+                    with self._cores:
+                        self.threads_per_job = threads_per_job
+        if tasks:
+            jobs, threads = self.split(len(tasks))
+            self._run_batch(formchk_file, tasks, npts, jobs, threads)
 
-    return cube_file
\ No newline at end of file
+        return cube_files
@@ -0,0 +1,139 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Save extraction results to a directory and load them back without
+cclib, e.g. to render a report later or on another machine.
+
+The directory holds a manifest.json with the scalars and small lists of
+every data set, and one .npy file per array: MO energies, coordinates and
+the columns of the excited state tables of drivers.compact_result. Arrays
+are memory-mapped on load, never copied.
+"""
+
+import json
+import os
+import os.path
+
+from typing import Any, Dict, Text
+
+import numpy
+
+from drivers.compact_result import ExcitedStateTable, to_compact
+
+DATA_SET_VERSION = 1
+MANIFEST_FILE = 'manifest.json'
+
+# Markers of the manifest entries that are not plain JSON values
+ARRAY_KEY = '$array'
+EXCITED_STATES_KEY = '$excited_states'
+
+
+class _Writer(object):
+
+    def __init__(self, directory: Text):
+        self.directory = directory
+
+    def _save_array(self, array: numpy.ndarray, name: Text) -> Text:
+        file_name = name + '.npy'
+        numpy.save(os.path.join(self.directory, file_name),
+                   numpy.ascontiguousarray(array), allow_pickle=False)
+        return file_name
+
+    def entry(self, value: Any, name: Text) -> Any:
+        """ The manifest entry of value, its arrays are saved under name """
+        if isinstance(value, numpy.ndarray):
+            return {ARRAY_KEY: self._save_array(value, name)}
+        if isinstance(value, ExcitedStateTable):
+            return {EXCITED_STATES_KEY: {
+                'states': self._save_array(value.states,
+                                           name + '-states'),
+                'indptr': self._save_array(value.indptr,
+                                           name + '-indptr'),
+                'contributions': self._save_array(value.contributions,
+                                                  name + '-contributions'),
+                'restricted': bool(value.restricted),
+            }}
+        if isinstance(value, dict):
+            return {key: self.entry(item, '{}-{}'.format(name, key))
+                    for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self.entry(item, '{}-{}'.format(name, index))
+                    for index, item in enumerate(value)]
+        if isinstance(value, numpy.generic):
+            return value.item()
+        return value
+
+
+def save_data_set(data_set: Dict[Text, Dict], directory: Text) -> None:
+    """ Save the extraction results of a molecule, keyed by data set. Plain
+    results are stored in their compact form.
+    """
+    os.makedirs(directory, exist_ok=True)
+    writer = _Writer(directory)
+    manifest = {
+        'version': DATA_SET_VERSION,
+        'data_sets': {
+            key: writer.entry(to_compact(result), key)
+            for key, result in data_set.items()
+        },
+    }
+    # The manifest goes last, a directory without one is incomplete
+    manifest_file = os.path.join(directory, MANIFEST_FILE)
+    with open(manifest_file + '.tmp', 'w') as stream:
+        json.dump(manifest, stream, indent=1)
+    os.replace(manifest_file + '.tmp', manifest_file)
+
+
+def _load_entry(entry: Any, directory: Text, mmap_mode: Text) -> Any:
+    def load_array(file_name):
+        return numpy.load(os.path.join(directory, file_name),
+                          mmap_mode=mmap_mode, allow_pickle=False)
+
+    if isinstance(entry, dict):
+        if ARRAY_KEY in entry:
+            return load_array(entry[ARRAY_KEY])
+        if EXCITED_STATES_KEY in entry:
+            table = entry[EXCITED_STATES_KEY]
+            return ExcitedStateTable(load_array(table['states']),
+                                     load_array(table['indptr']),
+                                     load_array(table['contributions']),
+                                     table['restricted'])
+        return {key: _load_entry(item, directory, mmap_mode)
+                for key, item in entry.items()}
+    if isinstance(entry, list):
+        return [_load_entry(item, directory, mmap_mode) for item in entry]
+    return entry
+
+
+def load_data_set(directory: Text, mmap: bool = True) -> Dict[Text, Dict]:
+    """ Extraction results saved by save_data_set, with read-only
+    memory-mapped arrays unless mmap is False
+    """
+    manifest_file = os.path.join(directory, MANIFEST_FILE)
+    try:
+        with open(manifest_file, 'r') as stream:
+            manifest = json.load(stream)
+    except FileNotFoundError:
+        raise RuntimeError('No saved data set in {}'.format(directory))
+    if manifest.get('version') != DATA_SET_VERSION:
+        raise ValueError('Unsupported data set version in {}'.format(
+            manifest_file))
+
+    mmap_mode = 'r' if mmap else None
+    return {
+        key: _load_entry(entry, directory, mmap_mode)
+        for key, entry in manifest['data_sets'].items()
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+    import pprint
+    parser = argparse.ArgumentParser(
+        description='Show a saved data set')
+    parser.add_argument('directory')
+    parser.add_argument('data_set_keys', nargs='*')
+    args = parser.parse_args()
+
+    data_set = load_data_set(args.directory)
+    for key in args.data_set_keys or data_set:
+        pprint.pprint({key: data_set[key]})
@@ -0,0 +1,285 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import functools
+import hashlib
+import importlib.metadata
+import json
+import logging
+import os
+import os.path
+import pickle
+import sys
+import tempfile
+import threading
+import types
+
+from typing import Any, Dict, Optional, Text
+
+logger = logging.getLogger(__name__)
+
+# Bump this whenever the layout of the cached result changes in a way the
+# extractor fingerprint cannot detect, e.g. a change in the pickle payload
+# 2: excited state values are Python floats instead of numpy.float64
+SCHEMA_VERSION = 2
+
+# 1 GiB
+DEFAULT_MAX_SIZE = 1 << 30
+
+CACHE_SUFFIX = '.pickle'
+
+# Eviction goes down to this fraction of max_size, so that a full cache is
+# not scanned again by the next store
+EVICTION_TARGET = 0.9
+
+
+def _imported_modules(module, package_dir: Text, modules: Dict) -> None:
+    """ Collect in modules the module and every module of package_dir it
+    imports, directly or through the names it imports from them
+    """
+    modules[module.__name__] = module
+    for value in vars(module).values():
+        imported = value if isinstance(value, types.ModuleType) else \
+            sys.modules.get(getattr(value, '__module__', None) or '')
+        if imported is None or imported.__name__ in modules:
+            continue
+        imported_file = getattr(imported, '__file__', None)
+        if imported_file is not None and \
+                os.path.dirname(os.path.abspath(imported_file)) == package_dir:
+            _imported_modules(imported, package_dir, modules)
+
+
+@functools.lru_cache(maxsize=None)
+def extractor_fingerprint(extractor_class: type) -> Text:
+    """ Fingerprint of the code of an extractor class and all its bases.
+
+    The result also depends on the module level helpers and parsers the
+    extractors call, so the source of the module of each class of the MRO
+    is hashed with every module of its package it imports (e.g.
+    gaussian_parser and log_index for cclib_driver): editing any of them
+    invalidates the cached results produced by the old code, editing an
+    unrelated module of the package does not. A class may also define
+    CACHE_VERSION to force an invalidation by hand. Computed once per class
+    and process.
+    """
+    digest = hashlib.sha256()
+    modules: Dict[Text, types.ModuleType] = {}
+    for cls in extractor_class.__mro__:
+        if cls is object:
+            continue
+        digest.update(cls.__qualname__.encode())
+        digest.update(str(getattr(cls, 'CACHE_VERSION', '')).encode())
+        module = sys.modules.get(cls.__module__)
+        module_file = getattr(module, '__file__', None)
+        if module_file is not None:
+            _imported_modules(module, os.path.dirname(
+                os.path.abspath(module_file)), modules)
+            continue
+        # No source available, e.g. frozen modules, fall back to bytecode
+        for value in vars(cls).values():
+            code = getattr(getattr(value, '__wrapped__', value),
+                           '__code__', None)
+            if code is not None:
+                digest.update(code.co_code)
+
+    # The cache itself is versioned by SCHEMA_VERSION
+    modules.pop(__name__, None)
+    for source_file in sorted(set(os.path.abspath(module.__file__)
+                                  for module in modules.values())):
+        digest.update(os.path.basename(source_file).encode())
+        with open(source_file, 'rb') as stream:
+            digest.update(stream.read())
+    return digest.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def cclib_version() -> Optional[Text]:
+    """ Version of the installed cclib, which parses the logs, read from its
+    metadata so that a cache hit does not import it
+    """
+    try:
+        return importlib.metadata.version('cclib')
+    except importlib.metadata.PackageNotFoundError:
+        pass
+    try:
+        import cclib
+    except ImportError:
+        return None
+    return getattr(cclib, '__version__', None)
+
+
+def file_digest(file_name: Text, block_size: int = 1 << 20) -> Text:
+    digest = hashlib.sha256()
+    with open(file_name, 'rb') as stream:
+        for block in iter(lambda: stream.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ExtractCache(object):
+    """ Content-addressed on-disk cache of extraction results.
+
+    The key covers the log size, its mtime (or its content hash when
+    hash_content is set), the extractor class, the extractor code
+    fingerprint, the cclib version and SCHEMA_VERSION. Entries are evicted
+    least-recently-used first once the cache grows over max_size bytes.
+
+    The size of the cache is scanned once by each process, then counted as
+    entries are stored; the directory is only scanned again to evict. Other
+    processes sharing the directory are not counted, they are seen at the
+    next scan.
+    """
+
+    def __init__(self,
+                 cache_dir: Text,
+                 max_size: int = DEFAULT_MAX_SIZE,
+                 hash_content: bool = False):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.hash_content = hash_content
+        os.makedirs(cache_dir, exist_ok=True)
+        self._size = None
+        self._lock = threading.Lock()
+
+    def __reduce__(self):
+        # The cache is sent to the extraction workers of a process pool with
+        # every task: a lock cannot be pickled, and the size counted here is
+        # stale there. Each worker shares one cache per directory between its
+        # tasks instead, so it only scans the directory once.
+        return _process_cache, (self.cache_dir, self.max_size,
+                                self.hash_content)
+
+    def key(self, extractor_class: type, log_file_name: Text) -> Text:
+        stat = os.stat(log_file_name)
+        description: Dict[Text, Any] = {
+            'schema': SCHEMA_VERSION,
+            'extractor': '{}.{}'.format(extractor_class.__module__,
+                                        extractor_class.__qualname__),
+            'fingerprint': extractor_fingerprint(extractor_class),
+            'cclib': cclib_version(),
+            'size': stat.st_size,
+        }
+        if self.hash_content:
+            description['content'] = file_digest(log_file_name)
+        else:
+            description['path'] = os.path.abspath(log_file_name)
+            description['mtime'] = stat.st_mtime_ns
+        return hashlib.sha256(
+            json.dumps(description, sort_keys=True).encode()
+        ).hexdigest()
+
+    def _path(self, key: Text) -> Text:
+        return os.path.join(self.cache_dir, key + CACHE_SUFFIX)
+
+    def load(self, key: Text) -> Optional[Dict]:
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as stream:
+                result = pickle.load(stream)
+        except FileNotFoundError:
+            return None
+        except (pickle.UnpicklingError, EOFError, AttributeError,
+                ImportError) as e:
+            # Truncated, or pickled with classes that were since renamed or
+            # moved
+            logger.warning('Dropping unreadable cache entry {}: {}'.format(
+                path, e))
+            self._remove(path)
+            return None
+        # Touch the entry so that eviction is least-recently-used
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted by another process since it was read
+            pass
+        return result
+
+    def store(self, key: Text, result: Dict) -> None:
+        # Write to a temporary file first so readers never see partial entries
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as stream:
+                pickle.dump(result, stream, protocol=pickle.HIGHEST_PROTOCOL)
+            size = os.path.getsize(temp_path)
+            try:
+                # The same result stored again replaces its entry
+                old_size = os.path.getsize(self._path(key))
+            except FileNotFoundError:
+                old_size = 0
+            os.replace(temp_path, self._path(key))
+        except BaseException:
+            self._remove(temp_path)
+            raise
+
+        with self._lock:
+            if self._size is None:
+                self._size = self.size()
+            else:
+                self._size += size - old_size
+            if self._size <= self.max_size:
+                return
+        self.evict()
+
+    def _entries(self):
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(CACHE_SUFFIX):
+                try:
+                    yield entry.path, entry.stat()
+                except FileNotFoundError:
+                    # Evicted concurrently by another process
+                    continue
+
+    def size(self) -> int:
+        return sum(stat.st_size for _, stat in self._entries())
+
+    def evict(self) -> None:
+        """ Remove the least recently used entries until the cache is back
+        under EVICTION_TARGET of max_size, if it is over max_size
+        """
+        entries = sorted(self._entries(), key=lambda item: item[1].st_mtime)
+        total_size = sum(stat.st_size for _, stat in entries)
+        if total_size > self.max_size:
+            for path, stat in entries:
+                if total_size <= self.max_size * EVICTION_TARGET:
+                    break
+                logger.info('Evicting cache entry {}'.format(path))
+                self._remove(path)
+                total_size -= stat.st_size
+        with self._lock:
+            self._size = total_size
+
+    def clear(self) -> None:
+        for path, _ in list(self._entries()):
+            self._remove(path)
+        with self._lock:
+            self._size = 0
+
+    @staticmethod
+    def _remove(path: Text) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+@functools.lru_cache(maxsize=None)
+def _process_cache(cache_dir: Text,
+                   max_size: int,
+                   hash_content: bool) -> ExtractCache:
+    """ The cache of a directory unpickled in this process """
+    return ExtractCache(cache_dir, max_size, hash_content)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Inspect or invalidate an extraction cache')
+    parser.add_argument('cache_dir')
+    parser.add_argument('action', choices=['size', 'clear'])
+    args = parser.parse_args()
+
+    cache = ExtractCache(args.cache_dir)
+    if args.action == 'clear':
+        cache.clear()
+    else:
+        print(cache.size())
@@ -0,0 +1,162 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import mmap
+
+from typing import Any, Dict, List, Text
+
+import numpy
+
+# Column where the type of a field is written, e.g.
+# Number of atoms                            I               12
+# Current cartesian coordinates              R   N=          36
+NAME_WIDTH = 40
+TYPE_COLUMN = 43
+
+_DTYPES = {
+    'I': int,
+    'R': float,
+}
+
+# Values per line and width of a value of the array fields, Gaussian writes
+# them with fixed formats so the end of an array is found without reading it
+_ARRAY_FORMATS = {
+    'I': (6, 12),
+    'R': (5, 16),
+    'C': (5, 12),
+}
+
+
+class FchkFile(object):
+    """ Fields of a Gaussian formatted checkpoint file.
+
+    The file is memory-mapped and only its field headers are read when it
+    is opened: the end of every array is computed from its length, so
+    reading a field seeks straight to its values, which are parsed with
+    NumPy on first access.
+    """
+
+    def __init__(self, file_name: Text):
+        self.file_name = file_name
+        self.title = None
+        self.job = None
+        # name -> (type, scalar value), or (type, start, end, count) of the
+        # values of an array
+        self._sections: Dict[Text, tuple] = {}
+        self._fields: Dict[Text, Any] = {}
+        with open(file_name, 'rb') as stream:
+            self._map = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        self._index()
+
+    def _line_end(self, position: int) -> int:
+        end = self._map.find(b'\n', position)
+        return len(self._map) if end < 0 else end
+
+    def _index(self) -> None:
+        size = len(self._map)
+        end = self._line_end(0)
+        self.title = self._map[:end].decode().rstrip('\r')
+        position = end + 1
+        end = self._line_end(position)
+        self.job = self._map[position:end].decode().rstrip('\r')
+        position = end + 1
+
+        while position < size:
+            end = self._line_end(position)
+            line = self._map[position:end].decode(errors='replace')
+            position = end + 1
+            if len(line) <= TYPE_COLUMN:
+                continue
+            name = line[:NAME_WIDTH].strip()
+            field_type = line[TYPE_COLUMN]
+            rest = line[TYPE_COLUMN + 1:].split()
+
+            if rest and rest[0] == 'N=':
+                count = int(rest[1])
+                data_end = self._array_end(position, field_type, count)
+                self._sections[name] = (field_type, position, data_end, count)
+                position = data_end
+            elif rest:
+                self._sections[name] = (field_type, rest[0])
+
+    def _array_end(self, position: int, field_type: Text, count: int) -> int:
+        size = len(self._map)
+        if field_type in _ARRAY_FORMATS:
+            per_line, width = _ARRAY_FORMATS[field_type]
+            full_lines, remainder = divmod(count, per_line)
+            end = (position + full_lines * (per_line * width + 1) +
+                   (remainder * width + 1 if remainder else 0))
+            # The next field header, or the end of the file
+            if end >= size or (self._map[end - 1:end] == b'\n' and
+                               self._map[end:end + 1].isalpha()):
+                return min(end, size)
+
+        # Not the usual layout, count the values line by line
+        num_values = 0
+        while num_values < count and position < size:
+            end = self._line_end(position)
+            num_values += len(self._map[position:end].split())
+            position = end + 1
+        return min(position, size)
+
+    def _parse(self, name: Text) -> Any:
+        section = self._sections[name]
+        field_type = section[0]
+        if len(section) == 2:
+            value = section[1]
+            if field_type == 'I':
+                return int(value)
+            if field_type == 'R':
+                return float(value.replace('D', 'E'))
+            return value
+
+        _, start, end, count = section
+        data = self._map[start:end]
+        if field_type in _DTYPES:
+            if field_type == 'R':
+                data = data.replace(b'D', b'E')
+            values = numpy.fromstring(data, dtype=_DTYPES[field_type],
+                                      sep=' ')
+            if len(values) != count:
+                raise RuntimeError('Cannot read {} from {}'.format(
+                    name, self.file_name))
+            return values
+        return ''.join(data.decode(errors='replace').split())
+
+    def names(self) -> List[Text]:
+        return list(self._sections)
+
+    def close(self) -> None:
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __contains__(self, name: Text) -> bool:
+        return name in self._sections
+
+    def __getitem__(self, name: Text) -> Any:
+        if name not in self._fields:
+            self._fields[name] = self._parse(name)
+        return self._fields[name]
+
+    def get(self, name: Text, default: Any = None) -> Any:
+        if name not in self._sections:
+            return default
+        return self[name]
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Print fields of a formatted checkpoint file')
+    parser.add_argument('fchk_file')
+    parser.add_argument('names', nargs='*')
+    args = parser.parse_args()
+
+    with FchkFile(args.fchk_file) as fchk:
+        for name in args.names or fchk.names():
+            print('{}: {}'.format(name, fchk[name]))
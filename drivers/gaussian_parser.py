@@ -0,0 +1,128 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+
+from typing import Any, Dict, Iterable, List, Text
+
+import numpy
+
+from drivers.log_index import LogIndex
+
+# cclib is using the value below for eV -> cm^-1, we keep the same one so
+# the energies are identical to the ones cclib reports
+EV_TO_RECCM = 8065.54429
+
+EXCITED_STATE_MARKER = 'Excited State'
+
+_EXCITED_STATE = re.compile(r':(?P<sym>.*?)(?P<energy>-?\d*\.\d*) eV')
+# Contributions look like
+#       32 -> 38         0.04990
+#      35A -> 45A        0.01921
+#       33 <- 38        -0.01123
+_CONTRIBUTION = re.compile(
+    r' *(\d+)([AB]?) *(->|<-) *(\d+)([AB]?) +(-?\d+\.\d+)'
+)
+
+_GREEK_SYMMETRIES = [
+    ('SG', 'sigma'), ('PI', 'pi'), ('PHI', 'phi'),
+    # DLT must come after DLTA
+    ('DLTA', 'delta'), ('DLT', 'delta')
+]
+
+
+def normalise_symmetry(label: Text) -> Text:
+    """ Use the same symmetry labels as cclib instead of Gaussian labels
+    """
+    for gaussian_label, greek in _GREEK_SYMMETRIES:
+        if label.startswith(gaussian_label):
+            suffix = label[len(gaussian_label):]
+            label = '{}.{}'.format(greek, suffix) if suffix else greek
+    return label.replace('U', 'u').replace('G', 'g')
+
+
+def _parse_excited_state(line: Text):
+    groups = _EXCITED_STATE.search(line).groups()
+    energy = float(groups[1]) * EV_TO_RECCM
+    oscillator_strength = float(line.split('f=')[-1].split()[0])
+    multiplicity, symmetry = groups[0].strip().split('-')
+    return (energy, oscillator_strength,
+            '{}-{}'.format(multiplicity, normalise_symmetry(symmetry)))
+
+
+def parse_excited_states(lines: Iterable[Text]) -> Dict[Text, Any]:
+    """ Parse all "Excitation energies and oscillator strengths" blocks of a
+    Gaussian log in one pass.
+
+    The result uses the cclib attribute names and units, except that every
+    block is kept (cclib only keeps the last one) and de-excitation (<-)
+    contributions are included. A de-excitation is reported with from and to
+    swapped, so from > to. Coefficients are reported as printed, i.e. without
+    the sqrt(2) correction cclib applies to restricted calculations.
+    """
+    energies: List[float] = []
+    oscillator_strengths: List[float] = []
+    symmetries: List[Text] = []
+    contributions: List[List] = []
+
+    state_contributions = None
+    for line in lines:
+        if state_contributions is not None:
+            match = _CONTRIBUTION.match(line)
+            if match:
+                (left, left_spin, arrow,
+                 right, right_spin, coefficient) = match.groups()
+                left_orbital = (int(left) - 1, 1 if left_spin == 'B' else 0)
+                right_orbital = (int(right) - 1,
+                                 1 if right_spin == 'B' else 0)
+                if arrow == '->':
+                    state_contributions.append(
+                        [left_orbital, right_orbital, float(coefficient)])
+                else:
+                    state_contributions.append(
+                        [right_orbital, left_orbital, float(coefficient)])
+                continue
+            state_contributions = None
+
+        if line.startswith(EXCITED_STATE_MARKER, 1):
+            energy, oscillator_strength, symmetry = \
+                _parse_excited_state(line)
+            energies.append(energy)
+            oscillator_strengths.append(oscillator_strength)
+            symmetries.append(symmetry)
+            state_contributions = []
+            contributions.append(state_contributions)
+
+    return {
+        'etenergies': numpy.array(energies),
+        'etoscs': numpy.array(oscillator_strengths),
+        'etsyms': symmetries,
+        'etsecs': contributions,
+    }
+
+
+def read_excited_states(log_file_name: Text) -> Dict[Text, Any]:
+    """ Read all the excited states from a Gaussian log file
+    """
+    with open(log_file_name, 'r', errors='replace') as stream:
+        return parse_excited_states(stream)
+
+
+def read_final_excited_states(log_file_name: Text,
+                              index: LogIndex = None) -> Dict[Text, Any]:
+    """ Read only the last excited state block of a Gaussian log file, i.e.
+    the excited states of the final structure of an optimization. The block
+    is found through the log index, so the rest of the log is never read.
+    """
+    if index is None:
+        index = LogIndex.open(log_file_name)
+    offset = index.last('excitation')
+    if offset is None:
+        return parse_excited_states([])
+    return parse_excited_states(index.read_section(offset))
+
+
+if __name__ == '__main__':
+    import sys
+    import pprint
+    pprint.pprint(read_final_excited_states(sys.argv[1]))
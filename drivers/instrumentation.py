@@ -0,0 +1,225 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Wall time, CPU time and peak memory of the stages of a report, written
+as a Chrome trace (chrome://tracing or https://ui.perfetto.dev) and a text
+summary of the hot spots.
+
+Tracing is off unless enable() is called, span() is then a no-op. Enabling
+sets REPORT_TRACE_DIR so that worker processes started afterwards trace
+too: every process appends its finished spans to its own file in that
+directory, and write_trace() merges them.
+
+CPU time is the one of the calling thread, so it does not include the
+subprocesses a span waits for. Peak memory comes from tracemalloc, which
+traces the whole process: with several threads the peak of a span
+includes the allocations of the others.
+"""
+
+import collections
+import glob
+import json
+import os
+import os.path
+import threading
+import time
+import tracemalloc
+
+from typing import Dict, List, Text
+
+TRACE_DIR_VARIABLE = 'REPORT_TRACE_DIR'
+
+EVENTS_FILE_FORMAT = 'events-{}.jsonl'
+
+_trace_dir = None
+_memory = False
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def enabled() -> bool:
+    return _trace_dir is not None
+
+
+def enable(trace_dir: Text, memory: bool = True) -> None:
+    """ Record spans in trace_dir, in this process and in the processes it
+    starts from now on
+    """
+    global _trace_dir, _memory
+    os.makedirs(trace_dir, exist_ok=True)
+    os.environ[TRACE_DIR_VARIABLE] = trace_dir
+    os.environ[TRACE_DIR_VARIABLE + '_MEMORY'] = '1' if memory else ''
+    _trace_dir = trace_dir
+    _memory = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable() -> None:
+    global _trace_dir
+    os.environ.pop(TRACE_DIR_VARIABLE, None)
+    os.environ.pop(TRACE_DIR_VARIABLE + '_MEMORY', None)
+    _trace_dir = None
+    if _memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+class _Span(object):
+
+    __slots__ = ('name', 'category', 'args', 'start', 'wall', 'cpu',
+                 'memory', 'peak')
+
+    def __init__(self, name: Text, category: Text, args: Dict):
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        stack = _stack()
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            # The peak is reset for this span, fold it in the parent first
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, peak)
+            tracemalloc.reset_peak()
+            self.memory = self.peak = current
+        stack.append(self)
+        self.start = time.time_ns()
+        self.wall = time.perf_counter()
+        self.cpu = time.thread_time()
+        return self
+
+    def __exit__(self, *args):
+        cpu = time.thread_time() - self.cpu
+        wall = time.perf_counter() - self.wall
+        stack = _stack()
+        stack.pop()
+        event_args = dict(self.args)
+        event_args['cpu_ms'] = cpu * 1000
+        if tracemalloc.is_tracing():
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, self.peak)
+            event_args['peak_kb'] = (self.peak - self.memory) / 1024
+        events = _events()
+        events.append({
+            'name': self.name,
+            'cat': self.category,
+            'ph': 'X',
+            'ts': self.start / 1000,
+            'dur': wall * 1e6,
+            'pid': os.getpid(),
+            'tid': threading.get_native_id(),
+            'args': event_args,
+        })
+        if not stack:
+            _flush(events)
+
+
+class _NoSpan(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+def _stack() -> List[_Span]:
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _events() -> List[Dict]:
+    events = getattr(_local, 'events', None)
+    if events is None:
+        events = _local.events = []
+    return events
+
+
+def _flush(events: List[Dict]) -> None:
+    """ Append the events of a finished top level span to the file of this
+    process
+    """
+    if _trace_dir is None:
+        del events[:]
+        return
+    lines = ''.join(json.dumps(event) + '\n' for event in events)
+    del events[:]
+    events_file = os.path.join(_trace_dir,
+                               EVENTS_FILE_FORMAT.format(os.getpid()))
+    with _lock, open(events_file, 'a') as stream:
+        stream.write(lines)
+
+
+def span(name: Text, category: Text, **args):
+    """ Context manager recording a span of the trace, args are shown with
+    it in the trace viewer
+    """
+    if _trace_dir is None:
+        return _NO_SPAN
+    return _Span(name, category, args)
+
+
+def read_events(trace_dir: Text) -> List[Dict]:
+    events = []
+    for events_file in sorted(glob.glob(
+            os.path.join(trace_dir, EVENTS_FILE_FORMAT.format('*')))):
+        with open(events_file, 'r') as stream:
+            events.extend(json.loads(line) for line in stream if line.strip())
+    return events
+
+
+def summarize(events: List[Dict], top: int = 20) -> Text:
+    """ Spans grouped by category and name, the longest total first """
+    totals = collections.defaultdict(lambda: [0, 0.0, 0.0, 0.0])
+    for event in events:
+        total = totals[(event['cat'], event['name'])]
+        total[0] += 1
+        total[1] += event['dur'] / 1000
+        total[2] += event['args'].get('cpu_ms', 0)
+        total[3] = max(total[3], event['args'].get('peak_kb', 0))
+
+    lines = ['{:12s} {:40s} {:>7s} {:>11s} {:>11s} {:>12s}'.format(
+        'category', 'name', 'count', 'wall [ms]', 'cpu [ms]', 'peak [KiB]')]
+    for (category, name), (count, wall, cpu, peak) in sorted(
+            totals.items(), key=lambda item: item[1][1], reverse=True)[:top]:
+        lines.append('{:12s} {:40s} {:7d} {:11.1f} {:11.1f} {:12.0f}'.format(
+            category, name[:40], count, wall, cpu, peak))
+    return '\n'.join(lines)
+
+
+def write_trace(trace_file: Text, trace_dir: Text = None,
+                top: int = 20) -> Text:
+    """ Merge the spans of every process into a Chrome trace, and write the
+    summary next to it (<trace_file>.txt). Returns the summary.
+    """
+    events = read_events(trace_dir or _trace_dir)
+    with open(trace_file, 'w') as stream:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, stream)
+    summary = summarize(events, top)
+    with open(trace_file + '.txt', 'w') as stream:
+        stream.write(summary + '\n')
+    return summary
+
+
+# Worker processes trace as soon as this module is imported
+if os.environ.get(TRACE_DIR_VARIABLE):
+    enable(os.environ[TRACE_DIR_VARIABLE],
+           memory=bool(os.environ.get(TRACE_DIR_VARIABLE + '_MEMORY')))
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Summarize a trace written by write_trace')
+    parser.add_argument('trace_file')
+    parser.add_argument('--top', type=int, default=20)
+    args = parser.parse_args()
+
+    with open(args.trace_file, 'r') as stream:
+        print(summarize(json.load(stream)['traceEvents'], args.top))
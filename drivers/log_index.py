@@ -0,0 +1,177 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import mmap
+import os
+import re
+
+from typing import Dict, Iterator, Optional, Text
+
+import numpy
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 2
+INDEX_SUFFIX = '.sidx'
+
+# Markers of the sections read through the index, the offset stored is the
+# start of the line holding the marker. The final excitation block is read
+# up to the termination line.
+SECTION_MARKERS = {
+    'excitation': rb'Excitation energies and oscillator strengths:',
+    'termination': rb'(?:Normal|Error) termination',
+}
+
+_SECTION_REGEX = re.compile(b'|'.join(
+    b'(?P<' + name.encode() + b'>' + marker + b')'
+    for name, marker in SECTION_MARKERS.items()
+))
+
+OFFSET_DTYPE = numpy.dtype('<i8')
+
+
+class LogIndex(object):
+    """ Byte offsets of the sections of a Gaussian log file.
+
+    The index is built with a single regex scan over the memory-mapped log,
+    and saved next to it as a sidecar (log + INDEX_SUFFIX): one JSON header
+    line followed by the raw offsets, which are memory-mapped on load.
+    """
+
+    def __init__(self,
+                 log_file_name: Text,
+                 offsets: Dict[Text, numpy.ndarray]):
+        self.log_file_name = log_file_name
+        self._offsets = offsets
+
+    @staticmethod
+    def _log_stat(log_file_name: Text) -> Dict:
+        stat = os.stat(log_file_name)
+        return {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+    @classmethod
+    def build(cls, log_file_name: Text) -> 'LogIndex':
+        offsets = {name: [] for name in SECTION_MARKERS}
+        with open(log_file_name, 'rb') as stream:
+            if os.fstat(stream.fileno()).st_size:
+                with mmap.mmap(stream.fileno(), 0,
+                               access=mmap.ACCESS_READ) as data:
+                    for match in _SECTION_REGEX.finditer(data):
+                        line_start = data.rfind(b'\n', 0, match.start()) + 1
+                        offsets[match.lastgroup].append(line_start)
+        return cls(log_file_name, {
+            name: numpy.array(values, dtype=OFFSET_DTYPE)
+            for name, values in offsets.items()
+        })
+
+    @classmethod
+    def index_file_name(cls, log_file_name: Text) -> Text:
+        return log_file_name + INDEX_SUFFIX
+
+    def save(self) -> None:
+        sections = {}
+        start = 0
+        for name, values in self._offsets.items():
+            sections[name] = [start, len(values)]
+            start += len(values)
+        header = dict(self._log_stat(self.log_file_name),
+                      version=INDEX_VERSION, sections=sections)
+
+        index_file_name = self.index_file_name(self.log_file_name)
+        temp_file_name = index_file_name + '.tmp'
+        with open(temp_file_name, 'wb') as stream:
+            stream.write(json.dumps(header).encode() + b'\n')
+            for values in self._offsets.values():
+                stream.write(values.astype(OFFSET_DTYPE).tobytes())
+        os.replace(temp_file_name, index_file_name)
+
+    @classmethod
+    def load(cls, log_file_name: Text) -> Optional['LogIndex']:
+        """ Load the sidecar index, None if it is missing or stale
+        """
+        index_file_name = cls.index_file_name(log_file_name)
+        try:
+            with open(index_file_name, 'rb') as stream:
+                header_line = stream.readline()
+            header = json.loads(header_line)
+        except (OSError, ValueError):
+            return None
+
+        stat = cls._log_stat(log_file_name)
+        if (header.get('version') != INDEX_VERSION or
+                header.get('size') != stat['size'] or
+                header.get('mtime') != stat['mtime'] or
+                set(header.get('sections', {})) != set(SECTION_MARKERS)):
+            return None
+
+        total = sum(count for _, count in header['sections'].values())
+        if total:
+            data = numpy.memmap(index_file_name, dtype=OFFSET_DTYPE,
+                                mode='r', offset=len(header_line),
+                                shape=(total,))
+        else:
+            data = numpy.empty(0, dtype=OFFSET_DTYPE)
+        return cls(log_file_name, {
+            name: data[start:start + count]
+            for name, (start, count) in header['sections'].items()
+        })
+
+    @classmethod
+    def open(cls, log_file_name: Text) -> 'LogIndex':
+        """ Load the sidecar index, (re)building it when needed
+        """
+        index = cls.load(log_file_name)
+        if index is not None:
+            return index
+
+        index = cls.build(log_file_name)
+        try:
+            index.save()
+        except OSError as e:
+            logger.warning('Unable to save the index of {}: {}'.format(
+                log_file_name, e))
+        return index
+
+    def count(self, section: Text) -> int:
+        return len(self._offsets[section])
+
+    def last(self, section: Text) -> Optional[int]:
+        offsets = self._offsets[section]
+        return int(offsets[-1]) if len(offsets) else None
+
+    def section_end(self, offset: int) -> Optional[int]:
+        """ Offset of the first indexed section after offset, None if there
+        is none
+        """
+        end = None
+        for offsets in self._offsets.values():
+            position = numpy.searchsorted(offsets, offset, side='right')
+            if position < len(offsets):
+                candidate = int(offsets[position])
+                end = candidate if end is None else min(end, candidate)
+        return end
+
+    def read_lines(self, start: int, end: int = None) -> Iterator[Text]:
+        """ Lines of the log between two offsets, read through mmap so only
+        the touched pages are loaded
+        """
+        with open(self.log_file_name, 'rb') as stream:
+            with mmap.mmap(stream.fileno(), 0,
+                           access=mmap.ACCESS_READ) as data:
+                block = data[start:end]
+        return iter(block.decode(errors='replace').splitlines(keepends=True))
+
+    def read_section(self, offset: int) -> Iterator[Text]:
+        """ Lines from offset up to the next indexed section
+        """
+        return self.read_lines(offset, self.section_end(offset))
+
+
+if __name__ == '__main__':
+    import sys
+    index = LogIndex.open(sys.argv[1])
+    for name in SECTION_MARKERS:
+        print('{}: {} (last at {})'.format(
+            name, index.count(name), index.last(name)))
@@ -0,0 +1,229 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+import os.path
+import runpy
+import shutil
+import subprocess
+import sys
+import threading
+
+from typing import Callable, Dict, List, Text, Tuple
+
+import drivers.instrumentation as instrumentation
+from drivers.extract_cache import file_digest
+
+RENDER_SCRIPT = 'render.py'
+
+logger = logging.getLogger(__name__)
+
+
+def png_file_name(input_file: Text) -> Text:
+    """ render.py writes the image next to its input
+    """
+    return os.path.splitext(input_file)[0] + '.png'
+
+
+def find_render_script(script: Text = RENDER_SCRIPT) -> Text:
+    path = shutil.which(script) or (script if os.path.exists(script) else None)
+    if path is None:
+        raise RuntimeError('Unable to find {} in PATH'.format(script))
+    return os.path.abspath(path)
+
+
+def renderer_settings(script: Text = RENDER_SCRIPT) -> Dict[Text, Text]:
+    """ Everything that changes the images rendered by script, used to key
+    them in the artifact store
+    """
+    return {
+        'script': os.path.basename(script),
+        'digest': file_digest(find_render_script(script)),
+    }
+
+
+def _render(script: Text, input_file: Text) -> Text:
+    """ Run render.py on one input inside the worker process, the
+    visualization modules it imports stay loaded for the next input.
+    Returns an error message, or None on success.
+
+    Only ever called in a worker process rendering one input at a time, so
+    moving it to the directory of the input cannot affect anything else.
+    """
+    pwd = os.getcwd()
+    argv = sys.argv
+    try:
+        os.chdir(os.path.dirname(input_file))
+        sys.argv = [script, input_file]
+        with instrumentation.span('render', 'render', file=input_file):
+            runpy.run_path(script, run_name='__main__')
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            return 'exit code {}'.format(e.code)
+    except Exception as e:
+        return '{}: {}'.format(type(e).__name__, e)
+    finally:
+        sys.argv = argv
+        os.chdir(pwd)
+    return None
+
+
+def render_file(input_file: Text, script: Text = RENDER_SCRIPT) -> Text:
+    """ Render a single input with its own render.py process, returns the
+    PNG path
+    """
+    input_file = os.path.abspath(input_file)
+    with instrumentation.span('render', 'render', file=input_file):
+        return_code = subprocess.call([find_render_script(script),
+                                       input_file],
+                                      cwd=os.path.dirname(input_file))
+    if return_code != 0:
+        raise RuntimeError('{} failed for {}: exit code {}'.format(
+            script, input_file, return_code))
+    return png_file_name(input_file)
+
+
+class BatchRenderer(object):
+    """ Renders xyz and cube files to PNG with a few warm worker processes
+    instead of starting render.py once per image.
+
+    Inputs are queued with add() and all rendered by render(). Temporary
+    inputs are deleted once their image is written. The workers stay up
+    between calls to render() until close(). Threads rendering at the same
+    time each use their own batch() of the renderer.
+    """
+
+    def __init__(self, workers: int = None, script: Text = RENDER_SCRIPT):
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.script = script
+        # Queued input -> (temporary, callbacks), in the order added
+        self._queue: Dict[Text, Tuple[bool, List[Callable]]] = {}
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._parent = None
+
+    def batch(self) -> 'BatchRenderer':
+        """ A renderer with its own queue, sharing the workers of this one
+        """
+        batch = BatchRenderer(self.workers, self.script)
+        batch._parent = self
+        return batch
+
+    def _get_pool(self) -> concurrent.futures.Executor:
+        if self._parent is not None:
+            return self._parent._get_pool()
+        with self._pool_lock:
+            if self._pool is None:
+                # The workers start on the first render(), when the cubegen
+                # scheduler and the molecule threads are running. Forking
+                # then could clone a lock held by one of them.
+                self._pool = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(
+                        'forkserver' if 'forkserver' in
+                        multiprocessing.get_all_start_methods() else 'spawn'))
+            return self._pool
+
+    def _reset_pool(self, pool: concurrent.futures.Executor) -> None:
+        if self._parent is not None:
+            self._parent._reset_pool(pool)
+            return
+        with self._pool_lock:
+            # Another batch may have replaced it already
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False)
+
+    def add(self, input_file: Text, temporary: bool = False,
+            callback: Callable[[Text], None] = None) -> Text:
+        """ Queue input_file unless its image exists, returns the PNG path.
+        callback is called with the PNG path once it is rendered. An input
+        queued more than once is rendered once, with every callback, and
+        only deleted if it was always added as temporary.
+        """
+        input_file = os.path.abspath(input_file)
+        png_file = png_file_name(input_file)
+        if input_file in self._queue:
+            queued_temporary, callbacks = self._queue[input_file]
+            if callback is not None:
+                callbacks.append(callback)
+            self._queue[input_file] = (queued_temporary and temporary,
+                                       callbacks)
+        elif not os.path.exists(png_file):
+            self._queue[input_file] = (
+                temporary, [callback] if callback is not None else [])
+        elif temporary:
+            os.remove(input_file)
+        return png_file
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def render(self) -> List[Text]:
+        """ Render every queued input, returns the PNG files written
+        """
+        queue, self._queue = self._queue, {}
+        if not queue:
+            return []
+
+        script = find_render_script(self.script)
+        input_files = list(queue)
+        logger.info('Rendering {} images with {} workers'.format(
+            len(input_files), min(self.workers, len(input_files))))
+
+        pool = self._get_pool()
+        try:
+            errors = list(pool.map(
+                _render, [script] * len(input_files), input_files))
+        except concurrent.futures.process.BrokenProcessPool as e:
+            # A worker died, e.g. in a crash of the visualization modules.
+            # The next render() starts new workers.
+            self._reset_pool(pool)
+            errors = ['{}: {}'.format(type(e).__name__, e)] * len(input_files)
+
+        png_files = []
+        for input_file, error in zip(input_files, errors):
+            temporary, callbacks = queue[input_file]
+            if error is not None:
+                logger.warning('{} failed for {} ({})'.format(
+                    self.script, input_file, error))
+            elif os.path.exists(png_file_name(input_file)):
+                png_files.append(png_file_name(input_file))
+                for callback in callbacks:
+                    callback(png_file_name(input_file))
+            if temporary and os.path.exists(input_file):
+                os.remove(input_file)
+        return png_files
+
+    def close(self) -> None:
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Render xyz and cube files to PNG in a batch')
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('-j', '--workers', type=int,
+                        help='Number of worker processes, all cores by '
+                             'default')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    with BatchRenderer(workers=args.workers) as renderer:
+        for file_name in args.files:
+            renderer.add(file_name)
+        for png_file in renderer.render():
+            print(png_file)
@@ -1,29 +1,44 @@
 #! /usr/bin/env python3
 
+import argparse
+import concurrent.futures
+import glob
 import json
+import logging
 import os
 import os.path
+import shutil
 import subprocess
 import sys
+import tempfile
 
+from functools import partial
 from itertools import chain
-from typing import Dict
+from typing import Dict, List, Text
 
+import drivers.artifact_store as artifact_store
 import drivers.cclib_driver as cclib_driver
+import drivers.cube_engine as cube_engine_driver
+import drivers.cube_file as cube_file_driver
 import drivers.cubegen_driver as cubegen_driver
-from report.backend.latex import (
-    xyz_coordinate,
-    newpage,
-    section,
-    subsection,
-    subsubsection,
-    figure,
-    excited_state_energies,
-    excited_state_table,
-    nto_analysis_table
+import drivers.data_set_file as data_set_file
+import drivers.extract_cache as extract_cache
+import drivers.instrumentation as instrumentation
+import drivers.render_driver as render_driver
+import report.engine as report_engine
+from report.components import (
+    CoordinateTable,
+    EnergyComparison,
+    ExcitedStateTable,
+    Heading,
+    MOGallery,
+    NewPage,
+    NTOTable,
+    Raw,
+    StructureFigure
 )
 
-MOLECULE_NAME = sys.argv[1 ]
+logger = logging.getLogger(__name__)
 
 BASE_DIRECTORY = '/home/xis19/Projects/research/xsun/excited-states/aie/pople-vacuum'
 
@@ -70,12 +85,88 @@ GAUSSIAN_OUTPUTS = {
     },
 }
 
-def get_path(k, t):
+LATEX_PREAMBLE = r"""\documentclass[a4paper, 8pt]{article}
+
+\usepackage{float}
+\usepackage{graphicx}
+\usepackage[a4paper, margin=0.7in]{geometry}
+\usepackage{hyperref}
+\usepackage{longtable}
+\usepackage{multirow}
+\usepackage{tabularx}
+\usepackage{times}
+\usepackage[flushleft]{threeparttable}
+
+\pagestyle{headings}
+
+\setlength\extrarowheight{1pt}
+
+\begin{document}
+
+\tableofcontents
+\newpage
+
+\listoftables
+\newpage
+
+\listoffigures
+\newpage
+"""
+
+
+def default_path_spec():
+    return {
+        'base_directory': BASE_DIRECTORY,
+        'outputs': GAUSSIAN_OUTPUTS,
+    }
+
+
+def load_path_spec(file_name=None, base_directory=None):
+    """ Where the Gaussian outputs of a molecule are, read from a JSON file
+    with the layout of default_path_spec(): a base directory and, for every
+    data set, the log and fchk paths formatted with {molecule_name}
+    """
+    path_spec = default_path_spec()
+    if file_name is not None:
+        with open(file_name, 'r') as stream:
+            path_spec.update(json.load(stream))
+    if base_directory is not None:
+        path_spec['base_directory'] = base_directory
+
+    missing = set(GAUSSIAN_OUTPUTS) - set(path_spec['outputs'])
+    if missing:
+        raise RuntimeError('Path spec {} misses data sets: {}'.format(
+            file_name, ', '.join(sorted(missing))))
+    return path_spec
+
+
+def get_path(molecule_name, k, t, path_spec=None):
+    path_spec = path_spec or default_path_spec()
     return os.path.join(
-        BASE_DIRECTORY,
-        GAUSSIAN_OUTPUTS[k][t].format(molecule_name=MOLECULE_NAME)
+        path_spec['base_directory'],
+        path_spec['outputs'][k][t].format(molecule_name=molecule_name)
     )
 
+
+def expand_molecules(patterns, path_spec=None):
+    """ Molecule names, glob patterns are matched against the directories
+    of the base directory
+    """
+    path_spec = path_spec or default_path_spec()
+    molecule_names = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            molecule_names.extend(sorted(
+                os.path.basename(path) for path in glob.glob(
+                    os.path.join(path_spec['base_directory'], pattern))
+                if os.path.isdir(path)
+            ))
+        else:
+            molecule_names.append(pattern)
+    # Keep the first occurrence of every molecule
+    return list(dict.fromkeys(molecule_names))
+
+
 def excited_state_orbitals(excited_states_description: Dict,
                            max_excited_states: int):
     orbits = set()
@@ -89,368 +180,567 @@ def excited_state_orbitals(excited_states_description: Dict,
     return sorted(orbits)
 
 
-def render_structure(log_file):
+def render_structure(log_file, renderer=None):
+    """ Render the final structure of a log next to it. Only absolute paths
+    are used, the working directory of the process is never changed.
+    """
+    log_file = os.path.abspath(log_file)
+    work_dir = os.path.dirname(log_file)
     xyz_file_name = log_file.replace('.log', '.xyz')
     png_file_name = log_file.replace('.log', '.png')
 
-    pwd = os.getcwd()
-    os.chdir(os.path.split(log_file)[0])
-
     if not os.path.exists(xyz_file_name):
-        subprocess.call(
-            'xyz.py {} > {}'.format(log_file, xyz_file_name),
-            shell=True
-        )
-    if not os.path.exists(png_file_name):
+        with open(xyz_file_name, 'w') as stream:
+            subprocess.call(['xyz.py', log_file], stdout=stream, cwd=work_dir)
+    if renderer is not None:
+        renderer.add(xyz_file_name)
+    elif not os.path.exists(png_file_name):
         subprocess.call([
             'render.py',
             xyz_file_name
-        ])
-    os.chdir(pwd)
+        ], cwd=work_dir)
 
     return png_file_name
 
 
-def render_mos(formchk_file, mos):
+def render_mos(formchk_file, mos, cube_engine='cubegen', scheduler=None,
+               binary_cubes=False, renderer=None, npts=-2, store=None):
+    """ Render MOs of an fchk, cubes and images are written next to it.
+    Only absolute paths are used, the working directory of the process is
+    never changed, so several molecules can be rendered on threads.
+
+    Without a store any cube or image already in the job directory is
+    reused. With an artifact store only the artifacts of the same fchk
+    content, grid and renderer are reused, from any job directory.
+    """
     generated_images = []
-    work_dir = os.path.split(formchk_file)[0]
+    formchk_file = os.path.abspath(formchk_file)
+    work_dir = os.path.dirname(formchk_file)
+    cube_suffix = (cube_file_driver.BINARY_CUBE_SUFFIX if binary_cubes
+                   else '.cube')
+
+    def _path(mo, suffix):
+        return os.path.join(work_dir, '{}{}'.format(mo, suffix))
+
+    def _has_cube(mo):
+        return any(
+            os.path.exists(_path(mo, suffix))
+            for suffix in ['.cube', cube_file_driver.BINARY_CUBE_SUFFIX]
+        )
+
+    cube_keys = {}
+    image_keys = {}
+    if store is not None:
+        settings = render_driver.renderer_settings()
+        for mo in mos:
+            cube_keys[mo] = store.cube_key(formchk_file, mo, npts,
+                                           cube_engine, cube_suffix)
+            image_keys[mo] = store.image_key(cube_keys[mo], settings)
+            if store.fetch(image_keys[mo], _path(mo, '.png')):
+                continue
+            # Whatever is in the job directory may come from another grid
+            # or be partly written, never trust it
+            for suffix in ['.png', '.cube',
+                           cube_file_driver.BINARY_CUBE_SUFFIX]:
+                if os.path.exists(_path(mo, suffix)):
+                    os.remove(_path(mo, suffix))
+            store.fetch(cube_keys[mo], _path(mo, cube_suffix))
+
+    def _needs_cube(mo):
+        return not _has_cube(mo) and not (
+            store is not None and os.path.exists(_path(mo, '.png')))
+
+    # All missing cubes at once, either evaluating the basis only once or
+    # running concurrent cubegen jobs
+    missing_mos = [mo for mo in mos if _needs_cube(mo)]
+    if missing_mos and cube_engine == 'numpy':
+        cube_engine_driver.cube_mos(formchk_file, missing_mos, npts=npts,
+                                    output_dir=work_dir, binary=binary_cubes)
+    elif missing_mos and scheduler is not None:
+        cube_files = scheduler.run(formchk_file, missing_mos, npts=npts,
+                                   output_dir=work_dir)
+        if binary_cubes:
+            for cube_file in cube_files:
+                cube_file_driver.cube_to_binary(cube_file)
+                os.remove(cube_file)
 
-    pwd = os.getcwd()
-    os.chdir(work_dir)
     for mo in mos:
-        cube_file = os.path.join(work_dir, '{}.cube'.format(mo))
-        png_file = os.path.join(work_dir, '{}.png'.format(mo))
+        cube_file = _path(mo, '.cube')
+        binary_cube_file = _path(mo, cube_file_driver.BINARY_CUBE_SUFFIX)
+        png_file = _path(mo, '.png')
+
+        if _needs_cube(mo):
+            cube_file = cubegen_driver.cubegen_mo(formchk_file, mo=mo,
+                                                  npts=npts,
+                                                  output_dir=work_dir)
+            if binary_cubes:
+                cube_file_driver.cube_to_binary(cube_file, binary_cube_file)
+                os.remove(cube_file)
+        if store is not None and mo in missing_mos and \
+                os.path.exists(_path(mo, cube_suffix)):
+            store.put(_path(mo, cube_suffix), cube_keys[mo])
+
+        store_image = None
+        if store is not None:
+            store_image = partial(store.put, key=image_keys[mo])
 
-        if not os.path.exists(cube_file):
-            cube_file = cubegen_driver.cubegen_mo(formchk_file, mo=mo)
         if not os.path.exists(png_file):
+            # render.py only reads text cubes, those are kept just for it
+            temporary_cube = (not os.path.exists(cube_file) and
+                              os.path.exists(binary_cube_file))
+            if temporary_cube:
+                cube_file_driver.binary_to_cube(binary_cube_file, cube_file)
+            if renderer is not None:
+                renderer.add(cube_file, temporary=temporary_cube,
+                             callback=store_image)
+                generated_images.append(png_file)
+                continue
             subprocess.call([
                 'render.py',
                 cube_file
-            ])
+            ], cwd=work_dir)
+            if temporary_cube:
+                os.remove(cube_file)
+            if store_image is not None and os.path.exists(png_file):
+                store_image(png_file)
         generated_images.append(png_file)
 
-    os.chdir(pwd)
     return generated_images
 
 
-data_set = {}
-for data_set_key in GAUSSIAN_OUTPUTS.keys():
-    extractor = cclib_driver.GenericExtractor() if 'nto' not in data_set_key else cclib_driver.NTOExtractor()
-    data_set[data_set_key] = extractor.extract(
-        get_path(data_set_key, 'log')
-    )
-
-rendered_ground_state = render_structure(
-    get_path('ground', 'log')
-)
-
-# === Vertical Excitation
-vertical_excitation_mos = []
-vertical_excitation_mos.extend(
-    excited_state_orbitals(data_set['vertical_singlet']['excited_states'], 10)
-)
-vertical_excitation_mos.extend(
-    excited_state_orbitals(data_set['vertical_triplet']['excited_states'], 10)
-)
-vertical_excitation_mos = sorted(list(set(vertical_excitation_mos)))
-# NOTE the excited state is a linear combination of multiple ground state
-# molecular orbitals.
-rendered_ground_structure_mos = render_mos(
-    get_path('ground', 'fchk'),
-    vertical_excitation_mos
-)
-
-# === Vertical singlet NTO
-vertical_excitation_singlet_orbits = sorted(list(chain.from_iterable(
-    [d['from'], d['to']]
-    for d in data_set['vertical_singlet_nto']['nto_contributions']
-)))
-render_vertical_excitation_singlet_mos = render_mos(
-    get_path('vertical_singlet_nto', 'fchk'),
-    vertical_excitation_singlet_orbits
-)
-
-# === Vertical triplet NTO
-vertical_excitation_triplet_orbits = sorted(list(chain.from_iterable(
-   [d['from'], d['to']]
-   for d in data_set['vertical_triplet_nto']['nto_contributions']
-)))
-render_vertical_excitation_triplet_mos = render_mos(
-   get_path('vertical_triplet_nto', 'fchk'),
-   vertical_excitation_triplet_orbits
-)
-
-# === Adiabatic singlet
-adiabatic_singlet_mos = excited_state_orbitals(data_set['adiabatic_singlet']['excited_states'], 10)
-rendered_adiabatic_singlet_state = render_structure(
-    get_path('adiabatic_singlet', 'log')
-)
-rendered_adiabatic_singlet_mos = render_mos(
-    get_path('adiabatic_singlet', 'fchk'),
-    adiabatic_singlet_mos
-)
-
-# === Adiabatic singlet NTO
-adiabatic_excitation_singlet_orbits = sorted(list(chain.from_iterable(
-   [d['from'], d['to']]
-   for d in data_set['adiabatic_singlet_nto']['nto_contributions']
-)))
-render_adiabatic_excitation_singlet_mos = render_mos(
-   get_path('adiabatic_singlet_nto', 'fchk'),
-   adiabatic_excitation_singlet_orbits
-)
+def data_set_extractor(data_set_key, compact=False):
+    if 'nto' in data_set_key:
+        return cclib_driver.FchkNTOExtractor
+    if compact:
+        return cclib_driver.CompactGenericExtractor
+    return cclib_driver.GenericExtractor
 
-# === Adiabatic triplet
-adiabatic_triplet_mos = excited_state_orbitals(data_set['adiabatic_triplet']['excited_states'], 10)
-rendered_adiabatic_triplet_state = render_structure(
-    get_path('adiabatic_triplet', 'log')
-)
-rendered_adiabatic_triplet_mos = render_mos(
-    get_path('adiabatic_triplet', 'fchk'),
-    adiabatic_triplet_mos
-)
 
-# === Adiabatic triplet NTO
-adiabatic_excitation_triplet_orbits = sorted(list(chain.from_iterable(
-   [d['from'], d['to']]
-   for d in data_set['adiabatic_triplet_nto']['nto_contributions']
-)))
-render_adiabatic_excitation_triplet_mos = render_mos(
-   get_path('adiabatic_triplet_nto', 'fchk'),
-   adiabatic_excitation_triplet_orbits
-)
+def extraction_tasks(molecule_name, path_spec=None, compact=False):
+    tasks = {}
+    for data_set_key in GAUSSIAN_OUTPUTS.keys():
+        extractor_class = data_set_extractor(data_set_key, compact)
+        tasks[data_set_key] = (
+            extractor_class,
+            get_path(molecule_name, data_set_key, extractor_class.FILE_TYPE,
+                     path_spec)
+        )
+    return tasks
 
 
-# === LATEX OUTPUT
+def extract_data_set(molecule_name, jobs=1, cache=None, path_spec=None,
+                     pool=None, compact=False):
+    return cclib_driver.extract_logs(
+        extraction_tasks(molecule_name, path_spec, compact),
+        jobs=jobs, cache=cache, pool=pool
+    )
 
-latex_output_list = []
 
-latex_output_list.append(r"""\documentclass[a4paper, 8pt]{article}
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Generate the LaTeX reports of molecules')
+    parser.add_argument('molecule_names', nargs='*', metavar='molecule_name',
+                        help='Molecule names or glob patterns matched in '
+                             'the base directory')
+    parser.add_argument('--molecule-list',
+                        help='File with one molecule name or pattern per '
+                             'line')
+    parser.add_argument('--path-spec',
+                        help='JSON file with the base directory and the '
+                             'paths of the Gaussian outputs of a molecule')
+    parser.add_argument('--base-directory',
+                        help='Override the base directory of the path spec')
+    parser.add_argument('--output-dir', default='output_aie_pople',
+                        help='Directory of the LaTeX reports')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Number of processes used to parse the logs, '
+                             'shared by all molecules')
+    parser.add_argument('--molecule-threads', type=int, default=1,
+                        help='Number of molecules rendered at the same time')
+    parser.add_argument('--prefetch', type=int,
+                        help='Number of molecules whose logs are parsed '
+                             'ahead of the ones being rendered, 1 by '
+                             'default. Only with --jobs > 1, the logs are '
+                             'parsed in the rendering thread otherwise')
+    parser.add_argument('--cube-engine', choices=['cubegen', 'numpy'],
+                        default='cubegen',
+                        help='Generate MO cubes with cubegen, or in process '
+                             'from the fchk with NumPy')
+    parser.add_argument('--npts', type=int, default=-2,
+                        help='Grid of the MO cubes, as given to cubegen')
+    parser.add_argument('--binary-cubes', action='store_true',
+                        help='Store MO cubes as binary .bcube files, text '
+                             'cubes are only written temporarily for '
+                             'render.py')
+    parser.add_argument('--cores', type=int,
+                        help='Core budget shared by concurrent cubegen jobs, '
+                             'all cores by default')
+    parser.add_argument('--cube-threads', type=int,
+                        help='Threads per cubegen job, chosen from the core '
+                             'budget by default')
+    parser.add_argument('--cube-timeout', type=float,
+                        help='Timeout of one cubegen job in seconds')
+    parser.add_argument('--cube-retries', type=int, default=1,
+                        help='Number of retries of a failed cubegen job')
+    parser.add_argument('--autotune', action='store_true',
+                        help='Measure the best split of the core budget '
+                             'between cubegen jobs and threads')
+    parser.add_argument('--render-workers', type=int,
+                        help='Number of warm render.py worker processes, '
+                             'all cores by default')
+    parser.add_argument('--artifact-dir',
+                        help='Share cubes and images between runs and job '
+                             'directories through this store')
+    parser.add_argument('--artifact-size', type=int,
+                        default=artifact_store.DEFAULT_MAX_SIZE,
+                        help='Maximum size of the artifact store in bytes')
+    parser.add_argument('--cache-dir',
+                        help='Reuse extraction results stored in this '
+                             'directory')
+    parser.add_argument('--cache-size', type=int,
+                        default=extract_cache.DEFAULT_MAX_SIZE,
+                        help='Maximum size of the extraction cache in bytes')
+    parser.add_argument('--compact-results', action='store_true',
+                        help='Keep extraction results as NumPy arrays and '
+                             'columnar excited state tables, for large '
+                             'basis sets')
+    parser.add_argument('--save-data',
+                        help='Save the extraction results of every molecule '
+                             'in this directory')
+    parser.add_argument('--load-data',
+                        help='Render from the extraction results saved in '
+                             'this directory instead of parsing the logs')
+    parser.add_argument('--trace', metavar='TRACE_FILE',
+                        help='Write the wall time, CPU time and peak memory '
+                             'of every stage to this Chrome trace '
+                             '(chrome://tracing, Perfetto), and a summary of '
+                             'the hot spots to TRACE_FILE.txt')
+    args = parser.parse_args(argv)
+    if args.molecule_list:
+        with open(args.molecule_list, 'r') as stream:
+            args.molecule_names.extend(
+                line.strip() for line in stream if line.strip())
+    if not args.molecule_names:
+        parser.error('no molecule given')
+    return args
+
+
+def report_orbitals(data_set: Dict) -> Dict[Text, List[int]]:
+    """ MOs rendered in the report for every data set with an fchk
+    """
+    def nto_orbitals(data_set_key):
+        return sorted(list(chain.from_iterable(
+            [d['from'], d['to']]
+            for d in data_set[data_set_key]['nto_contributions']
+        )))
+
+    # NOTE the excited state is a linear combination of multiple ground state
+    # molecular orbitals.
+    vertical_excitation_mos = []
+    vertical_excitation_mos.extend(
+        excited_state_orbitals(data_set['vertical_singlet']['excited_states'], 10)
+    )
+    vertical_excitation_mos.extend(
+        excited_state_orbitals(data_set['vertical_triplet']['excited_states'], 10)
+    )
 
-\usepackage{float}
-\usepackage{graphicx}
-\usepackage[a4paper, margin=0.7in]{geometry}
-\usepackage{hyperref}
-\usepackage{longtable}
-\usepackage{multirow}
-\usepackage{tabularx}
-\usepackage{times}
-\usepackage[flushleft]{threeparttable}
+    return {
+        'ground': sorted(list(set(vertical_excitation_mos))),
+        'vertical_singlet_nto': nto_orbitals('vertical_singlet_nto'),
+        'vertical_triplet_nto': nto_orbitals('vertical_triplet_nto'),
+        'adiabatic_singlet': excited_state_orbitals(
+            data_set['adiabatic_singlet']['excited_states'], 10),
+        'adiabatic_singlet_nto': nto_orbitals('adiabatic_singlet_nto'),
+        'adiabatic_triplet': excited_state_orbitals(
+            data_set['adiabatic_triplet']['excited_states'], 10),
+        'adiabatic_triplet_nto': nto_orbitals('adiabatic_triplet_nto'),
+    }
+
+
+OVERVIEW_SECTION = [
+    Heading('Overview'),
+    EnergyComparison(
+        caption='S0 and 1st excitation state energies (in Hartrees)',
+        n_root=0,
+        ground_state_key='ground',
+        vertical_excitation_singlet_key='vertical_singlet',
+        vertical_excitation_triplet_key='vertical_triplet',
+        relaxed_excitation_singlet_key='adiabatic_singlet',
+        relaxed_excitation_triplet_key='adiabatic_triplet'
+    ),
+    NewPage(),
+]
+
+GROUND_STATE_SECTION = [
+    Heading('Ground state'),
+    StructureFigure('S0 state structure', 'ground'),
+    NewPage(),
+
+    CoordinateTable('S0 state structure (in \\AA)', 'ground'),
+    NewPage(),
+
+    Heading('Vertical excitation: singlets', 2),
+    ExcitedStateTable('Vertical excitation: Singlets', 'vertical_singlet',
+                      max_states=10),
+    NewPage(),
+
+    Heading('Vertical excitation: triplets', 2),
+    ExcitedStateTable('Vertical excitation: Triplets', 'vertical_triplet',
+                      max_states=10),
+    NewPage(),
+
+    Heading('Orbits (S0 structure)', 2),
+    MOGallery('S0 molecular orbital {}', 'ground', occupancy=True),
+
+    # S0 -- NTO Vertical Singlets
+    Heading('Natural Transition Orbital (NTO) Analysis', 2),
+    Heading('Vertical Singlets', 3),
+    NTOTable('NTO -- Vertical Singlets', 'vertical_singlet_nto'),
+    NewPage(),
+    MOGallery('Vertical Singlet NTO Orbital {}', 'vertical_singlet_nto'),
+
+    Heading('Vertical Triplets', 3),
+    NTOTable('NTO -- Vertical Triplets', 'vertical_triplet_nto'),
+    NewPage(),
+    MOGallery('Vertical Triplet NTO Orbital {}', 'vertical_triplet_nto'),
+]
+
+
+def relaxed_state_section(data_set_key, state, multiplicity):
+    """ Section of the relaxed S1 or T1 state, e.g. state='S1' and
+    multiplicity='Singlet'
+    """
+    nto_key = '{}_nto'.format(data_set_key)
+
+    return [
+        Heading('{} state'.format(state)),
+        StructureFigure('Relaxed {} structure'.format(state), data_set_key),
+        NewPage(),
+
+        CoordinateTable('Relaxed {} structure (in \\AA)'.format(state),
+                        data_set_key),
+        NewPage(),
+
+        ExcitedStateTable('Adiabatic excitation: {}s'.format(multiplicity),
+                          data_set_key, max_states=10),
+        NewPage(),
+
+        Heading('Orbits ({} structure)'.format(state), 2),
+        MOGallery('{} molecular orbital {{}}'.format(state), data_set_key,
+                  occupancy=True),
+
+        Heading('Natural Transition Orbital (NTO) Analysis', 2),
+        NTOTable('NTO -- Adiabatic {}s'.format(multiplicity), nto_key),
+        NewPage(),
+        MOGallery('Adiabatic {} NTO Orbital {{}}'.format(multiplicity),
+                  nto_key),
+    ]
+
+
+# Sections of the report in order, as lists of report components
+REPORT_SECTIONS = {
+    'overview': OVERVIEW_SECTION,
+    'ground': GROUND_STATE_SECTION,
+    'adiabatic_singlet': relaxed_state_section('adiabatic_singlet', 'S1',
+                                               'Singlet'),
+    'adiabatic_triplet': relaxed_state_section('adiabatic_triplet', 'T1',
+                                               'Triplet'),
+}
 
-\pagestyle{headings}
+# Data sets whose optimized structure is rendered
+STRUCTURE_KEYS = ['ground', 'adiabatic_singlet', 'adiabatic_triplet']
 
-\setlength\extrarowheight{1pt}
 
-\begin{document}
+def report_components(sections):
+    """ Components of the whole LaTeX document around the given section
+    components
+    """
+    return [Raw(LATEX_PREAMBLE)] + list(sections) + [Raw(r"\end{document}")]
 
-\tableofcontents
-\newpage
 
-\listoftables
-\newpage
+def write_report(molecule_name, data_set, output_dir, path_spec=None,
+                 cube_engine='cubegen', scheduler=None, binary_cubes=False,
+                 renderer=None, npts=-2, store=None, latex_pool=None):
+    """ Render the images of a molecule and write its LaTeX report, returns
+    the report file name. The components of the report are rendered in
+    latex_pool if given.
+    """
+    structure_images = {
+        data_set_key: render_structure(
+            get_path(molecule_name, data_set_key, 'log', path_spec),
+            renderer=renderer
+        )
+        for data_set_key in STRUCTURE_KEYS
+    }
+
+    mos = report_orbitals(data_set)
+    mo_images = {
+        data_set_key: render_mos(
+            get_path(molecule_name, data_set_key, 'fchk', path_spec),
+            data_set_mos,
+            cube_engine=cube_engine,
+            scheduler=scheduler,
+            binary_cubes=binary_cubes,
+            renderer=renderer,
+            npts=npts,
+            store=store
+        )
+        for data_set_key, data_set_mos in mos.items()
+    }
+
+    if renderer is not None:
+        renderer.render()
+
+    # === LATEX OUTPUT
+
+    # Every fragment goes to the file as soon as it is formatted
+    input_data = {
+        'data_set': data_set,
+        'mos': mos,
+        'structure_images': structure_images,
+        'mo_images': mo_images,
+    }
+    components = report_components(
+        chain.from_iterable(REPORT_SECTIONS.values()))
+
+    report_file = os.path.join(output_dir, '{}.tex'.format(molecule_name))
+    with open(report_file, 'w') as stream:
+        report_engine.generate_report(input_data, stream, components,
+                                      report_engine.OutputFormat.LATEX,
+                                      executor=latex_pool)
+    return report_file
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    path_spec = load_path_spec(args.path_spec, args.base_directory)
+    molecule_names = expand_molecules(args.molecule_names, path_spec)
+
+    # Before any pool is created, so that the workers trace too
+    trace_dir = None
+    if args.trace:
+        trace_dir = tempfile.mkdtemp(prefix='report-trace-')
+        instrumentation.enable(trace_dir)
+
+    cache = None
+    if args.cache_dir:
+        cache = extract_cache.ExtractCache(args.cache_dir,
+                                           max_size=args.cache_size)
+
+    store = None
+    if args.artifact_dir:
+        store = artifact_store.ArtifactStore(args.artifact_dir,
+                                             max_size=args.artifact_size)
+
+    scheduler = cubegen_driver.CubegenScheduler(
+        core_budget=args.cores,
+        threads_per_job=args.cube_threads,
+        timeout=args.cube_timeout,
+        retries=args.cube_retries,
+        autotune=args.autotune
+    )
 
-\listoffigures
-\newpage
-""")
-
-latex_output_list.append(section('Overview'))
-latex_output_list.append(excited_state_energies(
-    data_set=data_set,
-    caption='S0 and 1st excitation state energies (in Hartrees)',
-    n_root=0,
-    ground_state_key='ground',
-    vertical_excitation_singlet_key='vertical_singlet',
-    vertical_excitation_triplet_key='vertical_triplet',
-    relaxed_excitation_singlet_key='adiabatic_singlet',
-    relaxed_excitation_triplet_key='adiabatic_triplet'
-))
-latex_output_list.append(newpage())
-
-latex_output_list.append(section('Ground state'))
-latex_output_list.append(figure(
-    'S0 state structure',
-    rendered_ground_state
-))
-latex_output_list.append(newpage())
-
-latex_output_list.append(xyz_coordinate(
-    'S0 state structure (in \\AA)',
-    data_set,
-    'ground'
-))
-latex_output_list.append(newpage())
-
-latex_output_list.append(subsection('Vertical excitation: singlets'))
-latex_output_list.append(excited_state_table(
-    data_set=data_set,
-    caption='Vertical excitation: Singlets',
-    data_set_key='vertical_singlet',
-    max_states=10
-))
-latex_output_list.append(newpage())
-
-latex_output_list.append(subsection('Vertical excitation: triplets'))
-latex_output_list.append(excited_state_table(
-    data_set=data_set,
-    caption='Vertical excitation: Triplets',
-    data_set_key='vertical_triplet',
-    max_states=10
-))
-latex_output_list.append(newpage())
-
-latex_output_list.append(subsection('Orbits (S0 structure)'))
-for index in range(len(vertical_excitation_mos)):
-    mo_index = vertical_excitation_mos[index]
-    caption = 'S0 molecular orbital {}'.format(mo_index)
-    if mo_index <= data_set['ground']['homo_index']:
-        caption += ' (occupied)'
-    else:
-        caption += ' (unoccupied)'
-    latex_output_list.append(figure(
-        caption,
-        rendered_ground_structure_mos[index]
-    ))
-    latex_output_list.append(newpage())
-
-# S0 -- NTO Vertical Singlets
-latex_output_list.append(subsection('Natural Transition Orbital (NTO) Analysis'))
-latex_output_list.append(subsubsection('Vertical Singlets'))
-latex_output_list.append(nto_analysis_table(
-    data_set, 'NTO -- Vertical Singlets', 'vertical_singlet_nto'))
-latex_output_list.append(newpage())
-
-for index in range(len(vertical_excitation_singlet_orbits)):
-    mo_index = vertical_excitation_singlet_orbits[index]
-    caption = 'Vertical Singlet NTO Orbital {}'.format(mo_index)
-    latex_output_list.append(figure(
-        caption,
-        render_vertical_excitation_singlet_mos[index]
-    ))
-    latex_output_list.append(newpage())
-
-latex_output_list.append(subsubsection('Vertical Triplets'))
-latex_output_list.append(nto_analysis_table(
-    data_set, 'NTO -- Vertical Triplets', 'vertical_triplet_nto'))
-latex_output_list.append(newpage())
-
-
-for index in range(len(vertical_excitation_triplet_orbits)):
-    mo_index = vertical_excitation_triplet_orbits[index]
-    caption = 'Vertical Triplet NTO Orbital {}'.format(mo_index)
-    latex_output_list.append(figure(
-        caption,
-        render_vertical_excitation_triplet_mos[index]
-    ))
-    latex_output_list.append(newpage())
-
-# === S1
-latex_output_list.append(section('S1 state'))
-latex_output_list.append(figure(
-    'Relaxed S1 structure',
-    rendered_adiabatic_singlet_state
-))
-latex_output_list.append(newpage())
-
-latex_output_list.append(xyz_coordinate(
-    'Relaxed S1 structure (in \\AA)',
-    data_set,
-    'adiabatic_singlet'
-))
-latex_output_list.append(newpage())
-
-latex_output_list.append(excited_state_table(
-    data_set=data_set,
-    caption='Adiabatic excitation: Singlets',
-    data_set_key='adiabatic_singlet',
-    max_states=10
-))
-latex_output_list.append(newpage())
-
-latex_output_list.append(subsection('Orbits (S1 structure)'))
-for index in range(len(adiabatic_singlet_mos)):
-    mo_index = adiabatic_singlet_mos[index]
-    caption = 'S1 molecular orbital {}'.format(mo_index)
-    if mo_index <= data_set['adiabatic_singlet']['homo_index']:
-        caption += ' (occupied)'
+    # One pool parses the logs of all molecules, a thread pool renders
+    # several molecules at once. With --jobs > 1 the logs of the next
+    # --prefetch molecules are parsed while the current ones render, so
+    # only molecule_threads + prefetch data sets are alive at any time.
+    # Without the pool each molecule is parsed in its rendering thread, and
+    # nothing would parse the molecules submitted ahead.
+    pool = None
+    if args.jobs > 1:
+        pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=args.jobs, mp_context=cclib_driver.pool_context())
+    if pool is not None and not args.load_data:
+        prefetch = 1 if args.prefetch is None else max(0, args.prefetch)
     else:
-        caption += ' (unoccupied)'
-    latex_output_list.append(figure(
-        caption,
-        rendered_adiabatic_singlet_mos[index]
-    ))
-    latex_output_list.append(newpage())
-
-latex_output_list.append(subsection('Natural Transition Orbital (NTO) Analysis'))
-latex_output_list.append(nto_analysis_table(
-    data_set, 'NTO -- Adiabatic Singlets', 'adiabatic_singlet_nto'))
-latex_output_list.append(newpage())
-
-for index in range(len(adiabatic_excitation_singlet_orbits)):
-    mo_index = adiabatic_excitation_singlet_orbits[index]
-    caption = 'Adiabatic Singlet NTO Orbital {}'.format(mo_index)
-    latex_output_list.append(figure(
-        caption,
-        render_adiabatic_excitation_singlet_mos[index]
-    ))
-    latex_output_list.append(newpage())
-
-
-# === T1
-latex_output_list.append(section('T1 state'))
-latex_output_list.append(figure(
-    'Relaxed T1 structure',
-    rendered_adiabatic_triplet_state
-))
-latex_output_list.append(newpage())
-
-latex_output_list.append(xyz_coordinate(
-    'Relaxed T1 structure (in \\AA)',
-    data_set,
-    'adiabatic_triplet'
-))
-latex_output_list.append(newpage())
-
-latex_output_list.append(excited_state_table(
-    data_set=data_set,
-    caption='Adiabatic excitation: Triplets',
-    data_set_key='adiabatic_triplet',
-    max_states=10
-))
-latex_output_list.append(newpage())
-
-latex_output_list.append(subsection('Orbits (T1 structure)'))
-for index in range(len(adiabatic_triplet_mos)):
-    mo_index = adiabatic_triplet_mos[index]
-    caption = 'T1 molecular orbital {}'.format(mo_index)
-    if mo_index <= data_set['adiabatic_triplet']['homo_index']:
-        caption += ' (occupied)'
-    else:
-        caption += ' (unoccupied)'
-    latex_output_list.append(figure(
-        caption,
-        rendered_adiabatic_triplet_mos[index]
-    ))
-    latex_output_list.append(newpage())
-
-latex_output_list.append(subsection('Natural Transition Orbital (NTO) Analysis'))
-latex_output_list.append(nto_analysis_table(
-    data_set, 'NTO -- Adiabatic Triplets', 'adiabatic_triplet_nto'))
-latex_output_list.append(newpage())
-
-for index in range(len(adiabatic_excitation_triplet_orbits)):
-    mo_index = adiabatic_excitation_triplet_orbits[index]
-    caption = 'Adiabatic Triplet NTO Orbital {}'.format(mo_index)
-    latex_output_list.append(figure(
-        caption,
-        render_adiabatic_excitation_triplet_mos[index]
-    ))
-    latex_output_list.append(newpage())
-
-
-
-latex_output_list.append(r"\end{document}")
-
+        if args.prefetch:
+            logger.warning('--prefetch has no effect with --jobs 1 or '
+                           '--load-data')
+        prefetch = 0
+
+    def report_molecule(molecule_name, tasks, futures, renderer):
+        with instrumentation.span(molecule_name, 'molecule'):
+            return _report_molecule(molecule_name, tasks, futures, renderer)
+
+    def _report_molecule(molecule_name, tasks, futures, renderer):
+        if args.load_data:
+            data_set = data_set_file.load_data_set(
+                os.path.join(args.load_data, molecule_name))
+        elif futures is not None:
+            data_set = cclib_driver.gather_logs(tasks, futures)
+        else:
+            data_set = cclib_driver.extract_logs(tasks, cache=cache)
+        if args.save_data:
+            data_set_file.save_data_set(
+                data_set, os.path.join(args.save_data, molecule_name))
+        return write_report(
+            molecule_name, data_set, args.output_dir,
+            path_spec=path_spec,
+            cube_engine=args.cube_engine,
+            scheduler=scheduler,
+            binary_cubes=args.binary_cubes,
+            renderer=renderer,
+            npts=args.npts,
+            store=store
+        )
 
-with open('output_aie_pople/{}.tex'.format(MOLECULE_NAME), 'w') as stream:
-    stream.write('\n'.join(latex_output_list))
+    molecules = iter(molecule_names)
+    in_flight = {}
+    failed = []
+    # Images are only queued by render_structure and render_mos, and all
+    # rendered at once before the LaTeX output of each molecule
+    with render_driver.BatchRenderer(workers=args.render_workers) as renderer, \
+            concurrent.futures.ThreadPoolExecutor(
+                max_workers=args.molecule_threads) as threads:
+
+        def submit_next():
+            molecule_name = next(molecules, None)
+            if molecule_name is None:
+                return
+            tasks = extraction_tasks(molecule_name, path_spec,
+                                     args.compact_results)
+            futures = (cclib_driver.submit_logs(tasks, pool, cache)
+                       if pool is not None and not args.load_data else None)
+            future = threads.submit(report_molecule, molecule_name, tasks,
+                                    futures, renderer.batch())
+            in_flight[future] = molecule_name
+
+        for _ in range(args.molecule_threads + prefetch):
+            submit_next()
+
+        while in_flight:
+            done, _ = concurrent.futures.wait(
+                in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                molecule_name = in_flight.pop(future)
+                try:
+                    print(future.result(), flush=True)
+                except Exception:
+                    logger.exception(
+                        'Failed to generate the report of {}'.format(
+                            molecule_name))
+                    failed.append(molecule_name)
+                submit_next()
+
+    if pool is not None:
+        pool.shutdown()
+
+    if trace_dir is not None:
+        # The workers are gone, every span has been written
+        instrumentation.disable()
+        summary = instrumentation.write_trace(args.trace, trace_dir)
+        shutil.rmtree(trace_dir, ignore_errors=True)
+        logger.info('Trace written to {}, hot spots:\n{}'.format(
+            args.trace, summary))
+
+    if failed:
+        logger.error('{} of {} reports failed: {}'.format(
+            len(failed), len(molecule_names), ', '.join(failed)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
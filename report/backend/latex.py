@@ -4,11 +4,19 @@
 import collections
 import re
 
+from itertools import chain
+
 from typing import Dict, List, Text
 
 import jinja2
 
+# Templates are only compiled on first use
+TEMPLATE_SOURCES: Dict[Text, Text] = {}
+
+
 LATEX_JINJA2_ENV = jinja2.Environment(
+	loader = jinja2.DictLoader(TEMPLATE_SOURCES),
+	auto_reload = False,
 	block_start_string = r'\BLOCK{',
 	block_end_string = '}',
 	variable_start_string = r'\VAR{',
@@ -22,26 +30,20 @@ LATEX_JINJA2_ENV = jinja2.Environment(
 )
 
 
-SECTION_TEMPLATE = LATEX_JINJA2_ENV.from_string(
-    r'\section{\VAR{section_name}}'
-)
-SUBSECTION_TEMPLATE = LATEX_JINJA2_ENV.from_string(
-    r'\subsection{\VAR{subsection_name}}'
-)
-SUBSUBSECTION_TEMPLATE = LATEX_JINJA2_ENV.from_string(
-    r'\subsubsection{\VAR{subsubsection_name}}'
-)
+TEMPLATE_SOURCES['section'] = r'\section{\VAR{section_name}}'
+TEMPLATE_SOURCES['subsection'] = r'\subsection{\VAR{subsection_name}}'
+TEMPLATE_SOURCES['subsubsection'] = r'\subsubsection{\VAR{subsubsection_name}}'
 
-FIGURE_TEMPLATE = LATEX_JINJA2_ENV.from_string(r"""
+TEMPLATE_SOURCES['figure'] = r"""
 \begin{figure}[htp]
 \begin{center}
   \caption{\VAR{caption}}
   \includegraphics[width=\textwidth]{\VAR{image_path}}
 \end{center}
 \end{figure}
-""")
+"""
 
-COORDINATE_TABLE_HEADING = LATEX_JINJA2_ENV.from_string(r"""
+TEMPLATE_SOURCES['coordinate_table_heading'] = r"""
 \begin{center}
 \begin{longtable}{rcrrr}
   \caption{\VAR{caption}}\\
@@ -71,22 +73,22 @@ COORDINATE_TABLE_HEADING = LATEX_JINJA2_ENV.from_string(r"""
   &\multicolumn{1}{c}{Z}\\
   \hline
   \endhead
-""")
-COORDINATE_TABLE_TAILING = LATEX_JINJA2_ENV.from_string(r"""
+"""
+TEMPLATE_SOURCES['coordinate_table_tailing'] = r"""
 
   \hline\hline
 \end{longtable}
 \end{center}
-""")
-COORDINATE_TABLE_ROW = LATEX_JINJA2_ENV.from_string(r"""
+"""
+TEMPLATE_SOURCES['coordinate_table_row'] = r"""
   \VAR{index}
   &\VAR{'%02s' % symbol}
   &\VAR{'%0.5f' % x}
   &\VAR{'%0.5f' % y}
   &\VAR{'%0.5f' % z}\\
-""")
+"""
 
-EXCITED_STATE_ENERGIES_COMPARISION = LATEX_JINJA2_ENV.from_string(r"""
+TEMPLATE_SOURCES['excited_state_energies_comparision'] = r"""
 \begin{center}
 \begin{longtable}{l|ccc}
   \caption{\VAR{caption}}\\
@@ -119,9 +121,9 @@ EXCITED_STATE_ENERGIES_COMPARISION = LATEX_JINJA2_ENV.from_string(r"""
   \hline\hline
 \end{longtable}
 \end{center}
-""")
+"""
 
-EXCITED_STATE_TABLE_HEADING = LATEX_JINJA2_ENV.from_string(r"""
+TEMPLATE_SOURCES['excited_state_table_heading'] = r"""
 \begin{center}
 \begin{longtable}{crrrcr}
   \caption{\VAR{caption}}\\
@@ -155,14 +157,14 @@ EXCITED_STATE_TABLE_HEADING = LATEX_JINJA2_ENV.from_string(r"""
   \multicolumn{1}{c}{Strength}\\
   \hline
   \endhead
-""")
-EXCITED_STATE_TABLE_TAILING = LATEX_JINJA2_ENV.from_string(r"""
+"""
+TEMPLATE_SOURCES['excited_state_table_tailing'] = r"""
     \hline\hline
 \end{longtable}
 \end{center}
-""")
+"""
 
-EXCITED_STATE_ROW = LATEX_JINJA2_ENV.from_string(r"""
+TEMPLATE_SOURCES['excited_state_row'] = r"""
 \rule{0pt}{4ex}
 \VAR{index}
 &\VAR{'%0.4f' % eV}
@@ -171,9 +173,9 @@ EXCITED_STATE_ROW = LATEX_JINJA2_ENV.from_string(r"""
 &\VAR{symmetric_group}
 &\VAR{'%0.4f' % oscillator_strength}\\
 \rule{0pt}{1ex}
-""")
+"""
 
-EXCITED_STATE_COEFFICIENT_ROW = LATEX_JINJA2_ENV.from_string(r"""
+TEMPLATE_SOURCES['excited_state_coefficient_row'] = r"""
 &&\multicolumn{4}{r}{
   \begin{tabular}{rclm{2cm}}
      \VAR{('%3d' % from_) | replace(' ', '\\ ')}
@@ -182,9 +184,9 @@ EXCITED_STATE_COEFFICIENT_ROW = LATEX_JINJA2_ENV.from_string(r"""
     &\VAR{('% 0.5f' % coefficient) | replace(' ', '\\ ')}\\
   \end{tabular}
 }\\
-""")
+"""
 
-NTO_ANALYSIS_TABLE_HEADING = LATEX_JINJA2_ENV.from_string(r"""
+TEMPLATE_SOURCES['nto_analysis_table_heading'] = r"""
 \begin{center}
 \begin{longtable}{ccr}
   \caption{\VAR{caption}}\\
@@ -199,17 +201,87 @@ NTO_ANALYSIS_TABLE_HEADING = LATEX_JINJA2_ENV.from_string(r"""
   \hline
   \endfirsthead
   \endhead
-""")
-NTO_ANALYSIS_TABLE_TAILING = LATEX_JINJA2_ENV.from_string(r"""
+"""
+TEMPLATE_SOURCES['nto_analysis_table_tailing'] = r"""
     \hline\hline
 \end{longtable}
 \end{center}
-""")
-NTO_ANALYSIS_TABLE_ROW = LATEX_JINJA2_ENV.from_string(r"""
+"""
+TEMPLATE_SOURCES['nto_analysis_table_row'] = r"""
   \VAR{('%3d' % from_) | replace(' ', '\\ ')} &
   \VAR{('%3d' % to) | replace(' ', '\\ ')} &
   \VAR{('% 0.5f' % contribution) | replace(' ', '\\ ')} \\ 
-""")
+"""
+
+# Module attributes of the compiled templates, kept for compatibility
+_TEMPLATE_ATTRIBUTES = {
+    'SECTION_TEMPLATE': 'section',
+    'SUBSECTION_TEMPLATE': 'subsection',
+    'SUBSUBSECTION_TEMPLATE': 'subsubsection',
+    'FIGURE_TEMPLATE': 'figure',
+    'COORDINATE_TABLE_HEADING': 'coordinate_table_heading',
+    'COORDINATE_TABLE_TAILING': 'coordinate_table_tailing',
+    'COORDINATE_TABLE_ROW': 'coordinate_table_row',
+    'EXCITED_STATE_ENERGIES_COMPARISION': 'excited_state_energies_comparision',
+    'EXCITED_STATE_TABLE_HEADING': 'excited_state_table_heading',
+    'EXCITED_STATE_TABLE_TAILING': 'excited_state_table_tailing',
+    'EXCITED_STATE_ROW': 'excited_state_row',
+    'EXCITED_STATE_COEFFICIENT_ROW': 'excited_state_coefficient_row',
+    'NTO_ANALYSIS_TABLE_HEADING': 'nto_analysis_table_heading',
+    'NTO_ANALYSIS_TABLE_TAILING': 'nto_analysis_table_tailing',
+    'NTO_ANALYSIS_TABLE_ROW': 'nto_analysis_table_row',
+}
+
+
+def get_template(name: Text) -> jinja2.Template:
+    """ The compiled template of TEMPLATE_SOURCES[name], compiled on first
+    use
+    """
+    return LATEX_JINJA2_ENV.get_template(name)
+
+
+def __getattr__(name: Text):
+    if name in _TEMPLATE_ATTRIBUTES:
+        return get_template(_TEMPLATE_ATTRIBUTES[name])
+    raise AttributeError('module {!r} has no attribute {!r}'.format(
+        __name__, name))
+
+
+# The rows of the templates above as plain format strings, the bulk path
+# formats whole tables with them in one go instead of rendering a template
+# per row. Jinja drops the trailing newline of a template, so do they.
+COORDINATE_ROW_FORMAT = (
+    '\n  %d'
+    '\n  &%02s'
+    '\n  &%0.5f'
+    '\n  &%0.5f'
+    '\n  &%0.5f\\\\'
+)
+EXCITED_STATE_ROW_FORMAT = (
+    '\n\\rule{0pt}{4ex}'
+    '\n%d'
+    '\n&%0.4f'
+    '\n&%0.2f'
+    '\n&%0.5f'
+    '\n&%s'
+    '\n&%0.4f\\\\'
+    '\n\\rule{0pt}{1ex}'
+)
+EXCITED_STATE_COEFFICIENT_ROW_FORMAT = (
+    '\n&&\\multicolumn{4}{r}{'
+    '\n  \\begin{tabular}{rclm{2cm}}'
+    '\n     %s'
+    '\n    &%s'
+    '\n    &%s'
+    '\n    &%s\\\\'
+    '\n  \\end{tabular}'
+    '\n}\\\\'
+)
+NTO_ANALYSIS_ROW_FORMAT = (
+    '\n  %s &'
+    '\n  %s &'
+    '\n  %s \\\\ '
+)
 
 HARTREE_TO_EV = 27.21138602
 NM_TO_HARTREE = 45.56335
@@ -218,36 +290,58 @@ def newpage() -> Text:
     return r'\newpage'
 
 def section(name: Text) -> Text:
-    return SECTION_TEMPLATE.render(section_name=name)
+    return get_template('section').render(section_name=name)
 
 def subsection(name: Text) -> Text:
-    return SUBSECTION_TEMPLATE.render(subsection_name=name)
+    return get_template('subsection').render(subsection_name=name)
 
 def subsubsection(name: Text) -> Text:
-    return SUBSUBSECTION_TEMPLATE.render(subsubsection_name=name)
+    return get_template('subsubsection').render(subsubsection_name=name)
 
 def figure(caption: Text, image_path: Text) -> Text:
-    return FIGURE_TEMPLATE.render(
+    return get_template('figure').render(
         caption=caption,
         image_path=image_path
     )
 
-def xyz_coordinate(caption: Text, data_set: Dict, data_set_key: Text) -> Text:
+def _escape_spaces(text: Text) -> Text:
+    return text.replace(' ', '\\ ')
+
+def xyz_coordinate(caption: Text,
+                   data_set: Dict,
+                   data_set_key: Text,
+                   bulk: bool = True) -> Text:
+    """ Table of the coordinates of the atoms. The bulk path formats the
+    whole table at once, bulk=False renders a template per atom; both give
+    the same output.
+    """
     table_data = []
-    table_data.append(COORDINATE_TABLE_HEADING.render(
+    table_data.append(get_template('coordinate_table_heading').render(
         caption=caption
     ))
-    for index in range(data_set[data_set_key]['num_atoms']):
-        atom_symbol = data_set[data_set_key]['atoms']['symbols'][index]
-        atom_coord = data_set[data_set_key]['atoms']['coordinates'][index]
-        table_data.append(COORDINATE_TABLE_ROW.render(
-            index=index + 1,
-            symbol=atom_symbol,
-            x=atom_coord[0],
-            y=atom_coord[1],
-            z=atom_coord[2]
-        ))
-    table_data.append(COORDINATE_TABLE_TAILING.render())
+    num_atoms = data_set[data_set_key]['num_atoms']
+    symbols = data_set[data_set_key]['atoms']['symbols']
+    coordinates = data_set[data_set_key]['atoms']['coordinates']
+    if bulk and num_atoms:
+        values = []
+        for index in range(num_atoms):
+            atom_coord = coordinates[index]
+            values.extend((index + 1, symbols[index],
+                           atom_coord[0], atom_coord[1], atom_coord[2]))
+        table_data.append(
+            '\n'.join([COORDINATE_ROW_FORMAT] * num_atoms) % tuple(values))
+    elif not bulk:
+        for index in range(num_atoms):
+            atom_symbol = symbols[index]
+            atom_coord = coordinates[index]
+            table_data.append(get_template('coordinate_table_row').render(
+                index=index + 1,
+                symbol=atom_symbol,
+                x=atom_coord[0],
+                y=atom_coord[1],
+                z=atom_coord[2]
+            ))
+    table_data.append(get_template('coordinate_table_tailing').render())
     return '\n'.join(table_data)
 
 def excited_state_energies(data_set: Dict,
@@ -291,7 +385,7 @@ def excited_state_energies(data_set: Dict,
                            ['excitation_energy']
     )
 
-    return EXCITED_STATE_ENERGIES_COMPARISION.render(
+    return get_template('excited_state_energies_comparision').render(
         caption=caption,
         rgs_egs=rgs_egs, ress_egs=ress_egs, rest_egs=rest_egs,
         rgs_eess=rgs_eess, ress_eess=ress_eess,
@@ -301,8 +395,13 @@ def excited_state_energies(data_set: Dict,
 def excited_state_table(data_set: Dict,
                         caption: Text,
                         data_set_key: Text,
-                        max_states: int = None) -> Text:
-    heading = EXCITED_STATE_TABLE_HEADING.render(caption=caption)
+                        max_states: int = None,
+                        bulk: bool = True) -> Text:
+    """ Table of the excited states and their orbital contributions. The
+    bulk path formats rows with plain format strings, bulk=False renders a
+    template per row; both give the same output.
+    """
+    heading = get_template('excited_state_table_heading').render(caption=caption)
 
     multiplicity_sections = []
     for multiplicity in ['singlet', 'triplet', 'unknown']:
@@ -322,21 +421,38 @@ def excited_state_table(data_set: Dict,
                 symmetric = '{}-{}'.format(state['symmetric_group'],
                                            multiplicity)
             symmetric = state['symmetric_group']
-            rows.append(EXCITED_STATE_ROW.render(
-                index=index + 1,
-                eV=exci_energy * HARTREE_TO_EV,
-                nm=NM_TO_HARTREE / exci_energy,
-                hartree=exci_energy,
-                symmetric_group=symmetric,
-                oscillator_strength=state['oscillator_strength']
-            ))
+            if bulk:
+                rows.append(EXCITED_STATE_ROW_FORMAT % (
+                    index + 1,
+                    exci_energy * HARTREE_TO_EV,
+                    NM_TO_HARTREE / exci_energy,
+                    exci_energy,
+                    symmetric,
+                    state['oscillator_strength']
+                ))
+            else:
+                rows.append(get_template('excited_state_row').render(
+                    index=index + 1,
+                    eV=exci_energy * HARTREE_TO_EV,
+                    nm=NM_TO_HARTREE / exci_energy,
+                    hartree=exci_energy,
+                    symmetric_group=symmetric,
+                    oscillator_strength=state['oscillator_strength']
+                ))
 
             # Add coefficients for contributions from orbitals
             for orbital in state['orbitals']:
                 f = orbital['from']
                 t = orbital['to']
                 op = r'$\rightarrow$' if f < t else r'$\leftarrow$'
-                rows.append(EXCITED_STATE_COEFFICIENT_ROW.render(
+                if bulk:
+                    rows.append(EXCITED_STATE_COEFFICIENT_ROW_FORMAT % (
+                        _escape_spaces('%3d' % f), op,
+                        _escape_spaces('%3d' % t),
+                        _escape_spaces('% 0.5f' % orbital['coefficient'])
+                    ))
+                    continue
+                rows.append(get_template('excited_state_coefficient_row').render(
                     from_=f, direction=op, to=t,
                     coefficient=orbital['coefficient']
                 ))
@@ -347,7 +463,7 @@ def excited_state_table(data_set: Dict,
         multiplicity_sections.append('\n'.join(rows))
     content = '\\hline'.join(multiplicity_sections)
 
-    tailing = EXCITED_STATE_TABLE_TAILING.render()
+    tailing = get_template('excited_state_table_tailing').render()
 
     if content:
         return heading + content + tailing
@@ -356,18 +472,32 @@ def excited_state_table(data_set: Dict,
 
 def nto_analysis_table(data_set: Dict,
                        caption: Text,
-                       data_set_key: Text):
-    heading = NTO_ANALYSIS_TABLE_HEADING.render(caption=caption)
-
-    rows = []
-    for nto_contribution in data_set[data_set_key]['nto_contributions']:
-        rows.append(NTO_ANALYSIS_TABLE_ROW.render(
-            from_=nto_contribution['from'],
-            to=nto_contribution['to'],
-            contribution=nto_contribution['contribution']))
-    content = '\n'.join(rows)
+                       data_set_key: Text,
+                       bulk: bool = True):
+    """ Table of the NTO contributions, bulk=False renders a template per
+    row instead of formatting them all at once
+    """
+    heading = get_template('nto_analysis_table_heading').render(caption=caption)
+
+    contributions = data_set[data_set_key]['nto_contributions']
+    if bulk:
+        content = '\n'.join([NTO_ANALYSIS_ROW_FORMAT] * len(contributions)) % \
+            tuple(chain.from_iterable(
+                (_escape_spaces('%3d' % c['from']),
+                 _escape_spaces('%3d' % c['to']),
+                 _escape_spaces('% 0.5f' % c['contribution']))
+                for c in contributions
+            ))
+    else:
+        rows = []
+        for nto_contribution in contributions:
+            rows.append(get_template('nto_analysis_table_row').render(
+                from_=nto_contribution['from'],
+                to=nto_contribution['to'],
+                contribution=nto_contribution['contribution']))
+        content = '\n'.join(rows)
     
-    tailing = NTO_ANALYSIS_TABLE_TAILING.render()
+    tailing = get_template('nto_analysis_table_tailing').render()
 
     if content:
         return heading + content + tailing
@@ -0,0 +1,156 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+""" Declarative building blocks of a report.
+
+A component renders LaTeX fragments from the input data of the report: a
+dict with the data_set, the rendered MOs of every data set ('mos'), and the
+image paths of the structures ('structure_images') and MOs ('mo_images').
+Components are plain picklable objects, so that report.engine can render
+them in worker processes.
+"""
+
+from typing import Dict, Iterable, Text
+
+from report.backend.latex import (
+    excited_state_energies,
+    excited_state_table,
+    figure,
+    newpage,
+    nto_analysis_table,
+    section,
+    subsection,
+    subsubsection,
+    xyz_coordinate
+)
+
+_HEADINGS = {
+    1: section,
+    2: subsection,
+    3: subsubsection,
+}
+
+
+class Component(object):
+
+    def render(self, input_data: Dict) -> Iterable[Text]:
+        raise NotImplementedError()
+
+    def __call__(self, input_data: Dict) -> Iterable[Text]:
+        return self.render(input_data)
+
+
+class Raw(Component):
+    """ A fixed piece of LaTeX """
+
+    def __init__(self, text: Text):
+        self.text = text
+
+    def render(self, input_data):
+        return [self.text]
+
+
+class NewPage(Component):
+
+    def render(self, input_data):
+        return [newpage()]
+
+
+class Heading(Component):
+    """ Section (level 1), subsection (2) or subsubsection (3) """
+
+    def __init__(self, title: Text, level: int = 1):
+        self.title = title
+        self.level = level
+
+    def render(self, input_data):
+        return [_HEADINGS[self.level](self.title)]
+
+
+class EnergyComparison(Component):
+    """ Ground and first excited state energies at the ground and relaxed
+    structures, keyword arguments are those of excited_state_energies
+    """
+
+    def __init__(self, caption: Text, **keys):
+        self.caption = caption
+        self.keys = keys
+
+    def render(self, input_data):
+        return [excited_state_energies(data_set=input_data['data_set'],
+                                       caption=self.caption, **self.keys)]
+
+
+class StructureFigure(Component):
+
+    def __init__(self, caption: Text, data_set_key: Text):
+        self.caption = caption
+        self.data_set_key = data_set_key
+
+    def render(self, input_data):
+        return [figure(self.caption,
+                       input_data['structure_images'][self.data_set_key])]
+
+
+class CoordinateTable(Component):
+
+    def __init__(self, caption: Text, data_set_key: Text):
+        self.caption = caption
+        self.data_set_key = data_set_key
+
+    def render(self, input_data):
+        return [xyz_coordinate(self.caption, input_data['data_set'],
+                               self.data_set_key)]
+
+
+class ExcitedStateTable(Component):
+
+    def __init__(self, caption: Text, data_set_key: Text,
+                 max_states: int = None):
+        self.caption = caption
+        self.data_set_key = data_set_key
+        self.max_states = max_states
+
+    def render(self, input_data):
+        return [excited_state_table(data_set=input_data['data_set'],
+                                    caption=self.caption,
+                                    data_set_key=self.data_set_key,
+                                    max_states=self.max_states)]
+
+
+class NTOTable(Component):
+
+    def __init__(self, caption: Text, data_set_key: Text):
+        self.caption = caption
+        self.data_set_key = data_set_key
+
+    def render(self, input_data):
+        return [nto_analysis_table(input_data['data_set'], self.caption,
+                                   self.data_set_key)]
+
+
+class MOGallery(Component):
+    """ One figure per rendered MO of a data set, each on its own page.
+    caption is formatted with the MO index; with occupancy the caption
+    tells whether the MO is occupied, from the HOMO of the data set.
+    """
+
+    def __init__(self, caption: Text, data_set_key: Text,
+                 occupancy: bool = False):
+        self.caption = caption
+        self.data_set_key = data_set_key
+        self.occupancy = occupancy
+
+    def render(self, input_data):
+        mos = input_data['mos'][self.data_set_key]
+        images = input_data['mo_images'][self.data_set_key]
+        for mo_index, image in zip(mos, images):
+            caption = self.caption.format(mo_index)
+            if self.occupancy:
+                homo_index = \
+                    input_data['data_set'][self.data_set_key]['homo_index']
+                if mo_index <= homo_index:
+                    caption += ' (occupied)'
+                else:
+                    caption += ' (unoccupied)'
+            yield figure(caption, image)
+            yield newpage()
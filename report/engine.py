@@ -1,10 +1,94 @@
+import collections
+import concurrent.futures
 import enum
 import io
 
+from typing import Callable, Iterable, List, Text, Union
+
+import drivers.instrumentation as instrumentation
+
+# A component turns the input data into LaTeX, either as one string or as
+# an iterable of fragments produced one after the other. See
+# report.components for the declarative ones.
+Component = Callable[[dict], Union[Text, Iterable[Text]]]
+
+# Fragments are separated by a newline, across components too
+FRAGMENT_SEPARATOR = '\n'
+
+# Components rendered ahead of the one being written with an executor
+DEFAULT_MAX_PENDING = 32
+
 
 class OutputFormat(enum.Enum):
     LATEX = 1
 
 
-def generate_report(input_data: dict, output_stream: io.BufferedWriter, components: list, format: OutputFormat) -> None:
-    pass
\ No newline at end of file
+def _fragments(component: Component, input_data: dict) -> Iterable[Text]:
+    output = component(input_data)
+    if isinstance(output, str):
+        return [output]
+    return output
+
+
+def _component_name(component: Component) -> Text:
+    component = getattr(component, 'func', component)
+    return getattr(component, '__qualname__', type(component).__name__)
+
+
+def _render(component: Component, input_data: dict) -> List[Text]:
+    """ Render a whole component in a worker """
+    with instrumentation.span(_component_name(component), 'latex'):
+        return list(_fragments(component, input_data))
+
+
+def _rendered(components: List[Component],
+              input_data: dict,
+              executor: concurrent.futures.Executor,
+              max_pending: int) -> Iterable[Iterable[Text]]:
+    """ Fragments of every component in order, rendered by executor at most
+    max_pending components ahead of the one being consumed
+    """
+    if executor is None:
+        for component in components:
+            # Traced components are rendered whole to time them
+            if instrumentation.enabled():
+                yield _render(component, input_data)
+            else:
+                yield _fragments(component, input_data)
+        return
+
+    pending = collections.deque()
+    components = iter(components)
+    for component in components:
+        pending.append(executor.submit(_render, component, input_data))
+        if len(pending) >= max_pending:
+            break
+    while pending:
+        fragments = pending.popleft().result()
+        component = next(components, None)
+        if component is not None:
+            pending.append(executor.submit(_render, component, input_data))
+        yield fragments
+
+
+def generate_report(input_data: dict, output_stream: io.BufferedWriter, components: List[Component], format: OutputFormat, executor: concurrent.futures.Executor = None, max_pending: int = DEFAULT_MAX_PENDING) -> None:
+    """ Stream the report to output_stream: every fragment is written as
+    soon as it is available, the document is never held in memory.
+    output_stream may be a binary or a text stream.
+
+    With an executor independent components are rendered in parallel, at
+    most max_pending ahead of the writer, and written back in order. A
+    process pool needs picklable components and input data.
+    """
+    if format != OutputFormat.LATEX:
+        raise ValueError('Unsupported output format {}'.format(format))
+
+    binary = not isinstance(output_stream, io.TextIOBase)
+    separator = ''
+    for fragments in _rendered(components, input_data, executor,
+                               max_pending):
+        for fragment in fragments:
+            text = separator + fragment
+            output_stream.write(text.encode('utf-8') if binary else text)
+            separator = FRAGMENT_SEPARATOR
+        output_stream.flush()
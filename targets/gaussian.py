@@ -1,17 +1,44 @@
-import subprocess
+import os
 
-import luigi
-import luigi.file
+from typing import Text
 
+# Gaussian writes the termination line at the very end of the log
+TAIL_SIZE = 4096
 
-class GaussianLogFileTarget(luigi.file.LocalTarget):
 
-    def _is_complete(self):
-        with self.open() as stream:
-            pass
+def is_normal_termination(log_file: Text) -> bool:
+    """ Whether the Gaussian job of a log terminated normally, only reads
+    the end of the log
+    """
+    with open(log_file, 'rb') as stream:
+        stream.seek(0, os.SEEK_END)
+        stream.seek(max(0, stream.tell() - TAIL_SIZE))
+        return b'Normal termination of Gaussian' in stream.read()
 
-    def exists(self):
-        if not super().exists():
-            return False
-        
-        return self._is_complete()
+
+def _log_file_target_class() -> type:
+    import luigi
+
+    class GaussianLogFileTarget(luigi.LocalTarget):
+        """ A Gaussian log that only exists once the job terminated normally
+        """
+
+        def exists(self):
+            if not super().exists():
+                return False
+
+            return is_normal_termination(self.path)
+
+    # Picklable as a module level class
+    GaussianLogFileTarget.__qualname__ = GaussianLogFileTarget.__name__
+    return GaussianLogFileTarget
+
+
+def __getattr__(name: Text):
+    # luigi is only imported once the target is actually used
+    if name == 'GaussianLogFileTarget':
+        target_class = _log_file_target_class()
+        globals()[name] = target_class
+        return target_class
+    raise AttributeError('module {!r} has no attribute {!r}'.format(
+        __name__, name))
@@ -0,0 +1,109 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+import os.path
+
+from typing import Dict, List, Text, Tuple
+
+import luigi
+from luigi.task import flatten
+
+from drivers.extract_cache import file_digest
+
+STAMP_SUFFIX = '.inputs'
+
+
+class HashedTask(luigi.Task):
+    """ A task that is complete once its outputs exist and were made from the
+    current content of its inputs.
+
+    Unlike luigi.Task a task is never complete while one of its
+    requirements is not, so that a change anywhere upstream reaches the
+    final task. The inputs are the outputs of requires() plus
+    extra_inputs(). Their
+    digest is stored next to the first output in <output>.inputs together
+    with the size and mtime of every input, so a file is only hashed again
+    when it was touched. Bump TASK_VERSION to redo a task after a change of
+    its code.
+    """
+
+    TASK_VERSION = 1
+
+    def extra_inputs(self) -> List[Text]:
+        """ Files read by run() that are not outputs of other tasks
+        """
+        return []
+
+    def version(self) -> Text:
+        return str(self.TASK_VERSION)
+
+    def input_files(self) -> List[Text]:
+        files = [target.path for target in flatten(self.input())]
+        files.extend(self.extra_inputs())
+        return sorted(set(os.path.abspath(f) for f in files))
+
+    def stamp_file(self) -> Text:
+        return flatten(self.output())[0].path + STAMP_SUFFIX
+
+    def inputs_digest(self, known: Dict = None) -> Tuple[Text, Dict]:
+        """ Digest of the task and the content of its inputs, file digests
+        in known are reused when the size and mtime did not change
+        """
+        known = known or {}
+        files = {}
+        digest = hashlib.sha256()
+        digest.update(self.task_family.encode())
+        digest.update(self.version().encode())
+        digest.update(json.dumps(self.to_str_params(only_significant=True),
+                                 sort_keys=True).encode())
+        for file_name in self.input_files():
+            stat = os.stat(file_name)
+            previous = known.get(file_name)
+            if previous and previous[:2] == [stat.st_size, stat.st_mtime_ns]:
+                content_digest = previous[2]
+            else:
+                content_digest = file_digest(file_name)
+            files[file_name] = [stat.st_size, stat.st_mtime_ns, content_digest]
+            digest.update(file_name.encode())
+            digest.update(content_digest.encode())
+        return digest.hexdigest(), files
+
+    def _read_stamp(self) -> Dict:
+        try:
+            with open(self.stamp_file(), 'r') as stream:
+                return json.load(stream)
+        except (OSError, ValueError):
+            return None
+
+    def complete(self) -> bool:
+        if not all(target.exists() for target in flatten(self.output())):
+            return False
+        if not all(task.complete() for task in flatten(self.requires())):
+            return False
+        stamp = self._read_stamp()
+        if stamp is None:
+            return False
+        try:
+            digest, files = self.inputs_digest(stamp['files'])
+        except OSError:
+            return False
+        if digest != stamp['digest']:
+            return False
+        if files != stamp['files']:
+            # Same content, only refresh the recorded mtimes
+            self._write_stamp(digest, files)
+        return True
+
+    def _write_stamp(self, digest: Text, files: Dict) -> None:
+        stamp_file = self.stamp_file()
+        with open(stamp_file + '.tmp', 'w') as stream:
+            json.dump({'digest': digest, 'files': files}, stream)
+        os.replace(stamp_file + '.tmp', stamp_file)
+
+    def on_success(self):
+        self._write_stamp(*self.inputs_digest(
+            (self._read_stamp() or {}).get('files')))
+        return super().on_success()
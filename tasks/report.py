@@ -0,0 +1,371 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os.path
+import pickle
+import subprocess
+
+from itertools import chain
+
+import luigi
+import luigi.format
+
+import drivers.cube_engine as cube_engine_driver
+import drivers.cubegen_driver as cubegen_driver
+import drivers.render_driver as render_driver
+import generate_report
+import report.engine as report_engine
+from drivers.extract_cache import extractor_fingerprint
+from targets.gaussian import GaussianLogFileTarget
+from tasks.base import HashedTask
+
+DEFAULT_OUTPUT_DIR = 'output_aie_pople'
+
+# Data sets whose images are part of each section of the report
+SECTION_DATA_SETS = {
+    'overview': [],
+    'ground': ['ground', 'vertical_singlet_nto', 'vertical_triplet_nto'],
+    'adiabatic_singlet': ['adiabatic_singlet', 'adiabatic_singlet_nto'],
+    'adiabatic_triplet': ['adiabatic_triplet', 'adiabatic_triplet_nto'],
+}
+
+
+class GaussianPaths(object):
+    """ Tasks finding the Gaussian outputs of a molecule with their path_spec
+    (a JSON file, see generate_report.load_path_spec) and base_directory
+    parameters, which they pass on to the tasks they require
+    """
+
+    def get_path(self, data_set_key, file_type):
+        return generate_report.get_path(
+            self.molecule_name, data_set_key, file_type,
+            generate_report.load_path_spec(self.path_spec,
+                                           self.base_directory))
+
+    def paths(self):
+        return {
+            'path_spec': self.path_spec,
+            'base_directory': self.base_directory,
+        }
+
+
+class GaussianOutput(GaussianPaths, luigi.ExternalTask):
+    """ A log or fchk written by Gaussian
+    """
+    molecule_name = luigi.Parameter()
+    data_set_key = luigi.ChoiceParameter(
+        choices=list(generate_report.GAUSSIAN_OUTPUTS))
+    file_type = luigi.ChoiceParameter(choices=['log', 'fchk'])
+    path_spec = luigi.OptionalParameter(default=None)
+    base_directory = luigi.OptionalParameter(default=None)
+
+    def output(self):
+        path = self.get_path(self.data_set_key, self.file_type)
+        if self.file_type == 'log':
+            return GaussianLogFileTarget(path)
+        return luigi.LocalTarget(path)
+
+
+class ExtractLog(GaussianPaths, HashedTask):
+    """ Extraction result of a log (or fchk, see ExtractorBase.FILE_TYPE),
+    pickled
+    """
+    molecule_name = luigi.Parameter()
+    data_set_key = luigi.ChoiceParameter(
+        choices=list(generate_report.GAUSSIAN_OUTPUTS))
+    output_dir = luigi.Parameter(default=DEFAULT_OUTPUT_DIR)
+    path_spec = luigi.OptionalParameter(default=None)
+    base_directory = luigi.OptionalParameter(default=None)
+
+    def version(self):
+        # Editing the extractor code redoes the extraction
+        return '{}-{}'.format(super().version(), extractor_fingerprint(
+            generate_report.data_set_extractor(self.data_set_key)))
+
+    def requires(self):
+        extractor_class = generate_report.data_set_extractor(self.data_set_key)
+        return GaussianOutput(self.molecule_name, self.data_set_key,
+                              extractor_class.FILE_TYPE, **self.paths())
+
+    def output(self):
+        return luigi.LocalTarget(
+            os.path.join(self.output_dir, self.molecule_name, 'data',
+                         '{}.pickle'.format(self.data_set_key)),
+            format=luigi.format.Nop
+        )
+
+    def run(self):
+        extractor_class = generate_report.data_set_extractor(self.data_set_key)
+        result = extractor_class().extract(self.input().path)
+        with self.output().open('w') as stream:
+            pickle.dump(result, stream, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+class GenerateXyz(GaussianPaths, HashedTask):
+    """ Final structure of a log in xyz format, next to the log
+    """
+    molecule_name = luigi.Parameter()
+    data_set_key = luigi.Parameter()
+    path_spec = luigi.OptionalParameter(default=None)
+    base_directory = luigi.OptionalParameter(default=None)
+
+    def requires(self):
+        return GaussianOutput(self.molecule_name, self.data_set_key, 'log',
+                              **self.paths())
+
+    def output(self):
+        return luigi.LocalTarget(self.input().path.replace('.log', '.xyz'))
+
+    def run(self):
+        log_file = self.input().path
+        # Replaced at once, also when a new log redoes an existing xyz
+        xyz_file = self.output().path
+        with open(xyz_file + '.tmp', 'w') as stream:
+            subprocess.run(['xyz.py', log_file], stdout=stream,
+                           cwd=os.path.dirname(log_file), check=True)
+        os.replace(xyz_file + '.tmp', xyz_file)
+
+
+class RenderStructure(GaussianPaths, HashedTask):
+    molecule_name = luigi.Parameter()
+    data_set_key = luigi.Parameter()
+    path_spec = luigi.OptionalParameter(default=None)
+    base_directory = luigi.OptionalParameter(default=None)
+
+    def requires(self):
+        return GenerateXyz(self.molecule_name, self.data_set_key,
+                           **self.paths())
+
+    def output(self):
+        return luigi.LocalTarget(
+            render_driver.png_file_name(self.input().path))
+
+    def run(self):
+        render_driver.render_file(self.input().path)
+
+
+class CubeMO(GaussianPaths, HashedTask):
+    """ Cube of one MO, next to the fchk
+    """
+    molecule_name = luigi.Parameter()
+    data_set_key = luigi.Parameter()
+    mo = luigi.IntParameter()
+    cube_engine = luigi.ChoiceParameter(choices=['cubegen', 'numpy'],
+                                        default='cubegen')
+    cube_threads = luigi.IntParameter(default=cubegen_driver.NPROCS,
+                                      significant=False)
+    path_spec = luigi.OptionalParameter(default=None)
+    base_directory = luigi.OptionalParameter(default=None)
+
+    def requires(self):
+        return GaussianOutput(self.molecule_name, self.data_set_key, 'fchk',
+                              **self.paths())
+
+    def output(self):
+        return luigi.LocalTarget(os.path.join(
+            os.path.dirname(self.input().path), '{}.cube'.format(self.mo)))
+
+    def run(self):
+        formchk_file = self.input().path
+        output_dir = os.path.dirname(self.output().path)
+        if self.cube_engine == 'numpy':
+            cube_engine_driver.cube_mos(formchk_file, [self.mo],
+                                        output_dir=output_dir)
+        else:
+            cubegen_driver.CubegenScheduler(
+                core_budget=self.cube_threads,
+                threads_per_job=self.cube_threads
+            ).run(formchk_file, [self.mo], output_dir=output_dir)
+
+
+class RenderMO(GaussianPaths, HashedTask):
+    molecule_name = luigi.Parameter()
+    data_set_key = luigi.Parameter()
+    mo = luigi.IntParameter()
+    cube_engine = luigi.ChoiceParameter(choices=['cubegen', 'numpy'],
+                                        default='cubegen')
+    cube_threads = luigi.IntParameter(default=cubegen_driver.NPROCS,
+                                      significant=False)
+    path_spec = luigi.OptionalParameter(default=None)
+    base_directory = luigi.OptionalParameter(default=None)
+
+    def requires(self):
+        return CubeMO(self.molecule_name, self.data_set_key, self.mo,
+                      self.cube_engine, self.cube_threads, **self.paths())
+
+    def output(self):
+        return luigi.LocalTarget(
+            render_driver.png_file_name(self.input().path))
+
+    def run(self):
+        render_driver.render_file(self.input().path)
+
+
+class LatexSection(GaussianPaths, HashedTask):
+    """ LaTeX of one section of the report.
+
+    The MOs to render depend on the extracted data, so the images are
+    dynamic dependencies. The fchk and log files they are made from are
+    inputs of the section so that a new calculation redoes them, and so are
+    the images of the last run, listed in <output>.images, so that a
+    missing image is rendered again.
+    """
+    molecule_name = luigi.Parameter()
+    section = luigi.ChoiceParameter(
+        choices=list(generate_report.REPORT_SECTIONS))
+    output_dir = luigi.Parameter(default=DEFAULT_OUTPUT_DIR)
+    cube_engine = luigi.ChoiceParameter(choices=['cubegen', 'numpy'],
+                                        default='cubegen')
+    cube_threads = luigi.IntParameter(default=cubegen_driver.NPROCS,
+                                      significant=False)
+    path_spec = luigi.OptionalParameter(default=None)
+    base_directory = luigi.OptionalParameter(default=None)
+
+    def requires(self):
+        return {
+            data_set_key: ExtractLog(self.molecule_name, data_set_key,
+                                     self.output_dir, **self.paths())
+            for data_set_key in generate_report.GAUSSIAN_OUTPUTS
+        }
+
+    def extra_inputs(self):
+        files = []
+        for data_set_key in SECTION_DATA_SETS[self.section]:
+            files.append(self.get_path(data_set_key, 'fchk'))
+            if data_set_key in generate_report.STRUCTURE_KEYS:
+                files.append(self.get_path(data_set_key, 'log'))
+        try:
+            with open(self.images_file(), 'r') as stream:
+                files.extend(json.load(stream))
+        except (OSError, ValueError):
+            pass
+        return files
+
+    def images_file(self):
+        return self.output().path + '.images'
+
+    def complete(self):
+        return os.path.exists(self.images_file()) and super().complete()
+
+    def output(self):
+        return luigi.LocalTarget(os.path.join(
+            self.output_dir, self.molecule_name,
+            '{}.tex'.format(self.section)))
+
+    def run(self):
+        data_set = {}
+        for data_set_key, target in self.input().items():
+            with target.open('r') as stream:
+                data_set[data_set_key] = pickle.load(stream)
+        mos = generate_report.report_orbitals(data_set)
+
+        data_set_keys = SECTION_DATA_SETS[self.section]
+        structure_tasks = {
+            data_set_key: RenderStructure(self.molecule_name, data_set_key,
+                                          **self.paths())
+            for data_set_key in data_set_keys
+            if data_set_key in generate_report.STRUCTURE_KEYS
+        }
+        mo_tasks = {
+            data_set_key: [
+                RenderMO(self.molecule_name, data_set_key, mo,
+                         self.cube_engine, self.cube_threads, **self.paths())
+                for mo in mos[data_set_key]
+            ]
+            for data_set_key in data_set_keys
+        }
+        yield list(chain(structure_tasks.values(),
+                         chain.from_iterable(mo_tasks.values())))
+
+        structure_images = {
+            data_set_key: task.output().path
+            for data_set_key, task in structure_tasks.items()
+        }
+        mo_images = {
+            data_set_key: [task.output().path for task in tasks]
+            for data_set_key, tasks in mo_tasks.items()
+        }
+        with open(self.images_file(), 'w') as stream:
+            json.dump(list(chain(structure_images.values(),
+                                 chain.from_iterable(mo_images.values()))),
+                      stream)
+
+        input_data = {
+            'data_set': data_set,
+            'mos': mos,
+            'structure_images': structure_images,
+            'mo_images': mo_images,
+        }
+        with self.output().open('w') as stream:
+            report_engine.generate_report(
+                input_data, stream,
+                generate_report.REPORT_SECTIONS[self.section],
+                report_engine.OutputFormat.LATEX)
+
+
+class LatexReport(GaussianPaths, HashedTask):
+    """ The LaTeX report of a molecule, assembled from its sections
+    """
+    molecule_name = luigi.Parameter()
+    output_dir = luigi.Parameter(default=DEFAULT_OUTPUT_DIR)
+    cube_engine = luigi.ChoiceParameter(choices=['cubegen', 'numpy'],
+                                        default='cubegen')
+    cube_threads = luigi.IntParameter(default=cubegen_driver.NPROCS,
+                                      significant=False)
+    path_spec = luigi.OptionalParameter(default=None)
+    base_directory = luigi.OptionalParameter(default=None)
+
+    def requires(self):
+        return [
+            LatexSection(self.molecule_name, section, self.output_dir,
+                         self.cube_engine, self.cube_threads, **self.paths())
+            for section in generate_report.REPORT_SECTIONS
+        ]
+
+    def output(self):
+        return luigi.LocalTarget(os.path.join(
+            self.output_dir, '{}.tex'.format(self.molecule_name)))
+
+    def run(self):
+        def read_section(target):
+            def component(input_data):
+                with target.open('r') as stream:
+                    return stream.read()
+            return component
+
+        components = generate_report.report_components(
+            read_section(target) for target in self.input())
+        with self.output().open('w') as stream:
+            report_engine.generate_report({}, stream, components,
+                                          report_engine.OutputFormat.LATEX)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Build the LaTeX reports of molecules with luigi, only '
+                    'redoing the steps whose inputs changed')
+    parser.add_argument('molecule_names', nargs='+')
+    parser.add_argument('-j', '--workers', type=int, default=1,
+                        help='Number of luigi workers')
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument('--cube-engine', choices=['cubegen', 'numpy'],
+                        default='cubegen')
+    parser.add_argument('--cube-threads', type=int,
+                        default=cubegen_driver.NPROCS,
+                        help='Threads of each cubegen job')
+    parser.add_argument('--path-spec',
+                        help='JSON file with the base directory and the '
+                             'layout of the Gaussian outputs')
+    parser.add_argument('--base-directory',
+                        help='Directory of the molecules, overrides the one '
+                             'of the path spec')
+    args = parser.parse_args()
+
+    luigi.build([
+        LatexReport(molecule_name, args.output_dir, args.cube_engine,
+                    args.cube_threads, path_spec=args.path_spec,
+                    base_directory=args.base_directory)
+        for molecule_name in args.molecule_names
+    ], workers=args.workers, local_scheduler=True)
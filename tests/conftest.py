@@ -0,0 +1,55 @@
+import os.path
+import sys
+
+import pytest
+
+# The tests import drivers, report and benchmarks from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic_log import write_log  # noqa: E402
+
+
+@pytest.fixture
+def synthetic_log(tmp_path):
+    """ Factory writing a benchmarks.synthetic_log log, returns its path """
+    def _write(name='molecule.log', **kwargs):
+        log_file = str(tmp_path / name)
+        with open(log_file, 'w') as stream:
+            write_log(stream, **kwargs)
+        return log_file
+    return _write
+
+
+def _fchk_field(name, value):
+    """ A field in the fixed format Gaussian writes formatted checkpoints """
+    if isinstance(value, int):
+        return '{:40s}   I     {:12d}\n'.format(name, value)
+    if isinstance(value, float):
+        return '{:40s}   R     {:22.15E}\n'.format(name, value)
+    values = list(value)
+    integers = all(isinstance(item, int) for item in values)
+    per_line, value_format = (6, '{:12d}') if integers else (5, '{:16.8E}')
+    lines = ['{:40s}   {}   N={:12d}\n'.format(
+        name, 'I' if integers else 'R', len(values))]
+    for start in range(0, len(values), per_line):
+        lines.append(''.join(value_format.format(item)
+                             for item in values[start:start + per_line]))
+        lines.append('\n')
+    return ''.join(lines)
+
+
+@pytest.fixture
+def fchk_file(tmp_path):
+    """ Factory writing a formatted checkpoint from a dict of fields, ints,
+    floats or lists of them, returns its path
+    """
+    def _write(fields, name='molecule.fchk'):
+        file_name = str(tmp_path / name)
+        with open(file_name, 'w') as stream:
+            stream.write('Synthetic formatted checkpoint\n')
+            stream.write('SP        RB3LYP                                   '
+                         '   Gen\n')
+            for field_name, value in fields.items():
+                stream.write(_fchk_field(field_name, value))
+        return file_name
+    return _write
@@ -0,0 +1,93 @@
+import os
+import stat
+import time
+
+import drivers.artifact_store as artifact_store
+from drivers.artifact_store import ArtifactStore
+from drivers.extract_cache import EVICTION_TARGET
+
+ARTIFACT_SIZE = 1000
+
+
+def _artifact(directory, name, content=b'x'):
+    file_name = str(directory / name)
+    with open(file_name, 'wb') as stream:
+        stream.write(content * ARTIFACT_SIZE)
+    return file_name
+
+
+def test_artifacts_are_copied(tmp_path):
+    store = ArtifactStore(str(tmp_path / 'store'))
+    job_dir = tmp_path / 'job'
+    job_dir.mkdir()
+    artifact = _artifact(job_dir, '1.cube')
+    store.put(artifact, 'key')
+    assert stat.S_IMODE(os.stat(store._path('key')).st_mode) == \
+        artifact_store.READ_ONLY
+
+    fetched = str(job_dir / 'fetched.cube')
+    assert store.fetch('key', fetched)
+    assert stat.S_IMODE(os.stat(fetched).st_mode) == \
+        artifact_store.default_mode()
+    assert not [name for name in os.listdir(str(job_dir))
+                if name.endswith(artifact_store.TEMP_SUFFIX)]
+
+    # Job directory files are rewritten in place, as by cube_mos or
+    # cubegen, without touching the stored artifact
+    for file_name in [artifact, fetched]:
+        assert os.stat(file_name).st_ino != os.stat(store._path('key')).st_ino
+        assert os.access(file_name, os.W_OK)
+        with open(file_name, 'wb') as stream:
+            stream.write(b'y')
+    with open(store._path('key'), 'rb') as stream:
+        assert stream.read() == b'x' * ARTIFACT_SIZE
+
+
+def test_size_is_scanned_once(tmp_path, monkeypatch):
+    store = ArtifactStore(str(tmp_path / 'store'),
+                          max_size=10 * ARTIFACT_SIZE)
+    scans = []
+    entries = store._entries
+    monkeypatch.setattr(store, '_entries',
+                        lambda: scans.append(1) or entries())
+
+    for index in range(5):
+        store.put(_artifact(tmp_path, '{}.cube'.format(index)), str(index))
+    assert len(scans) == 1
+    assert store._size == store.size() == 5 * ARTIFACT_SIZE
+
+    # The same artifact put again is not counted twice
+    store.put(_artifact(tmp_path, '0.cube'), '0')
+    assert store._size == store.size() == 5 * ARTIFACT_SIZE
+
+
+def test_put_evicts_least_recently_used(tmp_path):
+    store = ArtifactStore(str(tmp_path / 'store'),
+                          max_size=3 * ARTIFACT_SIZE)
+    for index in range(3):
+        store.put(_artifact(tmp_path, '{}.cube'.format(index)), str(index))
+        past = time.time() - 100 + index
+        os.utime(store._path(str(index)), (past, past))
+    # Fetching makes the oldest artifact the most recently used
+    assert store.fetch('0', str(tmp_path / 'fetched.cube'))
+
+    store.put(_artifact(tmp_path, '3.cube'), '3')
+    assert store.size() <= 3 * ARTIFACT_SIZE * EVICTION_TARGET
+    assert os.path.exists(store._path('0'))
+    assert not os.path.exists(store._path('1'))
+    assert os.path.exists(store._path('3'))
+
+
+def test_fetch_survives_a_lost_touch(tmp_path, monkeypatch):
+    store = ArtifactStore(str(tmp_path / 'store'))
+    store.put(_artifact(tmp_path, '1.cube'), 'key')
+
+    fetched = str(tmp_path / 'fetched.cube')
+    for error in [FileNotFoundError, PermissionError]:
+        # Evicted, or owned by another user, once copied
+        def touch(path, error=error):
+            raise error(path)
+        monkeypatch.setattr(artifact_store.os, 'utime', touch)
+        assert store.fetch('key', fetched)
+        with open(fetched, 'rb') as stream:
+            assert stream.read() == b'x' * ARTIFACT_SIZE
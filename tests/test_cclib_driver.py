@@ -0,0 +1,262 @@
+import threading
+import time
+import types
+
+import numpy
+import pytest
+
+cclib_driver = pytest.importorskip('drivers.cclib_driver')
+compact_result = pytest.importorskip('drivers.compact_result')
+
+
+def _parsed(etsyms, etsecs):
+    return types.SimpleNamespace(
+        etenergies=numpy.linspace(20000, 40000, len(etsyms)),
+        etoscs=numpy.linspace(0, 1, len(etsyms)),
+        etsyms=etsyms,
+        etsecs=etsecs,
+    )
+
+
+class Diamond(cclib_driver.ExtractorBase):
+    """ a -> b, c -> d """
+
+    @cclib_driver.extractor(provides=['a'])
+    def extract_a(self, parsed, target):
+        target['a'] = 1
+
+    @cclib_driver.extractor(dependencies=['a'], provides=['b'])
+    def extract_b(self, parsed, target):
+        target['b'] = target['a'] + 1
+
+    @cclib_driver.extractor(dependencies=['a'], provides=['c'])
+    def extract_c(self, parsed, target):
+        target['c'] = target['a'] + 2
+
+    @cclib_driver.extractor(dependencies=['b', 'c'], provides=['d'])
+    def extract_d(self, parsed, target):
+        target['d'] = target['b'] + target['c']
+
+
+def _level_names(plan):
+    return [sorted(func.__name__ for func in level) for level in plan.levels]
+
+
+def test_plan_levels():
+    plan = Diamond.plan()
+    assert _level_names(plan) == [['extract_a'], ['extract_b', 'extract_c'],
+                                  ['extract_d']]
+    assert [func.__name__ for func in plan.order][-1] == 'extract_d'
+
+    target = {}
+    for method in Diamond()._all_methods():
+        method(None, target)
+    assert target == {'a': 1, 'b': 2, 'c': 3, 'd': 5}
+
+
+def test_plan_errors():
+    class Missing(Diamond):
+        @cclib_driver.extractor(dependencies=['e'], provides=['f'])
+        def extract_f(self, parsed, target):
+            pass
+
+    class Circular(Diamond):
+        @cclib_driver.extractor(dependencies=['h'], provides=['g'])
+        def extract_g(self, parsed, target):
+            pass
+
+        @cclib_driver.extractor(dependencies=['g'], provides=['h'])
+        def extract_h(self, parsed, target):
+            pass
+
+    with pytest.raises(RuntimeError, match='dependencies: e$'):
+        Missing.plan()
+    with pytest.raises(RuntimeError, match='dependencies: g, h$'):
+        Circular.plan()
+
+
+def test_plan_per_class():
+    class Extended(Diamond):
+        @cclib_driver.extractor(dependencies=['d'], provides=['e'])
+        def extract_e(self, parsed, target):
+            pass
+
+    assert Diamond.plan() is Diamond.plan()
+    assert Extended.plan() is not Diamond.plan()
+    assert _level_names(Extended.plan())[-1] == ['extract_e']
+    assert 'extract_e' not in [func.__name__ for func in Diamond.plan().order]
+
+
+def test_plan_compiled_once(monkeypatch):
+    class Fresh(Diamond):
+        pass
+
+    compiled = []
+    compile_plan = cclib_driver.ExtractorPlan.compile.__func__
+
+    def slow_compile(cls, extractor_class):
+        compiled.append(extractor_class)
+        time.sleep(0.05)
+        return compile_plan(cls, extractor_class)
+    monkeypatch.setattr(cclib_driver.ExtractorPlan, 'compile',
+                        classmethod(slow_compile))
+
+    barrier = threading.Barrier(8)
+    plans = []
+
+    def first_call():
+        barrier.wait()
+        plans.append(Fresh.plan())
+    threads = [threading.Thread(target=first_call) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert compiled == [Fresh]
+    assert len(plans) == 8 and all(plan is plans[0] for plan in plans)
+
+
+def test_compact_excited_states_match(synthetic_log):
+    log_file = synthetic_log(num_atoms=6, num_basis=60, num_states=7,
+                             num_steps=3, triplets=True, num_deexcitations=2)
+    plain = cclib_driver.GenericExtractor().extract(log_file)
+    compact = cclib_driver.CompactGenericExtractor().extract(log_file)
+
+    assert len(plain['excited_states']['singlet']) == 4
+    assert len(plain['excited_states']['triplet']) == 3
+    assert compact_result.to_plain(compact['excited_states']) == \
+        plain['excited_states']
+
+
+@pytest.mark.parametrize('restricted', [True, False])
+def test_excited_state_columns(restricted):
+    spin = 0 if restricted else 1
+    parsed = _parsed(
+        ['Singlet-A', 'Quintet-B', 'Triplet-SGG'],
+        [[[(4, 0), (6, spin), 0.5], [(7, spin), (5, 0), -0.25]],
+         [],
+         [[(3, spin), (9, spin), 0.125]]])
+
+    for extractor_class in [cclib_driver.GenericExtractor,
+                            cclib_driver.CompactGenericExtractor]:
+        target = {'restricted': restricted, 'optimization_steps': 0}
+        extractor_class()._extractor_excited_states(parsed, target)
+        states = compact_result.to_plain(target['excited_states'])
+
+        assert [state['multiplicity'] for state in states['unknown']] == \
+            ['quintet']
+        assert states['unknown'][0]['orbitals'] == []
+        assert states['triplet'][0]['symmetric_group'] == 'SGG'
+        assert states['triplet'][0]['oscillator_strength'] == 1.0
+        assert states['singlet'][0]['excitation_energy'] == pytest.approx(
+            20000 * cclib_driver.RECCM_TO_HARTREE)
+
+        orbitals = states['singlet'][0]['orbitals'] + \
+            states['triplet'][0]['orbitals']
+        if restricted:
+            assert [(orbital['from'], orbital['to']) for orbital in orbitals] \
+                == [(5, 7), (8, 6), (4, 10)]
+            assert [orbital['coefficient'] for orbital in orbitals] == \
+                pytest.approx([0.5 / numpy.sqrt(2), -0.25 / numpy.sqrt(2),
+                               0.125 / numpy.sqrt(2)])
+        else:
+            assert [(orbital['from'], orbital['to']) for orbital in orbitals] \
+                == [('5A', '7B'), ('8B', '6A'), ('4B', '10B')]
+            assert [orbital['coefficient'] for orbital in orbitals] == \
+                [0.5, -0.25, 0.125]
+
+
+@pytest.mark.parametrize('restricted', [True, False])
+def test_excited_state_scalars_are_python(restricted):
+    spin = 0 if restricted else 1
+    parsed = _parsed(['Singlet-A'], [[[(4, 0), (6, spin), 0.5]]])
+    target = {'restricted': restricted, 'optimization_steps': 0}
+    cclib_driver.GenericExtractor()._extractor_excited_states(parsed, target)
+
+    state = target['excited_states']['singlet'][0]
+    assert type(state['excitation_energy']) is float
+    assert type(state['oscillator_strength']) is float
+    assert type(state['orbitals'][0]['coefficient']) is float
+    assert type(state['orbitals'][0]['from']) is (int if restricted else str)
+
+
+def test_fchk_nto_contributions(fchk_file, monkeypatch):
+    file_name = fchk_file({
+        'Number of alpha electrons': 3,
+        'Alpha Orbital Energies': [0.001, 0.05, 0.9, 0.0, 0.0, 0.0],
+    })
+    closed = []
+    close = cclib_driver.FchkFile.close
+    monkeypatch.setattr(cclib_driver.FchkFile, 'close', lambda fchk: (
+        closed.append(fchk.file_name), close(fchk)))
+
+    result = cclib_driver.FchkNTOExtractor().extract(file_name)
+
+    assert closed == [file_name]
+    assert result['nto_contributions'] == [
+        {'from': 3, 'to': 4, 'contribution': 0.9},
+        {'from': 2, 'to': 5, 'contribution': 0.05},
+    ]
+    assert all(type(contribution['contribution']) is float
+               for contribution in result['nto_contributions'])
+
+
+def test_fchk_without_ntos(fchk_file):
+    file_name = fchk_file({'Number of alpha electrons': 3})
+    with pytest.raises(RuntimeError, match='Alpha Orbital Energies'):
+        cclib_driver.FchkNTOExtractor().extract(file_name)
+
+
+def test_lazy_result_matches_extract(synthetic_log):
+    log_file = synthetic_log(num_states=4, num_steps=2, triplets=True)
+    extractor = cclib_driver.GenericExtractor()
+    lazy = extractor.extract_lazy(log_file)
+    assert isinstance(lazy, cclib_driver.LazyExtractResult)
+    assert compact_result.to_plain(dict(lazy)) == \
+        compact_result.to_plain(extractor.extract(log_file))
+
+
+def test_lazy_result_keys(synthetic_log):
+    log_file = synthetic_log(num_states=4)
+    lazy = cclib_driver.GenericExtractor().extract_lazy(
+        log_file, keys=['scf_energy', 'optimization'])
+    assert lazy['scf_energy'] < 0
+
+    # Only the attributes of the extractors of the requested keys are kept
+    assert hasattr(lazy._parsed, 'scfenergies')
+    assert not hasattr(lazy._parsed, 'moenergies')
+    assert not hasattr(lazy._parsed, 'etsecs')
+
+    with pytest.raises(KeyError, match='not requested'):
+        lazy['restricted']
+    # Provided for the extractor dependencies, but never written
+    with pytest.raises(KeyError, match='has no value'):
+        lazy['optimization']
+    assert dict(lazy) == {'scf_energy': lazy['scf_energy']}
+
+    with pytest.raises(KeyError, match='No extractor provides'):
+        cclib_driver.GenericExtractor().extract_lazy(log_file,
+                                                     keys=['unknown'])
+
+
+def test_released_result_is_parsed_again(synthetic_log, monkeypatch):
+    log_file = synthetic_log(num_states=4)
+    extractor = cclib_driver.GenericExtractor()
+    parsed_files = []
+    parse = cclib_driver.GenericExtractor._parse
+    monkeypatch.setattr(
+        cclib_driver.GenericExtractor, '_parse',
+        lambda self, *args: (parsed_files.append(args[0]),
+                             parse(self, *args))[1])
+
+    lazy = extractor.extract_lazy(log_file)
+    lazy['restricted']
+    lazy['num_electrons']
+    assert parsed_files == [log_file]
+
+    lazy.release()
+    lazy['restricted']
+    assert parsed_files == [log_file]
+    lazy['scf_energy']
+    assert parsed_files == [log_file, log_file]
@@ -0,0 +1,79 @@
+import pytest
+
+compact_result = pytest.importorskip('drivers.compact_result')
+
+from drivers.compact_result import ExcitedStateTable  # noqa: E402
+
+
+def _state(multiplicity, energy, orbitals):
+    return {
+        'multiplicity': multiplicity,
+        'symmetric_group': 'A',
+        'oscillator_strength': energy / 10,
+        'excitation_energy': energy,
+        'orbitals': orbitals,
+    }
+
+
+UNRESTRICTED = {
+    'restricted': False,
+    'excited_states': {
+        'doublet': [
+            _state('doublet', 0.1, [
+                {'from': '12A', 'to': '3B', 'coefficient': 0.5},
+                {'from': '11B', 'to': '14A', 'coefficient': -0.25},
+            ]),
+            _state('doublet', 0.2, []),
+            _state('doublet', 0.3, [
+                {'from': '10A', 'to': '13A', 'coefficient': 0.125},
+            ]),
+        ],
+    },
+}
+
+
+def test_unrestricted_labels_round_trip():
+    compact = compact_result.to_compact(UNRESTRICTED)
+    states = compact['excited_states']['doublet']
+    assert isinstance(states, ExcitedStateTable)
+    assert not states.restricted
+
+    first, second = states[0]['orbitals']
+    assert (first['from'], first.from_spin) == \
+        ('12A', compact_result.SPIN_ALPHA)
+    assert (first['to'], first.to_spin) == ('3B', compact_result.SPIN_BETA)
+    assert (second.from_spin, second.to_spin) == \
+        (compact_result.SPIN_BETA, compact_result.SPIN_ALPHA)
+    assert dict(second) == {'from': '11B', 'to': '14A', 'coefficient': -0.25}
+    assert compact_result.to_plain(compact) == UNRESTRICTED
+
+
+def test_tables_equal_the_plain_states():
+    plain = UNRESTRICTED['excited_states']['doublet']
+    states = compact_result.to_compact(UNRESTRICTED)['excited_states'][
+        'doublet']
+
+    assert states == plain
+    assert plain == states
+    assert states[1]['orbitals'] == []
+    assert states != plain[:2]
+    assert states[-1] == plain[-1]
+    assert states[-1]['orbitals'][-1] == plain[-1]['orbitals'][-1]
+    assert states[1:] == plain[1:]
+    assert states[::2] == plain[::2]
+    assert states[0]['orbitals'][-2:] == plain[0]['orbitals'][-2:]
+    with pytest.raises(IndexError):
+        states[3]
+    with pytest.raises(IndexError):
+        states[-4]
+
+
+def test_empty_table():
+    states = ExcitedStateTable.empty()
+    assert states.restricted
+    assert len(states) == 0
+    assert states == []
+    assert states[:] == []
+    assert states.nbytes == states.indptr.nbytes
+    with pytest.raises(IndexError):
+        states[0]
@@ -0,0 +1,269 @@
+import math
+import os
+import shutil
+
+import numpy
+import pytest
+
+import drivers.cube_engine as cube_engine
+import drivers.cubegen_driver as cubegen_driver
+from drivers.cube_file import CubeHeader, read_cube
+from drivers.fchk_reader import FchkFile
+
+# STO-3G hydrogen 1s
+STO_3G_EXPONENTS = [3.42525091, 0.62391373, 0.16885540]
+STO_3G_COEFFICIENTS = [0.15432897, 0.53532814, 0.44463454]
+
+EXPONENT = 0.8
+
+# A point away from every symmetry plane
+POINT = numpy.array([0.3, -0.5, 0.7])
+
+
+def _atom_fields(shell_type, exponents, coefficients, num_functions,
+                 mo_coefficients):
+    """ A hydrogen at the origin with a single shell """
+    return {
+        'Number of atoms': 1,
+        'Number of basis functions': num_functions,
+        'Atomic numbers': [1],
+        'Nuclear charges': [1.0],
+        'Current cartesian coordinates': [0.0, 0.0, 0.0],
+        'Shell types': [shell_type],
+        'Number of primitives per shell': [len(exponents)],
+        'Shell to atom map': [1],
+        'Primitive exponents': list(exponents),
+        'Contraction coefficients': list(coefficients),
+        'Coordinates of each shell': [0.0, 0.0, 0.0],
+        'Alpha MO coefficients': list(mo_coefficients),
+    }
+
+
+def _shell_values(fchk_file, shell_type, num_functions, points):
+    file_name = fchk_file(_atom_fields(
+        shell_type, [EXPONENT], [1.0], num_functions,
+        numpy.eye(num_functions).ravel()))
+    with FchkFile(file_name) as fchk:
+        return cube_engine.Basis(fchk).evaluate(numpy.atleast_2d(points))
+
+
+def _radial(l, r2):
+    """ Normalized x^l primitive without its angular part """
+    return ((2 * EXPONENT / math.pi) ** 0.75 *
+            (4 * EXPONENT) ** (l / 2) /
+            math.sqrt(cube_engine._double_factorial(2 * l - 1)) *
+            math.exp(-EXPONENT * r2))
+
+
+def _overlaps(fchk_file, shell_type, num_functions):
+    """ Overlap matrix of the shell functions integrated on a grid """
+    step = 0.15
+    count = 81
+    origin = numpy.full(3, -step * (count - 1) / 2)
+    grid = CubeHeader('', '', origin, (count, count, count),
+                      numpy.eye(3) * step, [1], [1.0], [[0.0, 0.0, 0.0]])
+    values = _shell_values(fchk_file, shell_type, num_functions,
+                           grid.points())
+    return values.T @ values * step ** 3
+
+
+def test_s_orbital_is_normalized(fchk_file, tmp_path):
+    file_name = fchk_file(_atom_fields(0, STO_3G_EXPONENTS,
+                                       STO_3G_COEFFICIENTS, 1, [1.0]))
+    cube_file, = cube_engine.cube_mos(file_name, [1], npts=-2,
+                                      output_dir=str(tmp_path))
+    header, values = read_cube(cube_file)
+
+    assert header.mos == [1]
+    assert values.sum() > 0
+    assert (values ** 2).sum() * numpy.linalg.det(header.axes) == \
+        pytest.approx(1, abs=1e-3)
+
+    # The value at the nucleus, with the primitives normalized
+    norms = [(2 * alpha / math.pi) ** 0.75 for alpha in STO_3G_EXPONENTS]
+    center = numpy.argmin(numpy.linalg.norm(
+        header.points() - header.atom_coordinates[0], axis=1))
+    assert numpy.allclose(header.points()[center], 0, atol=1e-4)
+    assert values.ravel()[center] == pytest.approx(
+        numpy.dot(norms, STO_3G_COEFFICIENTS), rel=1e-4)
+
+
+def test_fchk_is_closed(fchk_file, tmp_path, monkeypatch):
+    file_name = fchk_file(_atom_fields(0, STO_3G_EXPONENTS,
+                                       STO_3G_COEFFICIENTS, 1, [1.0]))
+    closed = []
+    close = cube_engine.FchkFile.close
+    monkeypatch.setattr(cube_engine.FchkFile, 'close', lambda fchk: (
+        closed.append(fchk.file_name), close(fchk)))
+
+    cube_engine.cube_mos(file_name, [1], npts=-1, output_dir=str(tmp_path))
+    assert closed == [file_name]
+
+
+def test_cartesian_orders(fchk_file):
+    x, y, z = POINT
+    r2 = POINT @ POINT
+    sqrt_3 = math.sqrt(3)
+    sqrt_5 = math.sqrt(5)
+    sqrt_15 = math.sqrt(15)
+
+    # Gaussian's xx, yy, zz, xy, xz, yz, each normalized on its own
+    numpy.testing.assert_allclose(
+        _shell_values(fchk_file, 2, 6, POINT)[0],
+        _radial(2, r2) * numpy.array([
+            x * x, y * y, z * z,
+            sqrt_3 * x * y, sqrt_3 * x * z, sqrt_3 * y * z]))
+    # xxx, yyy, zzz, xyy, xxy, xxz, xzz, yzz, yyz, xyz
+    numpy.testing.assert_allclose(
+        _shell_values(fchk_file, 3, 10, POINT)[0],
+        _radial(3, r2) * numpy.array([
+            x ** 3, y ** 3, z ** 3,
+            sqrt_5 * x * y * y, sqrt_5 * x * x * y, sqrt_5 * x * x * z,
+            sqrt_5 * x * z * z, sqrt_5 * y * z * z, sqrt_5 * y * y * z,
+            sqrt_15 * x * y * z]))
+
+
+def test_pure_orders(fchk_file):
+    x, y, z = POINT
+    r2 = POINT @ POINT
+    sqrt_3 = math.sqrt(3)
+    sqrt_15 = math.sqrt(15)
+
+    # Gaussian's d0, d+1, d-1, d+2, d-2
+    numpy.testing.assert_allclose(
+        _shell_values(fchk_file, -2, 5, POINT)[0],
+        _radial(2, r2) * numpy.array([
+            (2 * z * z - x * x - y * y) / 2,
+            sqrt_3 * x * z,
+            sqrt_3 * y * z,
+            sqrt_3 / 2 * (x * x - y * y),
+            sqrt_3 * x * y]))
+    # f0, f+1, f-1, f+2, f-2, f+3, f-3
+    numpy.testing.assert_allclose(
+        _shell_values(fchk_file, -3, 7, POINT)[0],
+        _radial(3, r2) * numpy.array([
+            z * (2 * z * z - 3 * x * x - 3 * y * y) / 2,
+            math.sqrt(3 / 8) * x * (4 * z * z - x * x - y * y),
+            math.sqrt(3 / 8) * y * (4 * z * z - x * x - y * y),
+            sqrt_15 / 2 * z * (x * x - y * y),
+            sqrt_15 * x * y * z,
+            math.sqrt(5 / 8) * x * (x * x - 3 * y * y),
+            math.sqrt(5 / 8) * y * (3 * x * x - y * y)]))
+
+
+@pytest.mark.parametrize('shell_type, num_functions', [
+    (1, 3), (-2, 5), (-3, 7), (-4, 9)])
+def test_pure_functions_are_orthonormal(fchk_file, shell_type,
+                                        num_functions):
+    numpy.testing.assert_allclose(
+        _overlaps(fchk_file, shell_type, num_functions),
+        numpy.eye(num_functions), atol=1e-6)
+
+
+@pytest.mark.parametrize('shell_type, num_functions', [(2, 6), (3, 10)])
+def test_cartesian_functions_are_normalized(fchk_file, shell_type,
+                                            num_functions):
+    numpy.testing.assert_allclose(
+        numpy.diag(_overlaps(fchk_file, shell_type, num_functions)),
+        numpy.ones(num_functions), atol=1e-6)
+
+
+def test_beta_orbitals(fchk_file, tmp_path):
+    fields = _atom_fields(0, STO_3G_EXPONENTS, STO_3G_COEFFICIENTS, 1,
+                          [1.0])
+    fields['Beta MO coefficients'] = [-0.5]
+    file_name = fchk_file(fields)
+
+    # Labelled as in the unrestricted excited states, or numbered after the
+    # alpha MOs as in cubegen
+    alpha_file, beta_file, numbered_file = cube_engine.cube_mos(
+        file_name, ['1A', '1B', 2], npts=-1, output_dir=str(tmp_path))
+    alpha_header, alpha = read_cube(alpha_file)
+    beta_header, beta = read_cube(beta_file)
+    assert (alpha_header.mos, beta_header.mos) == ([1], [2])
+    numpy.testing.assert_allclose(beta, -0.5 * alpha, atol=1e-5)
+    numpy.testing.assert_array_equal(read_cube(numbered_file)[1], beta)
+
+
+def test_beta_orbitals_need_beta_coefficients(fchk_file, tmp_path):
+    file_name = fchk_file(_atom_fields(0, STO_3G_EXPONENTS,
+                                       STO_3G_COEFFICIENTS, 1, [1.0]))
+    for mo in ['1B', 2]:
+        with pytest.raises(ValueError, match='beta'):
+            cube_engine.cube_mos(file_name, [mo], npts=-1,
+                                 output_dir=str(tmp_path))
+    with pytest.raises(ValueError, match='No MO 2A'):
+        cube_engine.cube_mos(file_name, ['2A'], npts=-1,
+                             output_dir=str(tmp_path))
+
+
+# H2 at 1.4 Bohr in STO-3G, its bonding and antibonding orbitals
+H2_DISTANCE = 1.4
+H2_OVERLAP = 0.6593
+
+
+def _h2_fields():
+    bonding = 1 / math.sqrt(2 * (1 + H2_OVERLAP))
+    antibonding = 1 / math.sqrt(2 * (1 - H2_OVERLAP))
+    coordinates = [0.0, 0.0, -H2_DISTANCE / 2, 0.0, 0.0, H2_DISTANCE / 2]
+    return {
+        'Number of atoms': 2,
+        'Charge': 0,
+        'Multiplicity': 1,
+        'Number of electrons': 2,
+        'Number of alpha electrons': 1,
+        'Number of beta electrons': 1,
+        'Number of basis functions': 2,
+        'Number of independent functions': 2,
+        'Atomic numbers': [1, 1],
+        'Nuclear charges': [1.0, 1.0],
+        'Current cartesian coordinates': coordinates,
+        'Integer atomic weights': [1, 1],
+        'Number of contracted shells': 2,
+        'Number of primitive shells': 6,
+        'Highest angular momentum': 0,
+        'Largest degree of contraction': 3,
+        'Shell types': [0, 0],
+        'Number of primitives per shell': [3, 3],
+        'Shell to atom map': [1, 2],
+        'Primitive exponents': STO_3G_EXPONENTS * 2,
+        'Contraction coefficients': STO_3G_COEFFICIENTS * 2,
+        'Coordinates of each shell': coordinates,
+        'Total Energy': -1.1167,
+        'Alpha Orbital Energies': [-0.5782, 0.6703],
+        'Alpha MO coefficients': [bonding, bonding,
+                                  antibonding, -antibonding],
+        'Total SCF Density': [2 * bonding ** 2, 2 * bonding ** 2,
+                              2 * bonding ** 2],
+    }
+
+
+@pytest.mark.skipif(shutil.which('cubegen') is None,
+                    reason='cubegen is not installed')
+@pytest.mark.parametrize('npts', [-2, 40])
+def test_matches_cubegen(fchk_file, tmp_path, npts):
+    file_name = fchk_file(_h2_fields())
+    reference_dir = tmp_path / 'cubegen'
+    engine_dir = tmp_path / 'engine'
+    reference_dir.mkdir()
+    engine_dir.mkdir()
+
+    for mo in [1, 2]:
+        reference_file = cubegen_driver.cubegen_mo(
+            file_name, mo, npts=npts, output_dir=str(reference_dir))
+        assert os.path.exists(reference_file)
+        cube_file, = cube_engine.cube_mos(
+            file_name, [mo], output_dir=str(engine_dir),
+            grid=cube_engine.grid_from_cube(reference_file))
+
+        header = read_cube(cube_file)[0]
+        reference_header = read_cube(reference_file)[0]
+        numpy.testing.assert_allclose(header.origin,
+                                      reference_header.origin)
+        numpy.testing.assert_allclose(header.axes, reference_header.axes)
+        assert header.mos == reference_header.mos
+
+        # cubegen writes 5 significant digits
+        differences = cube_engine.compare_cubes(cube_file, reference_file)
+        assert differences['max_abs_error'] <= \
+            1e-4 * differences['max_abs_value']
@@ -0,0 +1,70 @@
+import threading
+
+import pytest
+
+import drivers.cubegen_driver as cubegen_driver
+
+
+@pytest.fixture
+def cubegen_calls(monkeypatch):
+    """ Replaces cubegen by writing an empty cube, returns the threads of
+    every call
+    """
+    calls = []
+    lock = threading.Lock()
+
+    def _cubegen(formchk_file, mo, cube_file, npts=-2, nprocs=1,
+                 timeout=None):
+        with lock:
+            calls.append(nprocs)
+        open(cube_file, 'w').close()
+        return 0
+
+    monkeypatch.setattr(cubegen_driver, '_cubegen', _cubegen)
+    return calls
+
+
+def test_negative_retries():
+    with pytest.raises(ValueError):
+        cubegen_driver.CubegenScheduler(retries=-1)
+
+
+def test_failure_without_retries(monkeypatch, tmp_path):
+    attempts = []
+    monkeypatch.setattr(cubegen_driver, '_cubegen',
+                        lambda *args, **kwargs: attempts.append(1) or 1)
+    scheduler = cubegen_driver.CubegenScheduler(core_budget=2, retries=0)
+    with pytest.raises(RuntimeError, match='exit code 1'):
+        scheduler.run(str(tmp_path / 'molecule.fchk'), [1])
+    assert len(attempts) == 1
+
+
+def test_concurrent_runs_tune_once(cubegen_calls, monkeypatch, tmp_path):
+    scheduler = cubegen_driver.CubegenScheduler(core_budget=4,
+                                                autotune=True)
+    tunes = []
+    tune = scheduler._tune
+    monkeypatch.setattr(scheduler, '_tune', lambda *args: (
+        tunes.append(1), tune(*args))[1])
+
+    cube_files = {}
+
+    def _run(name):
+        output_dir = tmp_path / name
+        output_dir.mkdir()
+        cube_files[name] = scheduler.run(str(tmp_path / 'molecule.fchk'),
+                                         list(range(1, 17)),
+                                         output_dir=str(output_dir))
+
+    threads = [threading.Thread(target=_run, args=(str(index),))
+               for index in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(tunes) == 1
+    assert scheduler.threads_per_job in (1, 2, 4)
+    assert len(cubegen_calls) == 4 * 16
+    assert sorted(cube_files) == ['0', '1', '2', '3']
+    assert all(len(files) == 16 for files in cube_files.values())
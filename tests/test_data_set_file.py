@@ -0,0 +1,77 @@
+import json
+import os
+
+import numpy
+import pytest
+
+pytest.importorskip('jinja2')
+cclib_driver = pytest.importorskip('drivers.cclib_driver')
+
+from drivers.compact_result import to_plain  # noqa: E402
+from drivers.data_set_file import (  # noqa: E402
+    MANIFEST_FILE,
+    load_data_set,
+    save_data_set
+)
+from report.backend.latex import (  # noqa: E402
+    excited_state_table,
+    xyz_coordinate
+)
+
+
+def _arrays(value):
+    if isinstance(value, numpy.ndarray):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _arrays(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _arrays(item)
+    elif hasattr(value, 'contributions'):
+        yield from [value.states, value.indptr, value.contributions]
+
+
+def _tables(data_set, key):
+    return [
+        xyz_coordinate('Coordinates', data_set, key),
+        excited_state_table(data_set, 'Excited states', key),
+    ]
+
+
+def test_round_trip(tmp_path, synthetic_log):
+    log_file = synthetic_log(num_atoms=6, num_basis=60, num_states=6,
+                             triplets=True, num_deexcitations=2)
+    data_set = {
+        'plain': cclib_driver.GenericExtractor().extract(log_file),
+        'compact': cclib_driver.CompactGenericExtractor().extract(log_file),
+    }
+    directory = str(tmp_path / 'data_set')
+    save_data_set(data_set, directory)
+    loaded = load_data_set(directory)
+
+    assert set(loaded) == set(data_set)
+    arrays = list(_arrays(loaded))
+    assert arrays
+    for array in arrays:
+        assert isinstance(array, numpy.memmap)
+        assert not array.flags.writeable
+
+    for key, result in data_set.items():
+        assert to_plain(loaded[key]) == to_plain(result)
+        # The LaTeX functions take the loaded object as it is
+        assert _tables(loaded, key) == _tables(data_set, key)
+
+
+def test_other_version_is_rejected(tmp_path):
+    directory = str(tmp_path / 'data_set')
+    save_data_set({}, directory)
+    manifest_file = os.path.join(directory, MANIFEST_FILE)
+    with open(manifest_file) as stream:
+        manifest = json.load(stream)
+    manifest['version'] += 1
+    with open(manifest_file, 'w') as stream:
+        json.dump(manifest, stream)
+
+    with pytest.raises(ValueError, match='version'):
+        load_data_set(directory)
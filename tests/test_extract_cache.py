@@ -0,0 +1,142 @@
+import os
+import pickle
+import sys
+import time
+
+import pytest
+
+import drivers.extract_cache as extract_cache
+from drivers.extract_cache import ExtractCache, extractor_fingerprint
+
+
+class Extractor(object):
+    pass
+
+
+class PickledLater(object):
+    pass
+
+
+def test_fingerprint_is_memoized(monkeypatch):
+    fingerprint = extractor_fingerprint(Extractor)
+
+    def fail(*args):
+        raise AssertionError('fingerprint computed again')
+    monkeypatch.setattr(extract_cache, '_imported_modules', fail)
+    assert extractor_fingerprint(Extractor) == fingerprint
+
+
+def test_fingerprint_covers_imported_modules(tmp_path, monkeypatch):
+    package_dir = tmp_path / 'fingerprinted'
+    package_dir.mkdir()
+    (package_dir / '__init__.py').write_text('')
+    (package_dir / 'extractors.py').write_text(
+        'from fingerprinted.helpers import scale\n'
+        'class Extractor(object):\n    pass\n')
+    (package_dir / 'helpers.py').write_text(
+        'import fingerprinted.parser\n'
+        'def scale():\n    return 1\n')
+    (package_dir / 'parser.py').write_text('VERSION = 1\n')
+    (package_dir / 'renderer.py').write_text('VERSION = 1\n')
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    import fingerprinted.extractors
+
+    def fingerprint_after(module, source):
+        extractor_fingerprint.cache_clear()
+        (package_dir / module).write_text(source)
+        return extractor_fingerprint(fingerprinted.extractors.Extractor)
+
+    fingerprint = extractor_fingerprint(fingerprinted.extractors.Extractor)
+    # Not imported by the extractors
+    assert fingerprint_after('renderer.py', 'VERSION = 2\n') == fingerprint
+    # Imported through a name, and by an imported module
+    helpers_fingerprint = fingerprint_after(
+        'helpers.py',
+        'import fingerprinted.parser\ndef scale():\n    return 2\n')
+    assert helpers_fingerprint != fingerprint
+    assert fingerprint_after('parser.py', 'VERSION = 2\n') != \
+        helpers_fingerprint
+
+
+def test_key_covers_cclib_version(tmp_path, monkeypatch):
+    cache = ExtractCache(str(tmp_path))
+    key = cache.key(Extractor, __file__)
+    monkeypatch.setattr(extract_cache, 'cclib_version', lambda: '0.0')
+    assert cache.key(Extractor, __file__) != key
+
+
+def test_worker_cache_is_scanned_once(tmp_path, monkeypatch):
+    cache = ExtractCache(str(tmp_path))
+    scans = []
+    size = ExtractCache.size
+    monkeypatch.setattr(ExtractCache, 'size',
+                        lambda self: (scans.append(self), size(self))[1])
+
+    # As unpickled by a process pool worker, once per task
+    for index in range(3):
+        worker_cache = pickle.loads(pickle.dumps(cache))
+        worker_cache.store(str(index), {'value': index})
+    assert len(scans) == 1
+    assert worker_cache is pickle.loads(pickle.dumps(cache))
+    assert worker_cache._size == cache.size()
+
+
+def test_stale_class_is_a_miss(tmp_path, monkeypatch):
+    cache = ExtractCache(str(tmp_path))
+    key = cache.key(Extractor, __file__)
+    cache.store(key, {'value': PickledLater()})
+
+    # The class of the entry no longer exists
+    monkeypatch.delattr(sys.modules[__name__], 'PickledLater')
+    assert cache.load(key) is None
+    assert not os.path.exists(cache._path(key))
+
+
+def test_entry_evicted_after_read_is_a_hit(tmp_path, monkeypatch):
+    cache = ExtractCache(str(tmp_path))
+    cache.store('key', {'value': 1})
+
+    # Another process evicts the entry between the read and the touch
+    def evicted(path):
+        raise FileNotFoundError(path)
+    monkeypatch.setattr(extract_cache.os, 'utime', evicted)
+    assert cache.load('key') == {'value': 1}
+
+
+def test_store_evicts_least_recently_used(tmp_path):
+    entry_size = len(pickle.dumps({'data': b'x' * 1000},
+                                  protocol=pickle.HIGHEST_PROTOCOL))
+    cache = ExtractCache(str(tmp_path), max_size=3 * entry_size)
+    for index in range(3):
+        cache.store(str(index), {'data': b'x' * 1000})
+        past = time.time() - 100 + index
+        os.utime(cache._path(str(index)), (past, past))
+    assert cache.size() == 3 * entry_size
+
+    # The same result stored again is not counted twice
+    cache.store('2', {'data': b'x' * 1000})
+    assert cache._size == 3 * entry_size
+
+    cache.store('3', {'data': b'x' * 1000})
+    assert cache.size() <= 3 * entry_size * extract_cache.EVICTION_TARGET
+    assert cache.load('0') is None
+    assert cache.load('3') is not None
+
+
+def test_cache_in_process_pool(tmp_path, synthetic_log):
+    cclib_driver = pytest.importorskip('drivers.cclib_driver')
+    tasks = {
+        index: (cclib_driver.GenericExtractor,
+                synthetic_log('{}.log'.format(index), num_atoms=4,
+                              num_basis=40, num_states=3))
+        for index in range(2)
+    }
+    cache = ExtractCache(str(tmp_path / 'cache'))
+    results = cclib_driver.extract_logs(tasks, jobs=2, cache=cache)
+
+    assert results == cclib_driver.extract_logs(tasks)
+    assert len(list(cache._entries())) == 2
+    # The entries stored by the workers are loaded by the parent
+    for extractor_class, log_file in tasks.values():
+        assert cache.load(cache.key(extractor_class, log_file)) is not None
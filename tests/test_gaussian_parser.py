@@ -0,0 +1,131 @@
+import numpy
+import pytest
+
+import drivers.gaussian_parser as gaussian_parser
+
+SQRT_2 = numpy.sqrt(2)
+
+LOG_ARGUMENTS = {
+    'single point': dict(num_atoms=6, num_basis=60, num_states=5,
+                         num_deexcitations=0),
+    'de-excitations': dict(num_atoms=6, num_basis=60, num_states=5,
+                           num_deexcitations=2),
+    'triplets': dict(num_atoms=8, num_basis=80, num_states=6, triplets=True,
+                     num_deexcitations=1),
+    'optimization': dict(num_atoms=5, num_basis=50, num_states=4,
+                         num_steps=4, num_deexcitations=2, triplets=True),
+}
+
+
+def _cclib_parse(log_file):
+    cclib = pytest.importorskip('cclib')
+    return cclib.ccopen(log_file).parse()
+
+
+def _excitations(contributions):
+    """ The -> contributions, the ones cclib reads """
+    return [contribution for contribution in contributions
+            if contribution[0][0] < contribution[1][0]]
+
+
+@pytest.mark.parametrize('arguments', LOG_ARGUMENTS.values(),
+                         ids=list(LOG_ARGUMENTS))
+def test_final_block_matches_cclib(synthetic_log, arguments):
+    log_file = synthetic_log(**arguments)
+    parsed = _cclib_parse(log_file)
+    native = gaussian_parser.read_final_excited_states(log_file)
+
+    numpy.testing.assert_allclose(native['etenergies'], parsed.etenergies)
+    numpy.testing.assert_allclose(native['etoscs'], parsed.etoscs)
+    assert native['etsyms'] == list(parsed.etsyms)
+
+    assert len(native['etsecs']) == len(parsed.etsecs)
+    for contributions, expected in zip(native['etsecs'], parsed.etsecs):
+        excitations = _excitations(contributions)
+        assert len(contributions) - len(excitations) == \
+            arguments['num_deexcitations']
+        assert [(from_, to) for from_, to, _ in excitations] == \
+            [(tuple(from_), tuple(to)) for from_, to, _ in expected]
+        # cclib scales the restricted coefficients by sqrt(2)
+        numpy.testing.assert_allclose(
+            [coefficient * SQRT_2 for _, _, coefficient in excitations],
+            [coefficient for _, _, coefficient in expected])
+
+
+def test_every_block_is_kept(synthetic_log):
+    arguments = LOG_ARGUMENTS['optimization']
+    log_file = synthetic_log(**arguments)
+    every_block = gaussian_parser.read_excited_states(log_file)
+    final_block = gaussian_parser.read_final_excited_states(log_file)
+
+    num_states = arguments['num_states']
+    assert len(every_block['etenergies']) == \
+        arguments['num_steps'] * num_states
+    numpy.testing.assert_array_equal(every_block['etenergies'][-num_states:],
+                                     final_block['etenergies'])
+    assert every_block['etsecs'][-num_states:] == final_block['etsecs']
+
+
+def test_deexcitation_convention():
+    lines = [
+        ' Excited State   1:      Singlet-A      3.7221 eV  333.10 nm  '
+        'f=0.0012  <S**2>=0.000\n',
+        '       6 -> 8         0.69744\n',
+        '       7 <- 9        -0.11000\n',
+        '\n',
+    ]
+    parsed = gaussian_parser.parse_excited_states(lines)
+
+    # Orbitals start at 0, a de-excitation has from and to swapped
+    assert parsed['etsecs'] == [[
+        [(5, 0), (7, 0), 0.69744],
+        [(8, 0), (6, 0), -0.11],
+    ]]
+    assert parsed['etsyms'] == ['Singlet-A']
+    numpy.testing.assert_allclose(parsed['etenergies'],
+                                  [3.7221 * gaussian_parser.EV_TO_RECCM])
+    numpy.testing.assert_allclose(parsed['etoscs'], [0.0012])
+
+
+def test_unrestricted_spins():
+    lines = [
+        ' Excited State   1:  3.010-A        2.1000 eV  590.40 nm  '
+        'f=0.0100  <S**2>=2.015\n',
+        '      35A -> 45A        0.51921\n',
+        '      34B -> 36B       -0.40123\n',
+        '      36B <- 37B        0.02001\n',
+        ' Excited State   2:  3.020-SGG      2.5000 eV  495.94 nm  '
+        'f=0.0000  <S**2>=2.020\n',
+        '      35A -> 46A        0.61000\n',
+    ]
+    parsed = gaussian_parser.parse_excited_states(lines)
+
+    assert parsed['etsecs'] == [
+        [[(34, 0), (44, 0), 0.51921],
+         [(33, 1), (35, 1), -0.40123],
+         [(36, 1), (35, 1), 0.02001]],
+        [[(34, 0), (45, 0), 0.61]],
+    ]
+    assert parsed['etsyms'] == ['3.010-A', '3.020-sigma.g']
+
+
+def test_extractor_uses_native_states(synthetic_log):
+    cclib_driver = pytest.importorskip('drivers.cclib_driver')
+    arguments = LOG_ARGUMENTS['optimization']
+    log_file = synthetic_log(**arguments)
+    result = cclib_driver.GenericExtractor().extract(log_file)
+    final_block = gaussian_parser.read_final_excited_states(log_file)
+
+    states = result['excited_states']['singlet'] + \
+        result['excited_states']['triplet']
+    assert len(states) == arguments['num_states']
+    for state in states:
+        orbitals = state['orbitals']
+        deexcitations = [orbital for orbital in orbitals
+                         if orbital['from'] > orbital['to']]
+        assert len(deexcitations) == arguments['num_deexcitations']
+    # As printed in the log, without the sqrt(2) of cclib
+    assert sorted(orbital['coefficient'] for state in states
+                  for orbital in state['orbitals']) == pytest.approx(sorted(
+                      coefficient for contributions in final_block['etsecs']
+                      for _, _, coefficient in contributions))
@@ -0,0 +1,39 @@
+import json
+import os
+
+import drivers.instrumentation as instrumentation
+
+ALLOCATION_SIZE = 1 << 20
+
+
+def test_nested_spans(tmp_path):
+    instrumentation.enable(str(tmp_path / 'trace'))
+    try:
+        with instrumentation.span('parent', 'stage'):
+            with instrumentation.span('child', 'extract', file='a.log'):
+                buffer = bytearray(ALLOCATION_SIZE)
+                del buffer
+        trace_file = str(tmp_path / 'trace.json')
+        summary = instrumentation.write_trace(trace_file)
+    finally:
+        instrumentation.disable()
+    assert instrumentation.TRACE_DIR_VARIABLE not in os.environ
+    assert not instrumentation.enabled()
+
+    with open(trace_file, 'r') as stream:
+        events = {event['name']: event
+                  for event in json.load(stream)['traceEvents']}
+    assert set(events) == {'parent', 'child'}
+    for event in events.values():
+        assert event['ph'] == 'X'
+        assert 'cpu_ms' in event['args'] and 'peak_kb' in event['args']
+    assert events['child']['args']['file'] == 'a.log'
+
+    # The peak of the child, freed before it ends, is the parent's too
+    assert events['child']['args']['peak_kb'] >= ALLOCATION_SIZE / 1024
+    assert events['parent']['args']['peak_kb'] >= \
+        events['child']['args']['peak_kb']
+
+    with open(trace_file + '.txt', 'r') as stream:
+        assert stream.read() == summary + '\n'
+    assert 'child' in summary and 'parent' in summary
@@ -0,0 +1,69 @@
+import pytest
+
+pytest.importorskip('jinja2')
+cclib_driver = pytest.importorskip('drivers.cclib_driver')
+
+from report.backend.latex import (  # noqa: E402
+    excited_state_table,
+    nto_analysis_table,
+    xyz_coordinate
+)
+
+DATA_SET_KEY = 'molecule'
+
+TABLES = {
+    'xyz_coordinate': lambda data_set, bulk: xyz_coordinate(
+        'Coordinates', data_set, DATA_SET_KEY, bulk=bulk),
+    'excited_state_table': lambda data_set, bulk: excited_state_table(
+        data_set, 'Excited states', DATA_SET_KEY, bulk=bulk),
+    'first_excited_states': lambda data_set, bulk: excited_state_table(
+        data_set, 'Excited states', DATA_SET_KEY, max_states=2, bulk=bulk),
+    'nto_analysis_table': lambda data_set, bulk: nto_analysis_table(
+        data_set, 'NTO', DATA_SET_KEY, bulk=bulk),
+}
+
+EXTRACTORS = {
+    'generic': cclib_driver.GenericExtractor,
+    'compact': cclib_driver.CompactGenericExtractor,
+}
+
+
+@pytest.fixture(params=list(EXTRACTORS))
+def data_set(request, synthetic_log, fchk_file):
+    """ Restricted singlets and triplets, with de-excitations, extracted
+    from a synthetic log, and the NTOs of an fchk
+    """
+    log_file = synthetic_log(num_atoms=12, num_basis=120, num_states=8,
+                             num_deexcitations=2, triplets=True)
+    result = dict(EXTRACTORS[request.param]().extract(log_file))
+    nto_file = fchk_file({
+        'Number of alpha electrons': 4,
+        'Alpha Orbital Energies': [0.0012, 0.013, 0.1234567, 0.8642,
+                                   0.0, 0.0, 0.0, 0.0],
+    })
+    result.update(cclib_driver.FchkNTOExtractor().extract(nto_file))
+    return {DATA_SET_KEY: result}
+
+
+@pytest.mark.parametrize('table', list(TABLES))
+def test_bulk_rendering_is_identical(data_set, table):
+    states = data_set[DATA_SET_KEY]['excited_states']
+    assert len(states['singlet']) == 4 and len(states['triplet']) == 4
+    assert len(data_set[DATA_SET_KEY]['nto_contributions']) == 3
+
+    bulk = TABLES[table](data_set, True)
+    assert bulk
+    if table == 'excited_state_table':
+        assert r'$\leftarrow$' in bulk and r'$\rightarrow$' in bulk
+    assert bulk.encode() == TABLES[table](data_set, False).encode()
+
+
+def test_empty_tables_are_identical():
+    data_set = {DATA_SET_KEY: {
+        'num_atoms': 0,
+        'atoms': {'symbols': [], 'coordinates': []},
+        'excited_states': {'singlet': [], 'triplet': [], 'unknown': []},
+        'nto_contributions': [],
+    }}
+    for table in TABLES.values():
+        assert table(data_set, True) == table(data_set, False)
@@ -0,0 +1,101 @@
+import json
+import os
+
+import numpy
+import pytest
+
+import drivers.gaussian_parser as gaussian_parser
+import drivers.log_index as log_index
+from drivers.log_index import LogIndex
+
+NUM_STATES = 6
+
+
+@pytest.fixture
+def log_file(synthetic_log):
+    return synthetic_log(num_atoms=4, num_basis=40, num_states=NUM_STATES,
+                         num_steps=3)
+
+
+def _header(index_file_name):
+    with open(index_file_name, 'rb') as stream:
+        return json.loads(stream.readline())
+
+
+def _rewrite_header(index_file_name, **changes):
+    with open(index_file_name, 'rb') as stream:
+        header = json.loads(stream.readline())
+        offsets = stream.read()
+    header.update(changes)
+    with open(index_file_name, 'wb') as stream:
+        stream.write(json.dumps(header).encode() + b'\n' + offsets)
+
+
+def test_index_is_saved_and_loaded(log_file):
+    index = LogIndex.open(log_file)
+    index_file_name = LogIndex.index_file_name(log_file)
+    assert os.path.exists(index_file_name)
+    assert index.count('excitation') == 3
+    assert index.count('termination') == 1
+
+    loaded = LogIndex.load(log_file)
+    assert loaded is not None
+    for section in log_index.SECTION_MARKERS:
+        assert loaded.count(section) == index.count(section)
+        assert loaded.last(section) == index.last(section)
+
+
+def test_final_excited_states(log_file):
+    final = gaussian_parser.read_final_excited_states(log_file)
+    every = gaussian_parser.read_excited_states(log_file)
+    assert len(final['etenergies']) == NUM_STATES
+    numpy.testing.assert_array_equal(final['etenergies'],
+                                     every['etenergies'][-NUM_STATES:])
+    assert final['etsyms'] == every['etsyms'][-NUM_STATES:]
+    assert final['etsecs'] == every['etsecs'][-NUM_STATES:]
+
+
+def test_changed_log_is_indexed_again(log_file):
+    LogIndex.open(log_file)
+    with open(log_file, 'a') as stream:
+        stream.write(' Normal termination of Gaussian 16\n')
+    assert LogIndex.load(log_file) is None
+
+    index = LogIndex.open(log_file)
+    assert index.count('termination') == 2
+    assert LogIndex.load(log_file).count('termination') == 2
+    assert _header(LogIndex.index_file_name(log_file))['size'] == \
+        os.path.getsize(log_file)
+
+
+@pytest.mark.parametrize('changes', [
+    {'version': log_index.INDEX_VERSION - 1},
+    {'sections': {'excitation': [0, 3]}},
+    {'mtime': 0},
+])
+def test_mismatched_header_is_stale(log_file, changes):
+    LogIndex.open(log_file)
+    index_file_name = LogIndex.index_file_name(log_file)
+    _rewrite_header(index_file_name, **changes)
+    assert LogIndex.load(log_file) is None
+
+    assert LogIndex.open(log_file).count('excitation') == 3
+    assert _header(index_file_name)['version'] == log_index.INDEX_VERSION
+
+
+def test_corrupt_index_is_rebuilt(log_file):
+    index_file_name = LogIndex.index_file_name(log_file)
+    with open(index_file_name, 'wb') as stream:
+        stream.write(b'\x00garbage\n')
+    assert LogIndex.load(log_file) is None
+
+    assert LogIndex.open(log_file).count('excitation') == 3
+    assert LogIndex.load(log_file) is not None
+
+
+def test_unwritable_index_is_still_used(log_file, monkeypatch):
+    def fail(index):
+        raise OSError('read-only directory')
+    monkeypatch.setattr(LogIndex, 'save', fail)
+    assert LogIndex.open(log_file).count('excitation') == 3
+    assert not os.path.exists(LogIndex.index_file_name(log_file))
@@ -0,0 +1,55 @@
+import os
+
+from drivers.render_driver import BatchRenderer, png_file_name
+
+# Writes the image next to its input, as render.py does
+RENDER_SCRIPT = '''
+import os
+import sys
+
+with open(os.path.splitext(sys.argv[1])[0] + '.png', 'w') as stream:
+    stream.write('png')
+'''
+
+
+def test_temporary_input_added_twice(tmp_path):
+    script = tmp_path / 'render.py'
+    script.write_text(RENDER_SCRIPT)
+    cube_file = str(tmp_path / '1.cube')
+    with open(cube_file, 'w') as stream:
+        stream.write('cube')
+
+    rendered = []
+    with BatchRenderer(workers=1, script=str(script)) as renderer:
+        for _ in range(2):
+            png_file = renderer.add(cube_file, temporary=True,
+                                    callback=rendered.append)
+            assert os.path.exists(cube_file)
+        assert len(renderer) == 1
+        assert renderer.render() == [png_file]
+
+    assert png_file == png_file_name(cube_file)
+    assert os.path.exists(png_file)
+    assert rendered == [png_file, png_file]
+    assert not os.path.exists(cube_file)
+
+
+def test_broken_pool_is_replaced(tmp_path):
+    script = tmp_path / 'render.py'
+    script.write_text(
+        "import os\nimport sys\n"
+        "if 'crash' in sys.argv[1]:\n    os._exit(1)\n" + RENDER_SCRIPT)
+    crash_file = str(tmp_path / 'crash.xyz')
+    xyz_file = str(tmp_path / 'molecule.xyz')
+    for file_name in [crash_file, xyz_file]:
+        with open(file_name, 'w') as stream:
+            stream.write('xyz')
+
+    with BatchRenderer(workers=1, script=str(script)) as renderer:
+        batch = renderer.batch()
+        batch.add(crash_file)
+        assert batch.render() == []
+        assert renderer._pool is None
+
+        batch.add(xyz_file)
+        assert batch.render() == [png_file_name(xyz_file)]
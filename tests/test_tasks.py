@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+luigi = pytest.importorskip('luigi')
+pytest.importorskip('cclib')
+
+import generate_report  # noqa: E402
+from tasks.report import ExtractLog, GaussianOutput  # noqa: E402
+
+MOLECULE_NAME = 'molecule'
+
+DATA_SET_KEY = 'ground'
+
+
+@pytest.fixture
+def base_directory(tmp_path, synthetic_log):
+    """ A base directory holding the ground state log of a molecule """
+    base_directory = tmp_path / 'base'
+    log_file = generate_report.get_path(
+        MOLECULE_NAME, DATA_SET_KEY, 'log',
+        generate_report.load_path_spec(base_directory=str(base_directory)))
+    os.makedirs(os.path.dirname(log_file))
+    os.replace(synthetic_log(num_atoms=4, num_basis=40, num_states=3),
+               log_file)
+    return str(base_directory)
+
+
+def _build(task):
+    result = luigi.build([task], local_scheduler=True,
+                         detailed_summary=True, log_level='WARNING')
+    assert result.status == luigi.LuigiStatusCode.SUCCESS
+    return result.summary_text
+
+
+def _extract_log(base_directory, output_dir):
+    return ExtractLog(MOLECULE_NAME, DATA_SET_KEY, output_dir,
+                      base_directory=base_directory)
+
+
+def test_base_directory_parameter(base_directory):
+    output = GaussianOutput(MOLECULE_NAME, DATA_SET_KEY, 'log',
+                            base_directory=base_directory).output()
+    assert output.path.startswith(base_directory + os.sep)
+    assert output.exists()
+
+
+def test_rerun_is_a_no_op(base_directory, tmp_path):
+    output_dir = str(tmp_path / 'output')
+    task = _extract_log(base_directory, output_dir)
+    assert not task.complete()
+    assert 'ran successfully' in _build(task)
+    assert task.complete()
+    pickle_file = task.output().path
+    modified = os.stat(pickle_file).st_mtime_ns
+
+    # Same inputs, nothing runs again
+    summary = _build(_extract_log(base_directory, output_dir))
+    assert 'ran successfully' not in summary
+    assert os.stat(pickle_file).st_mtime_ns == modified
+
+    # A new log redoes the extraction
+    log_file = task.input().path
+    with open(log_file, 'a') as stream:
+        stream.write(' \n')
+    assert not task.complete()